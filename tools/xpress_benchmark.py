@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+#  -*- mode: python; -*-
+#
+# Volatility
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+#
+
+"""Compares the XPRESS decoder with the original dict based one.
+
+Usage: xpress_benchmark.py hiberfil.sys [number of blocks]
+       xpress_benchmark.py --generate [number of blocks]
+
+The compressed blocks are taken from the hibernation file given (which
+is read a chunk at a time), or with --generate made by compressing 64KB
+blocks of generated memory-like data. Both decoders are run over them,
+and the results checked to be identical.
+"""
+
+import os
+import sys
+import time
+import random
+from struct import pack, unpack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volatility.win32.xpress as xpress
+
+XPRESS_MAGIC = b"\x81\x81xpress"
+
+## How much of the hibernation file is read at a time
+CHUNK_SIZE = 0x100000
+
+def original_decode(inputBuffer):
+    """The original decoder (only changed to run on bytes under python 3)"""
+    outputBuffer = {}
+    outputIndex = 0
+    inputIndex = 0
+    indicatorBit = 0
+    nibbleIndex = 0
+
+    def recombine(outbuf):
+        return bytes(outbuf[k] for k in sorted(outbuf.keys()))
+
+    while inputIndex < len(inputBuffer):
+        if (indicatorBit == 0):
+            if inputIndex + 4 > len(inputBuffer):
+                return recombine(outputBuffer)
+            indicator = unpack("<L", inputBuffer[inputIndex:inputIndex + 4])[0]
+            inputIndex += 4
+            indicatorBit = 32
+
+        indicatorBit = indicatorBit - 1
+        if not (indicator & (1 << indicatorBit)):
+            try:
+                outputBuffer[outputIndex] = inputBuffer[inputIndex]
+            except IndexError:
+                return recombine(outputBuffer)
+
+            inputIndex += 1
+            outputIndex += 1
+        else:
+            if inputIndex + 2 > len(inputBuffer):
+                return recombine(outputBuffer)
+            length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
+
+            inputIndex += 2
+            offset = length // 8
+            length = length % 8
+            try:
+                if length == 7:
+                    if nibbleIndex == 0:
+                        nibbleIndex = inputIndex
+                        length = inputBuffer[inputIndex] % 16
+                        inputIndex += 1
+                    else:
+                        length = inputBuffer[nibbleIndex] // 16
+                        nibbleIndex = 0
+
+                    if length == 15:
+                        length = inputBuffer[inputIndex]
+                        inputIndex += 1
+                        if length == 255:
+                            if inputIndex + 2 > len(inputBuffer):
+                                return recombine(outputBuffer)
+                            length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
+                            inputIndex = inputIndex + 2
+                            length = length - (15 + 7)
+                        length = length + 15
+                    length = length + 7
+            except IndexError:
+                return recombine(outputBuffer)
+            length = length + 3
+
+            while length != 0:
+                try:
+                    outputBuffer[outputIndex] = outputBuffer[outputIndex - offset - 1]
+                except KeyError:
+                    return recombine(outputBuffer)
+                outputIndex += 1
+                length -= 1
+
+    return recombine(outputBuffer)
+
+def block_size(header):
+    """The size of the compressed data following an xpress header"""
+    size = ((header[0xb] << 24) + (header[0xa] << 16) + (header[0x9] << 8)) >> 10
+    size = size + 1
+    if (size % 8) == 0:
+        return size
+    return (size & ~7) + 8
+
+def find_blocks(filename, count):
+    """Returns up to count compressed blocks from the hibernation file"""
+    blocks = []
+    data = bytearray()
+    with open(filename, 'rb') as fd:
+
+        def fill(length):
+            """Reads on until data holds at least length bytes"""
+            while len(data) < length:
+                more = fd.read(CHUNK_SIZE)
+                if not more:
+                    return False
+                data.extend(more)
+            return True
+
+        while len(blocks) < count:
+            offset = data.find(XPRESS_MAGIC)
+            if offset < 0:
+                ## Keep the tail in case the magic is split across chunks
+                del data[:max(len(data) - len(XPRESS_MAGIC) + 1, 0)]
+                if not fill(len(data) + 1):
+                    break
+                continue
+
+            if not fill(offset + 0x20):
+                break
+            size = block_size(data[offset:offset + 0x20])
+            if not fill(offset + 0x20 + size):
+                break
+            if size != xpress.BLOCK_SIZE:
+                blocks.append(bytes(data[offset + 0x20:offset + 0x20 + size]))
+            del data[:offset + 0x20 + size]
+
+    return blocks
+
+class XpressEncoder(object):
+    """A simple greedy XPRESS (plain LZ77) compressor, only meant for
+    generating blocks to decode"""
+
+    def __init__(self):
+        self.output = bytearray()
+        self.indicator_pos = 0
+        self.indicator = 0
+        self.bits = 32
+        self.nibble_pos = None
+
+    def flag(self, bit):
+        """Adds an indicator bit, starting a new indicator when full"""
+        if self.bits == 32:
+            self.flush()
+            self.indicator_pos = len(self.output)
+            self.indicator = 0
+            self.bits = 0
+            self.output.extend(bytes(4))
+        self.indicator |= bit << (31 - self.bits)
+        self.bits += 1
+
+    def flush(self):
+        if self.output:
+            self.output[self.indicator_pos:self.indicator_pos + 4] = pack("<L", self.indicator)
+
+    def nibble(self, value):
+        """Lengths share a byte between two nibbles, low one first"""
+        if self.nibble_pos is None:
+            self.nibble_pos = len(self.output)
+            self.output.append(value)
+        else:
+            self.output[self.nibble_pos] |= value << 4
+            self.nibble_pos = None
+
+    def literal(self, byte):
+        self.flag(0)
+        self.output.append(byte)
+
+    def match(self, offset, length):
+        self.flag(1)
+        length -= 3
+        self.output.extend(pack("<H", ((offset - 1) << 3) | min(length, 7)))
+        if length < 7:
+            return
+        length -= 7
+        self.nibble(min(length, 15))
+        if length < 15:
+            return
+        length -= 15
+        if length < 255:
+            self.output.append(length)
+            return
+        self.output.append(255)
+        self.output.extend(pack("<H", length + 15 + 7))
+
+    def encode(self, data):
+        heads = {}
+        i = 0
+        while i < len(data):
+            best_length, best_offset = 0, 0
+            limit = min(len(data) - i, 0xffff + 3)
+            for j in reversed(heads.get(data[i:i + 3], [])):
+                if i - j > 0x2000:
+                    break
+                length = 0
+                while length < limit and data[j + length] == data[i + length]:
+                    length += 1
+                if length > best_length:
+                    best_length, best_offset = length, i - j
+
+            if best_length >= 3:
+                self.match(best_offset, best_length)
+                step = best_length
+            else:
+                self.literal(data[i])
+                step = 1
+
+            ## Only remember the last few positions of each prefix
+            for k in range(i, min(i + step, len(data) - 2)):
+                chain = heads.setdefault(data[k:k + 3], [])
+                chain.append(k)
+                if len(chain) > 4:
+                    del chain[0]
+            i += step
+
+        self.flush()
+        return bytes(self.output)
+
+def generate_blocks(count, seed = 0):
+    """Returns (compressed blocks, decompressed blocks) of count 64KB
+    blocks of generated data: zero runs, text, tables of small integers
+    and random bytes"""
+    rng = random.Random(seed)
+    words = [b"kernel32", b"ntdll", b"the", b"Process", b"\\Device\\HarddiskVolume1",
+             b"Windows", b"system32", b"svchost.exe", b"0x", b"HKEY_LOCAL_MACHINE"]
+    blocks = []
+    pages = []
+    for _ in range(count):
+        page = bytearray()
+        while len(page) < xpress.BLOCK_SIZE:
+            kind = rng.random()
+            if kind < 0.3:
+                page.extend(bytes(rng.randrange(16, 2048)))
+            elif kind < 0.55:
+                text = b" ".join(rng.choice(words) for _ in range(rng.randrange(4, 64)))
+                if rng.random() < 0.5:
+                    text = text.decode().encode("utf-16-le")
+                page.extend(text)
+            elif kind < 0.8:
+                base = rng.randrange(0x80000000, 0x80800000, 8)
+                for _ in range(rng.randrange(4, 128)):
+                    page.extend(pack("<L", base + rng.randrange(0, 0x1000, 8)))
+            else:
+                page.extend(rng.randbytes(rng.randrange(16, 512)))
+        page = bytes(page[:xpress.BLOCK_SIZE])
+        pages.append(page)
+        blocks.append(XpressEncoder().encode(page))
+    return blocks, pages
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    count = 100
+    if len(sys.argv) > 2:
+        count = int(sys.argv[2])
+
+    pages = None
+    if sys.argv[1] == "--generate":
+        blocks, pages = generate_blocks(count)
+    else:
+        blocks = find_blocks(sys.argv[1], count)
+        if not blocks:
+            print("No compressed xpress blocks found in {0}".format(sys.argv[1]))
+            sys.exit(1)
+
+    compressed = sum(len(b) for b in blocks)
+    print("{0} blocks, {1} bytes compressed".format(len(blocks), compressed))
+
+    original, original_time = timed(lambda: [original_decode(b) for b in blocks])
+    current, current_time = timed(lambda: [xpress.xpress_decode(b) for b in blocks])
+    batch, batch_time = timed(xpress.xpress_decode_blocks, blocks)
+
+    if original != current or current != batch or (pages is not None and current != pages):
+        print("The decoders do not agree!")
+        sys.exit(1)
+
+    decompressed = sum(len(b) for b in current)
+    for name, duration in [("original", original_time),
+                           ("xpress_decode", current_time),
+                           ("xpress_decode_blocks", batch_time)]:
+        print("{0:<22} {1:8.3f}s {2:8.2f} MB/s".format(name, duration,
+                                                    decompressed / max(duration, 1e-9) / 0x100000))
+    print("xpress_decode is {0:.1f}x faster".format(original_time / max(current_time, 1e-9)))
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,9 @@
 
 #pylint: disable-msg=C0111
 
+import atexit
+import weakref
+import collections
 import volatility.obj as obj
 import volatility.registry as registry
 import volatility.debug as debug
@@ -193,3 +196,149 @@ class BufferAddressSpace(BaseAddressSpace):
 
     def get_available_addresses(self):
         yield (self.base_offset, len(self.data))
+
+## This is also only used internally - utils.load_as places it between
+## the layers of a stack to cache the pages the upper layer reads from
+## the (translating) layer beneath it.
+class CachedAddressSpace(BaseAddressSpace):
+    """ Serves small reads from a bounded LRU cache of the base's pages.
+
+    Runs of adjacent pages which are not cached are read from the base
+    in one go. Anything the cache can not answer exactly as the base
+    would (reads bigger than max_cached_read, pages the base can only
+    partly read) is passed straight through to the base.
+    """
+    page_size = 0x1000
+    ## Reads bigger than this (e.g. scanner blocks) bypass the cache
+    max_cached_read = 0x10000
+
+    def __init__(self, base, config, *args, **kwargs):
+        BaseAddressSpace.__init__(self, base, config, *args, **kwargs)
+        self.name = base.name
+        self.cache_size = (config.PAGE_CACHE or 0) * 1024 * 1024
+        self.pages = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        _caches.add(self)
+
+    @staticmethod
+    def register_options(config):
+        config.add_option("PAGE-CACHE", default = 16, type = 'int',
+                          cache_invalidator = False,
+                          help = "Size (in MB) of the page cache between address spaces (0 to disable)")
+
+    def __getattr__(self, attr):
+        ## Everything but reading is up to the base
+        if attr.startswith('__') or 'base' not in self.__dict__:
+            raise AttributeError(attr)
+        return getattr(self.base, attr)
+
+    def __eq__(self, other):
+        if isinstance(other, CachedAddressSpace):
+            other = other.base
+        return self.base == other
+
+    def __hash__(self):
+        return id(self)
+
+    def hit_rate(self):
+        """Returns the proportion of pages served from the cache"""
+        total = self.hits + self.misses
+        if not total:
+            return 0.0
+        return float(self.hits) / total
+
+    def stats(self):
+        return "{0}: {1} hits, {2} misses ({3:.1%}), {4} pages cached".format(
+            self.base.__class__.__name__, self.hits, self.misses, self.hit_rate(), len(self.pages))
+
+    def _read_pages(self, addr, length):
+        """Returns the pages covering addr to addr + length joined 
+        together, or None if the base could not read one of them fully"""
+        size = self.page_size
+        first = addr - addr % size
+        end = addr + length
+        result = []
+        missing = []
+
+        page = first
+        while page < end:
+            data = self.pages.get(page)
+            if data is None:
+                missing.append(page)
+                result.append(None)
+            else:
+                self.pages.move_to_end(page)
+                self.hits += 1
+                result.append(data)
+            page += size
+
+        ## Read each run of adjacent missing pages with a single read
+        i = 0
+        while i < len(missing):
+            j = i + 1
+            while j < len(missing) and missing[j] == missing[j - 1] + size:
+                j += 1
+            run = missing[i]
+            count = j - i
+            data = self.base.read(run, count * size)
+            if not data or len(data) != count * size:
+                return None
+            self.misses += count
+            for k in range(count):
+                page = run + k * size
+                chunk = data[k * size:(k + 1) * size]
+                result[(page - first) // size] = chunk
+                self.pages[page] = chunk
+            i = j
+
+        while len(self.pages) * size > self.cache_size:
+            self.pages.popitem(last = False)
+
+        start = addr - first
+        return b''.join(result)[start:start + length]
+
+    def read(self, addr, length):
+        if length <= self.max_cached_read and self.cache_size:
+            data = self._read_pages(addr, length)
+            if data is not None:
+                return data
+        return self.base.read(addr, length)
+
+    def zread(self, addr, length):
+        if length <= self.max_cached_read and self.cache_size:
+            data = self._read_pages(addr, length)
+            if data is not None:
+                return data
+        return self.base.zread(addr, length)
+
+    def is_valid_address(self, addr):
+        return self.base.is_valid_address(addr)
+
+    def get_available_addresses(self):
+        return self.base.get_available_addresses()
+
+    def write(self, addr, buf):
+        size = self.page_size
+        page = addr - addr % size
+        while page < addr + len(buf):
+            self.pages.pop(page, None)
+            page += size
+        return self.base.write(addr, buf)
+
+## Every cache, so their hit rates can be reported when we are done
+_caches = weakref.WeakSet()
+
+def report_caches():
+    for cache in _caches:
+        debug.debug("Page cache for " + cache.stats())
+
+atexit.register(report_caches)
+
+def layers(address_space):
+    """Yields the layers of an address space stack from the top down,
+    leaving out the page caches load_as puts between them"""
+    while address_space is not None:
+        if not isinstance(address_space, CachedAddressSpace):
+            yield address_space
+        address_space = address_space.base
@@ -450,7 +450,8 @@ class CacheStorage(object):
         filename = self.filename(url)
 
         debug.debug("Loading from {0}".format(filename))
-        data = open(filename).read()
+        with open(filename, 'rb') as fd:
+            data = fd.read()
 
         debug.trace(level = 3)
         return pickle.loads(data)
@@ -472,7 +473,7 @@ class CacheStorage(object):
         try:
             data = pickle.dumps(payload)
             debug.debug("Dumping filename {0}".format(filename))
-            fd = open(filename, 'w')
+            fd = open(filename, 'wb')
             fd.write(data)
             fd.close()
         except (pickle.PickleError, TypeError):
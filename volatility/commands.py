@@ -56,6 +56,10 @@ class Command(object):
                           cache_invalidator = False,
                           short_option = 'v', help = 'Verbose information')
 
+        config.add_option("SCAN-WORKERS", default = 1, type = 'int',
+                          cache_invalidator = False,
+                          help = "Number of processes to use when scanning or converting memory")
+
     @classmethod
     def help(cls):
         """ This function returns a string that will be displayed when a
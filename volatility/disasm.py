@@ -0,0 +1,168 @@
+# Volatility
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+#
+
+""" Disassembly shared by the plugins which look at code.
+
+decompose() decodes small windows of code, such as function
+prologues, and remembers the instructions decoded for each window's
+address and bytes. The same prologue is common to many processes (and
+is often checked by more than one plugin), so it is only decoded once.
+
+Code holds a larger region, such as a PE section, which is read once
+and decoded in a single pass. Its instructions (indexed by address)
+and the pointers dereferenced by indirect calls and jumps are then
+served from it, without going back to the address space.
+"""
+
+import struct
+import bisect
+import collections
+
+try:
+    import distorm3
+    has_distorm3 = True
+except ImportError:
+    has_distorm3 = False
+
+## Windows larger than this are not remembered by decompose()
+MAX_WINDOW = 0x200
+## How many windows decompose() remembers
+WINDOW_CACHE_SIZE = 0x4000
+
+_windows = collections.OrderedDict()
+
+def decode_mode(bits):
+    """Returns the distorm3 mode for a profile's memory model"""
+    if bits == '32bit':
+        return distorm3.Decode32Bits
+    return distorm3.Decode64Bits
+
+def decompose(address, data, bits = '32bit'):
+    """Returns the instructions in data (found at address) as a list
+    of distorm3 instructions"""
+    if len(data) > MAX_WINDOW:
+        return list(distorm3.Decompose(address, data, decode_mode(bits)))
+
+    key = (int(address), bytes(data), bits)
+    try:
+        ops = _windows[key]
+        _windows.move_to_end(key)
+        return ops
+    except KeyError:
+        pass
+
+    ops = list(distorm3.Decompose(address, data, decode_mode(bits)))
+    _windows[key] = ops
+    if len(_windows) > WINDOW_CACHE_SIZE:
+        _windows.popitem(last = False)
+    return ops
+
+class Code(object):
+    """A region of code, decoded once"""
+
+    def __init__(self, start, data, bits = '32bit'):
+        """
+        @param start: the address of the region
+        @param data: the region's bytes (as read with zread)
+        @param bits: the memory model, 32bit or 64bit
+        """
+        self.start = int(start)
+        self.data = data
+        self.bits = bits
+        self.end = self.start + len(data)
+        if bits == '32bit':
+            self.pointer = struct.Struct("<I")
+        else:
+            self.pointer = struct.Struct("<Q")
+        self.ops = None
+        self.addresses = None
+
+    @classmethod
+    def read(cls, addr_space, start, length):
+        """Reads a region of code from addr_space"""
+        bits = addr_space.profile.metadata.get('memory_model', '32bit')
+        return cls(start, addr_space.zread(start, length), bits)
+
+    def is_zero(self):
+        return self.data.count(0) == len(self.data)
+
+    def contains(self, address, length = 1):
+        return self.start <= address and address + length <= self.end
+
+    def zread(self, address, length):
+        """Returns the bytes of the region at address"""
+        offset = address - self.start
+        return self.data[offset:offset + length]
+
+    def read_pointer(self, address):
+        """Returns the pointer at address, or None if it is not in the region"""
+        if not self.contains(address, self.pointer.size):
+            return None
+        return self.pointer.unpack_from(self.data, address - self.start)[0]
+
+    def instructions(self):
+        """Returns all the instructions in the region, from a linear
+        sweep with a single call to distorm3"""
+        if self.ops is None:
+            self.ops = list(distorm3.Decompose(self.start, self.data, decode_mode(self.bits)))
+        return self.ops
+
+    def instructions_at(self, address, length):
+        """Returns the instructions which start at address and lie
+        within length bytes of it, looked up in the linear sweep by
+        address. If the sweep has no instruction starting at address
+        (it was out of step after some data), just that window is 
+        decoded instead."""
+        ops = self.instructions()
+        if self.addresses is None:
+            self.addresses = [ op.address for op in ops ]
+
+        i = bisect.bisect_left(self.addresses, address)
+        if i == len(ops) or self.addresses[i] != address:
+            return decompose(address, self.zread(address, length), self.bits)
+
+        end = address + length
+        result = []
+        while i < len(ops) and ops[i].address + ops[i].size <= end:
+            result.append(ops[i])
+            i += 1
+        return result
+
+    def indirect_branches(self):
+        """Yields (instruction, pointer address) for each CALL or JMP
+        through a pointer in memory (i.e. through an IAT entry)
+
+        x86:
+        CALL DWORD [0x1000400]
+        JMP  DWORD [0x1000400]
+
+        x64:
+        CALL QWORD [RIP+0x989d]
+        """
+        for op in self.instructions():
+            if not op.valid:
+                continue
+            if not ((op.flowControl == 'FC_CALL' and op.mnemonic == "CALL") or
+                    (op.flowControl == 'FC_UNC_BRANCH' and op.mnemonic == "JMP")):
+                continue
+
+            if self.bits == '32bit':
+                if op.operands[0].type == 'AbsoluteMemoryAddress':
+                    yield op, op.operands[0].disp & 0xffffffff
+            elif ('FLAG_RIP_RELATIVE' in op.flags and
+                    op.operands[0].type == 'AbsoluteMemory'):
+                yield op, op.address + op.size + op.operands[0].disp
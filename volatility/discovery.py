@@ -0,0 +1,257 @@
+# Volatility
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+#
+
+""" Remembers what was discovered about an image between runs.
+
+Finding the address space stack, the DTB and the KDBG (and guessing
+the profile in imageinfo) is repeated by every plugin run against an
+image. With --discovery-cache the results are kept in a small sidecar
+file next to the image (or in the cache directory if the image's
+directory is not writable):
+
+    /tmp/foobar.img.volinfo
+
+The sidecar is only trusted if the image still has the same path, size
+and modification time, and the same contents at a sample of pages. It
+is JSON rather than a pickle since it lives next to the evidence and
+might not have been written by us.
+
+Everything recorded is per profile, since the address spaces and the
+kernel structures found depend on it. Recorded values are only ever
+hints - the address spaces and the KDBG are still validated as usual,
+and the normal discovery runs if they fail.
+"""
+
+import os
+import json
+import hashlib
+import urllib.request
+import volatility.conf as conf
+import volatility.debug as debug
+import volatility.addrspace as addrspace
+import volatility.cache #pylint: disable-msg=W0611
+config = conf.ConfObject()
+
+config.add_option("DISCOVERY-CACHE", default = False, action = "store_true",
+                  cache_invalidator = False,
+                  help = "Remember the address spaces, DTB, KDBG and profile "
+                         "found for an image in a sidecar file")
+
+## Bump this when the meaning of the recorded values changes
+VERSION = 1
+
+## How many pages of the image are hashed into its fingerprint
+SAMPLE_PAGES = 16
+SAMPLE_SIZE = 0x1000
+
+def image_path(config):
+    """Returns the path of the image in config.LOCATION, or None if it isn't a local file"""
+    location = config.LOCATION
+    if not location or not location.startswith("file://"):
+        return None
+    path = urllib.request.url2pathname(location[7:])
+    if not os.path.isfile(path):
+        return None
+    return os.path.abspath(path)
+
+def fingerprint(path):
+    """Identifies the contents of the image at path without reading all of it"""
+    st = os.stat(path)
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fd:
+        step = max(st.st_size // SAMPLE_PAGES, SAMPLE_SIZE)
+        for offset in range(0, st.st_size, step):
+            fd.seek(offset)
+            digest.update(fd.read(SAMPLE_SIZE))
+        ## Always include the end of the image
+        fd.seek(max(st.st_size - SAMPLE_SIZE, 0))
+        digest.update(fd.read(SAMPLE_SIZE))
+
+    return [path, st.st_size, st.st_mtime_ns, digest.hexdigest()]
+
+def sidecar_filenames(path, suffix):
+    """The places a sidecar file for the image at path may live, in order of preference"""
+    result = []
+    if os.access(os.path.dirname(path), os.W_OK):
+        result.append(path + suffix)
+    result.append(os.path.join(config.CACHE_DIRECTORY, os.path.basename(path) + suffix))
+    return result
+
+class DiscoveryIndex(object):
+    """The discovery results recorded for a single image"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fingerprint = fingerprint(path)
+        self.profile = None
+        self.profiles = {}
+
+        for filename in self.filenames():
+            if self.load(filename):
+                debug.debug("Loaded discovery results from {0}".format(filename))
+                break
+
+    def filenames(self):
+        return sidecar_filenames(self.path, ".volinfo")
+
+    def load(self, filename):
+        try:
+            with open(filename) as fd:
+                data = json.load(fd)
+        except (IOError, OSError, ValueError):
+            return False
+
+        if not isinstance(data, dict) or data.get('version') != VERSION:
+            return False
+
+        if data.get('fingerprint') != self.fingerprint:
+            debug.debug("Ignoring stale discovery results in {0}".format(filename))
+            return False
+
+        self.profile = data.get('profile')
+        self.profiles = data.get('profiles', {})
+        return True
+
+    def save(self):
+        data = dict(version = VERSION,
+                    fingerprint = self.fingerprint,
+                    profile = self.profile,
+                    profiles = self.profiles)
+
+        for filename in self.filenames():
+            try:
+                directory = os.path.dirname(filename)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                ## Write then rename so concurrent runs never see half a file
+                tmp = "{0}.{1}".format(filename, os.getpid())
+                with open(tmp, 'w') as fd:
+                    json.dump(data, fd, indent = 1, sort_keys = True)
+                os.replace(tmp, filename)
+                return
+            except (IOError, OSError) as e:
+                debug.debug("Unable to save discovery results to {0}: {1}".format(filename, e))
+
+    def get(self, profile, key):
+        return self.profiles.get(profile, {}).get(key)
+
+    def set(self, profile, key, value):
+        if self.get(profile, key) == value:
+            return
+        self.profiles.setdefault(profile, {})[key] = value
+        self.save()
+
+## Indexes already loaded by this process, keyed by image path
+_indexes = {}
+
+def get_index(config):
+    """Returns the DiscoveryIndex for the configured image, or None if disabled"""
+    if not config.DISCOVERY_CACHE:
+        return None
+
+    path = image_path(config)
+    if path is None:
+        return None
+
+    try:
+        return _indexes[path]
+    except KeyError:
+        pass
+
+    try:
+        index = DiscoveryIndex(path)
+    except (IOError, OSError) as e:
+        debug.debug("Unable to fingerprint {0}: {1}".format(path, e))
+        index = None
+
+    _indexes[path] = index
+    return index
+
+## The values apply() filled in, so they are not taken for settings
+## made by the user (or a plugin) later on
+_applied = {}
+
+def configured(config, option):
+    """Returns whether the user (or a plugin) has set option explicitly"""
+    option = option.lower()
+    if option in config.readonly:
+        if option not in _applied or config.readonly[option] != _applied[option]:
+            return True
+    return (option in config.opts or option in config.cnf_opts or
+            "VOLATILITY_" + option.upper() in os.environ)
+
+def inject(config, option, value):
+    """Sets option to a recorded value"""
+    _applied[option.lower()] = value
+    config.update(option, value)
+
+def withdraw(config, option):
+    """Removes a recorded value set by inject, if it is still in place"""
+    option = option.lower()
+    if option in _applied and config.readonly.get(option) == _applied[option]:
+        del config.readonly[option]
+    _applied.pop(option, None)
+
+def recall(config, key):
+    """Returns the value recorded under key for the configured profile, or None"""
+    index = get_index(config)
+    if index is None:
+        return None
+    return index.get(config.PROFILE, key)
+
+def remember(config, key, value):
+    """Records value under key for the configured profile"""
+    index = get_index(config)
+    if index is not None:
+        index.set(config.PROFILE, key, value)
+
+def remember_profile(config, profile):
+    """Records the profile to use for the image when none is given"""
+    index = get_index(config)
+    if index is not None and index.profile != profile:
+        index.profile = profile
+        index.save()
+
+def apply(config):
+    """Fills in the profile and DTB from the recorded results,
+    unless they have been configured explicitly.
+
+    This runs for every address space loaded, so a DTB recorded for
+    one profile is withdrawn again when another profile is tried.
+    """
+    index = get_index(config)
+    if index is None:
+        withdraw(config, "DTB")
+        return
+
+    if index.profile and not configured(config, "PROFILE"):
+        debug.debug("Using recorded profile {0}".format(index.profile))
+        inject(config, "PROFILE", index.profile)
+
+    if configured(config, "DTB"):
+        return
+
+    dtb = index.get(config.PROFILE, "dtb")
+    if dtb:
+        debug.debug("Using recorded DTB {0:#x}".format(dtb))
+        inject(config, "DTB", dtb)
+    else:
+        withdraw(config, "DTB")
+
+def stack_names(space):
+    """Returns the class names of an address space stack, bottom first"""
+    return [layer.__class__.__name__ for layer in addrspace.layers(space)][::-1]
@@ -138,22 +138,17 @@ class DWARFParser(object):
         The header is level, statement_id, and kind followed by key value pairs.
         """
         # Does the header match?
-        m = self.dwarf_header_regex.match(line)
+        m = self.dwarf_header_regex2.match(line)
 
-        if self.dwarf_header_regex2.match(line):
-            m = self.dwarf_header_regex2.match(line)
+        if m:
             self.base = 16
+        else:
+            m = self.dwarf_header_regex.match(line)
 
         if m:
             parsed = m.groupdict()
-            parsed['data'] = {}
             # Now parse the key value pairs
-            while m:
-                i = m.end()
-                m = self.dwarf_key_val_regex.search(line, i)
-                if m:
-                    d = m.groupdict()
-                    parsed['data'][d['keyname']] = d['val']
+            parsed['data'] = dict(self.dwarf_key_val_regex.findall(line, m.end()))
 
             if parsed['kind'] in ('DW_TAG_formal_parameter', 'DW_TAG_variable'):
                 self.process_variable(parsed['data'])
@@ -28,7 +28,6 @@
 
 #pylint: disable-msg=C0111,W0613
 import sys
-import collections
 from functools import reduce
 if __name__ == '__main__':
     sys.path.append(".")
@@ -36,7 +35,9 @@ if __name__ == '__main__':
 
 import pickle as pickle # pickle implementation must match that in volatility.cache
 import struct, copy, operator
+import importlib
 import volatility.debug as debug
+import volatility.registry as registry
 import volatility.fmtspec as fmtspec
 import volatility.exceptions as exceptions
 import volatility.plugins.overlays.native_types as native_types
@@ -48,6 +49,17 @@ Curry = functools.partial
 
 import traceback
 
+## Compiled struct.Struct objects, keyed by format string
+_structs = {}
+
+def compiled_struct(format_string):
+    """ Returns a (cached) struct.Struct for the format string """
+    try:
+        return _structs[format_string]
+    except KeyError:
+        result = _structs[format_string] = struct.Struct(format_string)
+        return result
+
 class classproperty(property):
     def __get__(self, cls, owner):
         # We don't think pylint knows what it's talking about here
@@ -186,12 +198,16 @@ class BaseObject(object):
     # Benefit is objects will never fail with duff parameters
     # Downside is typos won't show up and be difficult to diagnose
     def __init__(self, theType, offset, vm, native_vm = None, parent = None, name = None, **kwargs):
-        self._vol_theType = theType
-        self._vol_offset = offset
-        self._vol_vm = vm
-        self._vol_native_vm = native_vm
-        self._vol_parent = parent
-        self._vol_name = name
+        ## Objects are created constantly, so we bypass __setattr__ here
+        self.__dict__.update(_vol_theType = theType,
+                             _vol_offset = offset,
+                             _vol_vm = vm,
+                             _vol_native_vm = native_vm,
+                             _vol_parent = parent,
+                             _vol_name = name,
+                             ## A (offset, data, vm) copy of an enclosing
+                             ## struct, see CType.snapshot
+                             _vol_snapshot = kwargs.get('snapshot'))
 
         if not self.obj_vm.is_valid_address(self.obj_offset):
             raise InvalidOffsetError("Invalid Address 0x{0:08X}, instantiating {1}".format(offset, self.obj_name))
@@ -231,6 +247,27 @@ class BaseObject(object):
     def proxied(self, attr):
         return None
 
+    def _snapshot_kwargs(self):
+        """ Returns the kwargs to hand our snapshot on to child objects """
+        if self._vol_snapshot is None:
+            return {}
+        return dict(snapshot = self._vol_snapshot)
+
+    def snapshot_read(self, length):
+        """ Returns length bytes at our offset from the snapshot of an
+        enclosing struct, or None if there is no snapshot covering them.
+        """
+        snapshot = self._vol_snapshot
+        if snapshot is None:
+            return None
+
+        start, data, vm = snapshot
+        relative = self._vol_offset - start
+        if vm is not self._vol_vm or relative < 0 or relative + length > len(data):
+            return None
+
+        return data[relative:relative + length]
+
     def newattr(self, attr, value):
         """Sets a new attribute after the object has been created"""
         return BaseObject.__setattr__(self, attr, value)
@@ -431,14 +468,17 @@ class NativeType(BaseObject, NumericProxyMixIn):
         return self.v()
 
     def size(self):
-        return struct.calcsize(self.format_string)
+        return compiled_struct(self.format_string).size
 
     def v(self):
-        data = self.obj_vm.read(self.obj_offset, self.size())
+        compiled = compiled_struct(self.format_string)
+        data = self.snapshot_read(compiled.size)
+        if data is None:
+            data = self.obj_vm.read(self.obj_offset, compiled.size)
         if not data:
             return NoneObject("Unable to read {0} bytes from {1}".format(self.size(), self.obj_offset))
 
-        (val,) = struct.unpack(self.format_string, data)
+        (val,) = compiled.unpack(data)
 
         # Ensure that integer NativeTypes are converted to longs
         # to avoid integer boundaries when doing __rand__ proxying
@@ -577,7 +617,7 @@ class Array(BaseObject):
         BaseObject.__init__(self, theType, offset, vm,
                             parent = parent, name = name, **kwargs)
 
-        if isinstance(count, collections.Callable):
+        if callable(count):
             count = count(parent)
 
         self.count = int(count)
@@ -588,7 +628,8 @@ class Array(BaseObject):
         else:
             self.target = target
 
-        self.current = self.target(offset = offset, vm = vm, parent = self, name = name)
+        self.current = self.target(offset = offset, vm = vm, parent = self, name = name,
+                                   **self._snapshot_kwargs())
         if self.current.size() == 0:
             ## It is an error to have a zero sized element
             debug.debug("Array with 0 sized members???", level = 10)
@@ -661,7 +702,8 @@ class Array(BaseObject):
                                vm = self.obj_vm,
                                native_vm = self.obj_native_vm,
                                parent = self,
-                               name = "{0} {1}".format(self.obj_name, pos))
+                               name = "{0} {1}".format(self.obj_name, pos),
+                               **self._snapshot_kwargs())
         else:
             return NoneObject("Array {0} invalid member {1}".format(self.obj_name, pos),
                               self.obj_vm.profile.strict)
@@ -672,26 +714,134 @@ class Array(BaseObject):
         if item != None:
             item.write(value)
 
+class Member(object):
+    """ The precompiled layout of a single struct member.
+
+    offset is relative to the start of the struct, unless absolute is
+    set, in which case absolute(struct) returns the member's offset.
+    Members which are aliases have alias set instead, and alias(struct)
+    returns the member itself. cls is the constructor for the member and
+    format_string is its struct format if it is a NativeType.
+    """
+    __slots__ = ['name', 'offset', 'absolute', 'alias', 'cls', 'format_string']
+
+    def __init__(self, name, offset = None, absolute = None, alias = None, cls = None):
+        self.name = name
+        self.offset = offset
+        self.absolute = absolute
+        self.alias = alias
+        self.cls = cls
+        self.format_string = None
+        if isinstance(cls, Curry):
+            self.format_string = cls.keywords.get('format_string')
+
+    def __getstate__(self):
+        return dict((k, getattr(self, k)) for k in self.__slots__)
+
+    def __setstate__(self, state):
+        for k, v in list(state.items()):
+            setattr(self, k, v)
+
+def compile_layout(members):
+    """ Turns a CType members dict into a dict of Member layouts """
+    layout = {}
+    for name, element in list(members.items()):
+        if callable(element):
+            layout[name] = Member(name, alias = element)
+            continue
+
+        offset, cls = element
+        if callable(offset):
+            layout[name] = Member(name, absolute = offset, cls = cls)
+        else:
+            layout[name] = Member(name, offset = int(offset), cls = cls)
+
+    return layout
+
+class MemberDescriptor(object):
+    """ Instantiates a struct member when it is accessed as an attribute.
+
+    These are placed on the accessor classes so that member access does
+    not have to fail a normal attribute lookup before __getattr__.
+    """
+    __slots__ = ['name']
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance.m(self.name)
+
+## Subclasses of the object classes carrying a MemberDescriptor for each
+## member, keyed by (object class, type name). These are shared by all
+## profiles, so they carry the members of every profile which defines
+## the type - m() still raises for members missing from an instance.
+_accessor_classes = {}
+
+def accessor_class(cls, cname, names):
+    """ Returns the subclass of cls with member descriptors for cname """
+    key = (cls, cname)
+    result = _accessor_classes.get(key)
+    if result is None:
+        ## Register the class in this module so its instances can be pickled
+        qualname = "_accessors_{0}_{1}_{2}".format(cls.__module__.replace('.', '_'), cls.__name__, cname)
+        result = type(cls.__name__, (cls,), dict(__module__ = __name__, __qualname__ = qualname))
+        globals()[qualname] = result
+        _accessor_classes[key] = result
+
+    for name in names:
+        ## Never hide methods or properties of the object class
+        if not hasattr(result, name):
+            setattr(result, name, MemberDescriptor(name))
+
+    return result
+
 class CType(BaseObject):
     """ A CType is an object which represents a c struct """
-    def __init__(self, theType, offset, vm, name = None, members = None, struct_size = 0, **kwargs):
+    def __init__(self, theType, offset, vm, name = None, members = None, struct_size = 0, layout = None, **kwargs):
         """ This must be instantiated with a dict of members. The keys
         are the offsets, the values are Curried Object classes that
         will be instantiated when accessed.
+
+        layout is the precompiled form of members (see compile_layout),
+        which profiles provide so that it is only built once per type.
         """
         if not members:
             # Warn rather than raise an error, since some types (_HARDWARE_PTE, for example) are generated without members
             debug.debug("No members specified for CType {0} named {1}".format(theType, name), level = 2)
             members = {}
 
-        self.members = members
-        self.struct_size = struct_size
+        if layout is None:
+            layout = compile_layout(members)
+
+        self.__dict__.update(members = members,
+                             layout = layout,
+                             struct_size = struct_size)
         BaseObject.__init__(self, theType, offset, vm, name = name, **kwargs)
         self.__initialized = True
 
     def size(self):
         return self.struct_size
 
+    def snapshot(self):
+        """ Reads the whole struct from the address space in one go.
+
+        From then on, members of this struct (and of any structs or
+        arrays nested within it) decode their values from this copy
+        instead of each reading the address space separately. This
+        is much faster when several members are used, but the values
+        will not reflect later changes to the underlying memory.
+
+        If the struct can not be read in full nothing changes. Returns
+        self so it can be used inline.
+        """
+        data = self.obj_vm.read(self.obj_offset, self.struct_size)
+        if data and len(data) == self.struct_size:
+            self._vol_snapshot = (self.obj_offset, data, self.obj_vm)
+        return self
+
     def __repr__(self):
         return "[{0} {1}] @ 0x{2:08X}".format(self.__class__.__name__, self.obj_name or '',
                                      self.obj_offset)
@@ -711,31 +861,38 @@ class CType(BaseObject):
         return int(self.obj_offset)
 
     def m(self, attr):
-        if attr in self.members:
-            # Allow the element to be a callable rather than a list - this is
-            # useful for aliasing member names
-            element = self.members[attr]
-            if isinstance(element, collections.Callable):
-                return element(self)
-
-            offset, cls = element
-        elif attr.find('__') > 0 and attr[attr.find('__'):] in self.members:
-            offset, cls = self.members[attr[attr.find('__'):]]
-        else:
-            ## hmm - tough choice - should we raise or should we not
-            #return NoneObject("Struct {0} has no member {1}".format(self.obj_name, attr))
-            raise AttributeError("Struct {0} has no member {1}".format(self.obj_name, attr))
-
-        if isinstance(offset, collections.Callable):
+        member = self.layout.get(attr)
+        if member is None:
+            ## Handle private (name mangled) members
+            index = attr.find('__')
+            if index > 0:
+                member = self.layout.get(attr[index:])
+
+            if member is None:
+                ## hmm - tough choice - should we raise or should we not
+                #return NoneObject("Struct {0} has no member {1}".format(self.obj_name, attr))
+                raise AttributeError("Struct {0} has no member {1}".format(self.obj_name, attr))
+
+        # Allow the element to be a callable rather than a list - this is
+        # useful for aliasing member names
+        if member.alias is not None:
+            return member.alias(self)
+
+        if member.absolute is not None:
             ## If offset is specified as a callable its an absolute
             ## offset
-            offset = int(offset(self))
+            offset = int(member.absolute(self))
         else:
             ## Otherwise its relative to the start of our struct
-            offset = int(offset) + int(self.obj_offset)
+            offset = member.offset + int(self._vol_offset)
 
         try:
-            result = cls(offset = offset, vm = self.obj_vm, parent = self, name = attr, native_vm = self.obj_native_vm)
+            if self._vol_snapshot is None:
+                result = member.cls(offset = offset, vm = self._vol_vm, parent = self, name = attr,
+                                    native_vm = self.obj_native_vm)
+            else:
+                result = member.cls(offset = offset, vm = self._vol_vm, parent = self, name = attr,
+                                    native_vm = self.obj_native_vm, snapshot = self._vol_snapshot)
         except InvalidOffsetError as e:
             return NoneObject(str(e))
 
@@ -855,6 +1012,11 @@ class Profile(object):
         # Carry out the inital setup
         self.reset()
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # The vtypes are only imported once the profile is used
+        registry.load_on_demand(getattr(cls, '_md_vtype_module', None))
+
     @property
     def applied_modifications(self):
         return self._mods
@@ -885,10 +1047,10 @@ class Profile(object):
         self.compile()
 
     def load_vtypes(self):
-        """ Identifies the module from which to load the vtypes 
-        
-            Eventually this could do the importing directly, and avoid having
-            the profiles loaded in memory all at once.
+        """ Imports the module with the vtypes for this profile and loads them
+
+            The PluginImporter leaves these modules alone, so only the 
+            vtypes of the profiles actually in use are held in memory.
         """
         ntvar = self.metadata.get('memory_model', '32bit')
         self.native_types = copy.deepcopy(self.native_mapping.get(ntvar))
@@ -897,7 +1059,11 @@ class Profile(object):
         if not vtype_module:
             debug.warning("No vtypes specified for this profile")
         else:
-            module = sys.modules.get(vtype_module, None)
+            try:
+                module = importlib.import_module(vtype_module)
+            except ImportError as e:
+                debug.warning("Unable to load vtypes from {0}: {1}".format(vtype_module, e))
+                module = None
 
             # Try to locate the _types dictionary
             for i in dir(module):
@@ -960,6 +1126,19 @@ class Profile(object):
             if name not in self.types:
                 self.types[name] = Curry(self.object_classes[name], name)
 
+        # Now that every type exists, point members which were forward
+        # references straight at their constructor rather than going
+        # through Object each time they are accessed
+        for constructor in list(self.types.values()):
+            layout = getattr(constructor, 'keywords', {}).get('layout')
+            if not layout:
+                continue
+            for member in list(layout.values()):
+                cls = member.cls
+                if (isinstance(cls, Curry) and cls.func is Object and
+                        cls.args and cls.args[0] in self.types):
+                    member.cls = Curry(self.types[cls.args[0]], **cls.keywords)
+
     @classproperty
     @classmethod
     def metadata(cls):
@@ -1003,8 +1182,16 @@ class Profile(object):
         """ Returns a simple check of whether the type is in the profile """
         return theType in self.types
 
+    def _get_layout(self, name):
+        """ Returns the precompiled member layout of a struct, or None """
+        return getattr(self.types.get(name), 'keywords', {}).get('layout')
+
     def get_obj_offset(self, name, member):
         """ Returns a members offset within the struct """
+        layout = self._get_layout(name)
+        if layout and member in layout and layout[member].offset is not None:
+            return layout[member].offset
+
         tmp = self._get_dummy_obj(name)
         offset, _cls = tmp.members[member]
 
@@ -1012,6 +1199,11 @@ class Profile(object):
 
     def get_obj_size(self, name):
         """Returns the size of a struct"""
+        constructor = self.types.get(name)
+        if (self._get_layout(name) is not None and
+                getattr(constructor.func, 'size', None) is CType.size):
+            return constructor.keywords['struct_size']
+
         tmp = self._get_dummy_obj(name)
         return tmp.size()
 
@@ -1212,7 +1404,7 @@ class Profile(object):
         size, raw_members = self.vtypes.get(cname)
         members = {}
         for k, v in list(raw_members.items()):
-            if isinstance(v, collections.Callable):
+            if callable(v):
                 members[k] = v
             elif v[0] == None:
                 debug.warning("{0} has no offset in object {1}. Check that vtypes has a concrete definition for it.".format(k, cname))
@@ -1225,7 +1417,10 @@ class Profile(object):
         else:
             cls = CType
 
-        return Curry(cls, cname, members = members, struct_size = size)
+        cls = accessor_class(cls, cname, list(members.keys()))
+
+        return Curry(cls, cname, members = members, struct_size = size,
+                     layout = compile_layout(members))
 
 class ProfileModification(object):
     """ Class for modifying profiles for additional functionality """
@@ -52,6 +52,7 @@ class AMD64PagedMemory(intel.JKIA32PagedMemoryPae):
     pae = True
     checkname = 'AMD64ValidAS'
     paging_address_space = True
+    page_shifts = (12, 21, 30)
 
     def _cache_values(self):
         '''
@@ -112,13 +113,12 @@ class AMD64PagedMemory(intel.JKIA32PagedMemoryPae):
         '''
         return (pdpte & 0xfffffc0000000) | (vaddr & 0x3fffffff)
 
-    def vtop(self, vaddr):
+    def page_walk(self, vaddr):
         '''
-        Translates virtual addresses into physical offsets.
-        The function returns either None (no valid mapping)
-        or the offset in physical memory where the address maps.
+        Walks the page tables to translate a virtual address.
+        Returns None (no valid mapping) or a tuple of the physical 
+        offset and the page size (as a shift) of the mapping.
         '''
-        vaddr = int(vaddr)
         pml4e = self.get_pml4e(vaddr)
         if not self.entry_present(pml4e):
             # Add support for paged out PML4E
@@ -131,7 +131,7 @@ class AMD64PagedMemory(intel.JKIA32PagedMemoryPae):
             return None
 
         if self.page_size_flag(pdpte):
-            return self.get_one_gig_paddr(vaddr, pdpte)
+            return self.get_one_gig_paddr(vaddr, pdpte), 30
 
         pde = self.get_pde(vaddr, pdpte)
         if not self.entry_present(pde):
@@ -139,14 +139,14 @@ class AMD64PagedMemory(intel.JKIA32PagedMemoryPae):
             return None
 
         if self.page_size_flag(pde):
-            return self.get_two_meg_paddr(vaddr, pde)
+            return self.get_two_meg_paddr(vaddr, pde), 21
 
         pte = self.get_pte(vaddr, pde)
         if not self.entry_present(pte):
             # Add support for paged out PTE
             return None
 
-        return self.get_phys_addr(vaddr, pte)
+        return self.get_phys_addr(vaddr, pte), 12
 
     def get_available_pages(self):
         '''
@@ -157,33 +157,18 @@ class AMD64PagedMemory(intel.JKIA32PagedMemoryPae):
 
         # Pages that hold PDEs and PTEs are 0x1000 bytes each.
         # Each PDE and PTE is eight bytes. Thus there are 0x1000 / 8 = 0x200
-        # PDEs and PTEs we must test.
-        for pml4e in range(0, 0x200):
-            vaddr = pml4e << 39
-            pml4e_value = self.get_pml4e(vaddr)
-            if not self.entry_present(pml4e_value):
-                continue
-            for pdpte in range(0, 0x200):
+        # PDEs and PTEs in each table, which we read and test in bulk.
+        for pml4e, pml4e_value in self.read_table(self.dtb & 0xffffffffff000):
+            for pdpte, pdpte_value in self.read_table(pml4e_value & 0xffffffffff000):
                 vaddr = (pml4e << 39) | (pdpte << 30)
-                pdpte_value = self.get_pdpte(vaddr, pml4e_value)
-                if not self.entry_present(pdpte_value):
-                    continue
                 if self.page_size_flag(pdpte_value):
                     yield (vaddr, 0x40000000)
                     continue
-                tmp2 = vaddr
-                for pde in range(0, 0x200):
-                    vaddr = tmp2 | (pde << 21)
-                    pde_value = self.get_pde(vaddr, pdpte_value)
-                    if not self.entry_present(pde_value):
-                        continue
+                for pde, pde_value in self.read_table(pdpte_value & 0xffffffffff000):
+                    vaddr = (pml4e << 39) | (pdpte << 30) | (pde << 21)
                     if self.page_size_flag(pde_value):
                         yield (vaddr, 0x200000)
                         continue
 
-                    tmp = vaddr
-                    for pte in range(0, 0x200):
-                        vaddr = tmp | (pte << 12)
-                        pte_value = self.get_pte(vaddr, pde_value)
-                        if self.entry_present(pte_value):
-                            yield (vaddr, 0x1000)
+                    for pte, _pte_value in self.read_table(pde_value & 0xffffffffff000):
+                        yield (vaddr | (pte << 12), 0x1000)
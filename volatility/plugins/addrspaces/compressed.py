@@ -0,0 +1,314 @@
+# Volatility
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+#
+
+""" A compressed, indexed image of physical memory.
+
+Images are written by imagecopy --compress and are meant as an
+intermediate format for analysing the same sample repeatedly, without
+parsing a crash dump, hibernation file or LiME image each time.
+
+The layout is:
+
+    header    magic, version, compression, pages per chunk, the end
+              of physical memory and the offset and size of the index
+    chunks    the non-zero pages of each chunk of physical memory,
+              concatenated and compressed on their own
+    index     for each chunk, its first page, file offset, compressed
+              size, and bitmaps of the pages which are present in the
+              image and of those which are all zero
+
+Zero pages are not stored at all. Chunks are decompressed one at a time
+on demand and kept in a small LRU.
+"""
+
+import zlib
+import lzma
+import bisect
+import struct
+import collections
+import volatility.obj as obj
+import volatility.addrspace as addrspace
+
+MAGIC = b"VOLZIMG\x00"
+VERSION = 1
+PAGE_SIZE = 0x1000
+
+## magic, version, compression, pages per chunk, memory end, index offset, index entries
+header_struct = struct.Struct("<8sIIIQQQ")
+## first page, file offset, compressed size
+entry_struct = struct.Struct("<QQI")
+
+COMPRESSORS = {
+    'zlib' : (0, zlib.compress, zlib.decompress),
+    'lzma' : (1, lzma.compress, lzma.decompress),
+}
+
+DECOMPRESSORS = dict((number, decompress) for number, _compress, decompress in COMPRESSORS.values())
+
+class CompressedImageWriter(object):
+    """Writes pages of physical memory out as a compressed image.
+
+    Data should be written in ascending address order for the best
+    results. Out of order data still works, but starts a new chunk.
+    """
+
+    def __init__(self, fd, compression = 'zlib', chunk_pages = 64):
+        self.fd = fd
+        self.compression, self.compress, _decompress = COMPRESSORS[compression]
+        self.chunk_pages = chunk_pages
+        self.index = []
+        self.end = 0
+
+        self.chunk = None
+        self.pages = {}
+
+        self.fd.seek(0)
+        self.fd.write(b"\x00" * header_struct.size)
+
+    def write(self, addr, data):
+        """Adds data at physical address addr to the image"""
+        pos = 0
+        while pos < len(data):
+            page, offset = divmod(addr + pos, PAGE_SIZE)
+            length = min(PAGE_SIZE - offset, len(data) - pos)
+
+            chunk, slot = divmod(page, self.chunk_pages)
+            if chunk != self.chunk:
+                self.flush()
+                self.chunk = chunk
+
+            if length == PAGE_SIZE:
+                self.pages[slot] = data[pos:pos + length]
+            else:
+                ## Partial pages are zero padded
+                buf = bytearray(self.pages.get(slot, b"\x00" * PAGE_SIZE))
+                buf[offset:offset + length] = data[pos:pos + length]
+                self.pages[slot] = bytes(buf)
+
+            pos += length
+
+        self.end = max(self.end, addr + len(data))
+
+    def flush(self):
+        """Compresses and writes out the chunk being built"""
+        if not self.pages:
+            return
+
+        present = 0
+        zero = 0
+        stored = []
+        for slot in sorted(self.pages):
+            page = self.pages[slot]
+            present |= 1 << slot
+            if page.count(0) == PAGE_SIZE:
+                zero |= 1 << slot
+            else:
+                stored.append(page)
+
+        compressed = b''
+        if stored:
+            compressed = self.compress(b''.join(stored))
+
+        offset = self.fd.tell()
+        self.fd.write(compressed)
+        self.index.append((self.chunk * self.chunk_pages, offset, len(compressed), present, zero))
+        self.pages = {}
+
+    def close(self):
+        """Writes out the index and the header"""
+        self.flush()
+
+        bitmap_size = self.chunk_pages // 8
+        index_offset = self.fd.tell()
+        for first_page, offset, size, present, zero in self.index:
+            self.fd.write(entry_struct.pack(first_page, offset, size))
+            self.fd.write(present.to_bytes(bitmap_size, 'little'))
+            self.fd.write(zero.to_bytes(bitmap_size, 'little'))
+
+        self.fd.seek(0)
+        self.fd.write(header_struct.pack(MAGIC, VERSION, self.compression, self.chunk_pages,
+                                         self.end, index_offset, len(self.index)))
+        self.fd.seek(0, 2)
+
+class CompressedImageAddressSpace(addrspace.BaseAddressSpace):
+    """ Address space for images written by imagecopy --compress """
+    order = 2
+    cache = False
+    ## How many decompressed chunks are kept
+    chunk_cache_size = 32
+
+    def __init__(self, base, config, *args, **kwargs):
+        self.as_assert(base, "No base Address Space")
+        addrspace.BaseAddressSpace.__init__(self, base, config, *args, **kwargs)
+
+        header = base.read(0, header_struct.size)
+        self.as_assert(header and len(header) == header_struct.size, "Image too small")
+        (magic, version, compression, self.chunk_pages, self.end,
+         index_offset, entries) = header_struct.unpack(header)
+        self.as_assert(magic == MAGIC, "Invalid compressed image signature")
+        self.as_assert(version == VERSION, "Unsupported compressed image version")
+        self.as_assert(compression in DECOMPRESSORS, "Unknown compression")
+        self.decompress = DECOMPRESSORS[compression]
+
+        self.read_index(index_offset, entries)
+        self.chunks = collections.OrderedDict()
+
+    def read_index(self, offset, entries):
+        bitmap_size = self.chunk_pages // 8
+        entry_size = entry_struct.size + bitmap_size * 2
+        data = self.base.read(offset, entry_size * entries) or b''
+        self.as_assert(len(data) == entry_size * entries, "Truncated index")
+
+        index = []
+        for i in range(entries):
+            pos = i * entry_size
+            first_page, file_offset, size = entry_struct.unpack_from(data, pos)
+            pos += entry_struct.size
+            present = int.from_bytes(data[pos:pos + bitmap_size], 'little')
+            zero = int.from_bytes(data[pos + bitmap_size:pos + bitmap_size * 2], 'little')
+            index.append((first_page, file_offset, size, present, zero))
+
+        ## Chunks written out of order may share their first page
+        index.sort(key = lambda entry: entry[0])
+        self.index = index
+        self.first_pages = [ entry[0] for entry in index ]
+
+    def find_page(self, page):
+        """Returns (index entry number, slot) for a present page, or None"""
+        chunk_start = page - page % self.chunk_pages
+        slot = page - chunk_start
+        i = bisect.bisect_left(self.first_pages, chunk_start)
+        while i < len(self.index) and self.first_pages[i] == chunk_start:
+            if self.index[i][3] >> slot & 1:
+                return i, slot
+            i += 1
+        return None
+
+    def get_chunk(self, i):
+        """Returns the decompressed pages of the i'th chunk"""
+        try:
+            data = self.chunks[i]
+            self.chunks.move_to_end(i)
+            return data
+        except KeyError:
+            pass
+
+        _first_page, offset, size, _present, _zero = self.index[i]
+        data = b''
+        if size:
+            data = self.decompress(self.base.read(offset, size))
+
+        self.chunks[i] = data
+        if len(self.chunks) > self.chunk_cache_size:
+            self.chunks.popitem(last = False)
+        return data
+
+    def read_page(self, page):
+        """Returns the page's data, or None if it is not in the image"""
+        found = self.find_page(page)
+        if found is None:
+            return None
+
+        i, slot = found
+        _first_page, _offset, _size, present, zero = self.index[i]
+        if zero >> slot & 1:
+            return b"\x00" * PAGE_SIZE
+
+        ## The page's position amongst the stored (non-zero) pages
+        stored = present & ~zero & ((1 << slot) - 1)
+        position = bin(stored).count("1") * PAGE_SIZE
+        return self.get_chunk(i)[position:position + PAGE_SIZE]
+
+    def __read_bytes(self, addr, length, pad):
+        result = []
+        end = addr + length
+        while addr < end:
+            page, offset = divmod(addr, PAGE_SIZE)
+            chunk_len = min(PAGE_SIZE - offset, end - addr)
+            data = self.read_page(page)
+            if data is None:
+                if not pad:
+                    return obj.NoneObject("Could not read data at {0:#x}".format(addr))
+                result.append(b"\x00" * chunk_len)
+            else:
+                result.append(data[offset:offset + chunk_len])
+            addr += chunk_len
+
+        return b''.join(result)
+
+    def read(self, addr, length):
+        return self.__read_bytes(addr, length, False)
+
+    def zread(self, addr, length):
+        return self.__read_bytes(addr, length, True)
+
+    def is_valid_address(self, addr):
+        return self.find_page(addr // PAGE_SIZE) is not None
+
+    def _pages(self, zero):
+        """Yields the page numbers of the present pages which are (or
+        with zero False, are not) all zero, in order"""
+        i = 0
+        while i < len(self.index):
+            first_page = self.first_pages[i]
+            ## Merge chunks which were written out of order
+            pages = 0
+            while i < len(self.index) and self.first_pages[i] == first_page:
+                _first_page, _offset, _size, present, zeros = self.index[i]
+                pages |= present & (zeros if zero else ~zeros)
+                i += 1
+
+            slot = 0
+            while pages:
+                if pages & 1:
+                    yield first_page + slot
+                pages >>= 1
+                slot += 1
+
+    def _runs(self, pages):
+        """Turns page numbers into (address, length) runs"""
+        start = None
+        length = 0
+        for page in pages:
+            addr = page * PAGE_SIZE
+            if start is not None and addr == start + length:
+                length += PAGE_SIZE
+                continue
+            if start is not None:
+                yield (start, length)
+            start = addr
+            length = PAGE_SIZE
+
+        if start is not None:
+            yield (start, length)
+
+    def get_available_pages(self):
+        """Yields the page numbers of the non-zero pages, in order"""
+        return self._pages(False)
+
+    def get_available_addresses(self):
+        """Yields the runs of non-zero pages. Zero pages are left
+        out so that scanners do not spend time on them."""
+        return self._runs(self._pages(False))
+
+    def get_zero_addresses(self):
+        """Yields the runs of present pages which are all zero, as
+        recorded in the index"""
+        return self._runs(self._pages(True))
+
+    def get_address_range(self):
+        return [0, self.end]
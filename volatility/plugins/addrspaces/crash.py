@@ -22,6 +22,7 @@
 
 """ An AS for processing crash dumps """
 import struct
+import bisect
 import volatility.obj as obj
 import volatility.plugins.addrspaces.standard as standard
 
@@ -32,6 +33,9 @@ page_shift = 12
 class WindowsCrashDumpSpace32(standard.FileAddressSpace):
     """ This AS supports windows Crash Dump format """
     order = 30
+    ## The number of pages of header before the first run's data
+    header_pages = 1
+
     def __init__(self, base, config, **kwargs):
         ## We must have an AS below us
         self.as_assert(base, "No base Address Space")
@@ -51,12 +55,39 @@ class WindowsCrashDumpSpace32(standard.FileAddressSpace):
 
         self.runs = [ (x.BasePage.v(), x.PageCount.v())
                       for x in self.header.PhysicalMemoryBlockBuffer.Run ]
+        self.build_index()
 
         self.dtb = self.header.DirectoryTableBase.v()
 
+    def build_index(self):
+        """Builds the run index used to look up addresses.
+
+           Each entry is a (first page, page count, first file page) 
+           tuple, sorted by first page so that a run can be found by 
+           bisecting run_starts. The file pages are summed in the order 
+           the runs are stored in the dump.
+        """
+        self.run_index = []
+        file_page = self.header_pages
+        for page, count in self.runs:
+            self.run_index.append((page, count, file_page))
+            file_page += count
+        self.run_index.sort()
+        self.run_starts = [ page for page, _count, _file_page in self.run_index ]
+
+    def find_run(self, addr):
+        """Returns the index entry of the run containing addr, or None"""
+        i = bisect.bisect_right(self.run_starts, addr >> page_shift) - 1
+        if i < 0:
+            return None
+        run = self.run_index[i]
+        if (addr >> page_shift) >= run[0] + run[1]:
+            return None
+        return run
+
     def convert_to_raw(self, ofile):
         page_count = 0
-        current_file_page = 0x1000
+        current_file_page = self.header_pages * 0x1000
         for run in self.runs:
             page, count = run
 
@@ -77,92 +108,61 @@ class WindowsCrashDumpSpace32(standard.FileAddressSpace):
         return self.base
 
     def get_addr(self, addr):
-        page_offset = (addr & 0x00000FFF)
-        page = addr >> page_shift
-
-        # This is the offset to account for the header file
-        offset = 1
-        for run in self.runs:
-            if ((page >= run[0]) and (page < (run[0] + run[1]))):
-                run_offset = page - run[0]
-                offset = offset + run_offset
-                baseoffset = (offset * 0x1000) + page_offset
-                return baseoffset
-            offset += run[1]
-        return None
+        run = self.find_run(addr)
+        if run is None:
+            return None
+        page, _count, file_page = run
+        return ((file_page - page) << page_shift) + addr
 
     def is_valid_address(self, addr):
         return self.get_addr(addr) != None
 
-    def read(self, addr, length):
-        first_block = 0x1000 - addr % 0x1000
-        full_blocks = ((length + (addr % 0x1000)) / 0x1000) - 1
-        left_over = (length + addr) % 0x1000
-
-        baddr = self.get_addr(addr)
-        if baddr == None:
-            return obj.NoneObject("Could not get base address at " + str(addr))
-
-        if length < first_block:
-            stuff_read = self.base.read(baddr, length)
-            return stuff_read
-
-        stuff_read = self.base.read(baddr, first_block)
-        new_addr = addr + first_block
-        for _i in range(0, full_blocks):
-            baddr = self.get_addr(new_addr)
-            if baddr == None:
-                return obj.NoneObject("Could not get base address at " + str(new_addr))
-            stuff_read = stuff_read + self.base.read(baddr, 0x1000)
-            new_addr = new_addr + 0x1000
+    def get_chunks(self, addr, length):
+        """Splits a read into chunks which are contiguous in the file.
+
+           Yields (file offset, length) tuples, where the file offset is
+           None for parts of the range which are not in any run.
+        """
+        end = addr + length
+        while addr < end:
+            run = self.find_run(addr)
+            if run is None:
+                ## Skip ahead to the start of the next run
+                i = bisect.bisect_right(self.run_starts, addr >> page_shift)
+                if i < len(self.run_starts):
+                    chunk_end = min(self.run_starts[i] << page_shift, end)
+                else:
+                    chunk_end = end
+                yield None, chunk_end - addr
+            else:
+                page, count, file_page = run
+                chunk_end = min((page + count) << page_shift, end)
+                yield ((file_page - page) << page_shift) + addr, chunk_end - addr
+            addr = chunk_end
 
-        if left_over > 0:
-            baddr = self.get_addr(new_addr)
+    def read(self, addr, length):
+        stuff_read = []
+        for baddr, chunk_len in self.get_chunks(addr, length):
             if baddr == None:
-                return obj.NoneObject("Could not get base address at " + str(new_addr))
-            stuff_read = stuff_read + self.base.read(baddr, left_over)
+                return obj.NoneObject("Could not get base address at " + str(addr + sum(len(x) for x in stuff_read)))
+            stuff_read.append(self.base.read(baddr, chunk_len))
 
-        return stuff_read
+        return b''.join(stuff_read)
 
     def write(self, vaddr, buf):
         baddr = self.get_addr(vaddr)
         return standard.AbstractWritablePagedMemory.write(self, baddr, buf)
 
     def zread(self, vaddr, length):
-        first_block = 0x1000 - vaddr % 0x1000
-        full_blocks = ((length + (vaddr % 0x1000)) / 0x1000) - 1
-        left_over = (length + vaddr) % 0x1000
-
         self.check_address_range(vaddr)
 
-        baddr = self.get_addr(vaddr)
-
-        if baddr == None:
-            if length < first_block:
-                return ('\0' * length)
-            stuff_read = ('\0' * first_block)
-        else:
-            if length < first_block:
-                return self.base.read(baddr, length)
-            stuff_read = self.base.read(baddr, first_block)
-
-        new_vaddr = vaddr + first_block
-        for _i in range(0, full_blocks):
-            baddr = self.get_addr(new_vaddr)
+        stuff_read = []
+        for baddr, chunk_len in self.get_chunks(vaddr, length):
             if baddr == None:
-                stuff_read = stuff_read + ('\0' * 0x1000)
+                stuff_read.append(b'\0' * chunk_len)
             else:
-                stuff_read = stuff_read + self.base.read(baddr, 0x1000)
-
-            new_vaddr = new_vaddr + 0x1000
-
-        if left_over > 0:
-            baddr = self.get_addr(new_vaddr)
-            if baddr == None:
-                stuff_read = stuff_read + ('\0' * left_over)
-            else:
-                stuff_read = stuff_read + self.base.read(baddr, left_over)
-        return stuff_read
+                stuff_read.append(self.base.read(baddr, chunk_len))
+        return b''.join(stuff_read)
 
     def read_long(self, addr):
         _baseaddr = self.get_addr(addr)
@@ -173,19 +173,17 @@ class WindowsCrashDumpSpace32(standard.FileAddressSpace):
         return longval
 
     def get_available_pages(self):
-        page_list = []
         for run in self.runs:
             start = run[0]
             for page in range(start, start + run[1]):
-                page_list.append([page * 0x1000, 0x1000])
-        return page_list
+                yield [page * 0x1000, 0x1000]
 
     def get_number_of_pages(self):
-        return len(self.get_available_pages())
+        return sum(count for _page, count in self.runs)
 
     def get_address_range(self):
         """ This relates to the logical address range that is indexable """
-        run = self.runs[-1]
+        run = self.run_index[-1]
         size = run[0] * 0x1000 + run[1] * 0x1000
         return [0, size]
 
@@ -209,6 +207,8 @@ class WindowsCrashDumpSpace32(standard.FileAddressSpace):
 class WindowsCrashDumpSpace64(WindowsCrashDumpSpace32):
     """ This AS supports windows Crash Dump format """
     order = 30
+    header_pages = 2
+
     def __init__(self, base, config, **kwargs):
         ## We must have an AS below us
         self.as_assert(base, "No base Address Space")
@@ -227,38 +227,6 @@ class WindowsCrashDumpSpace64(WindowsCrashDumpSpace32):
 
         self.runs = [ (x.BasePage.v(), x.PageCount.v())
                       for x in self.header.PhysicalMemoryBlockBuffer.Run ]
+        self.build_index()
 
         self.dtb = self.header.DirectoryTableBase.v()
-
-    def convert_to_raw(self, ofile):
-        page_count = 0
-        #current_file_page = 0x1000
-        current_file_page = 0x2000  
-        for run in self.runs:
-            page, count = run
-
-            ofile.seek(page * 0x1000)
-            for j in range(0, count * 0x1000, 0x1000):
-                data = self.base.read(current_file_page + j, 0x1000)
-                ofile.write(data)
-                page_count += 1
-                # If there's only one run, this leaves the user in the dark,
-                # so instead we yield for every page
-                yield page_count
-            current_file_page += (count * 0x1000)
-
-    def get_addr(self, addr):
-        page_offset = (addr & 0x00000FFF)
-        page = addr >> page_shift
-
-        # This is the offset to account for the header file
-        #offset = 1
-        offset = 2
-        for run in self.runs:
-            if ((page >= run[0]) and (page < (run[0] + run[1]))):
-                run_offset = page - run[0]
-                offset = offset + run_offset
-                baseoffset = (offset * 0x1000) + page_offset
-                return baseoffset
-            offset += run[1]
-        return None
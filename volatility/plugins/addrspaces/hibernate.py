@@ -28,6 +28,11 @@ import volatility.plugins.addrspaces.standard as standard
 import volatility.obj as obj
 import volatility.win32.xpress as xpress
 import struct
+import array
+import bisect
+import itertools
+import collections
+import multiprocessing
 
 
 #pylint: disable-msg=C0111
@@ -36,24 +41,39 @@ PAGE_SIZE = 0x1000
 page_shift = 12
 
 class Store(object):
-    def __init__(self, limit = 50):
+    """ A cache of decompressed blocks.
+
+    The cache is bounded by the total size of the blocks (in bytes) 
+    and evicts the least recently used ones first.
+    """
+    def __init__(self, limit = 0x1000000):
         self.limit = limit
-        self.cache = {}
-        self.seq = []
+        self.cache = collections.OrderedDict()
         self.size = 0
 
     def put(self, key, item):
+        if key in self.cache:
+            self.size -= len(self.cache.pop(key))
+
         self.cache[key] = item
         self.size += len(item)
 
-        self.seq.append(key)
-        if len(self.seq) >= self.limit:
-            key = self.seq.pop(0)
-            self.size -= len(self.cache[key])
-            del self.cache[key]
+        while self.size > self.limit and len(self.cache) > 1:
+            _key, old = self.cache.popitem(last = False)
+            self.size -= len(old)
 
     def get(self, key):
-        return self.cache[key]
+        item = self.cache[key]
+        self.cache.move_to_end(key)
+        return item
+
+def decompress_blocks(args):
+    """Decompresses a list of (data, size) xpress blocks in one batch
+    (run in the convert_to_raw workers). Blocks of the full 0x10000
+    bytes are stored uncompressed."""
+    results = xpress.xpress_decode_blocks([ data for data, size in args if size != 0x10000 ])
+    results.reverse()
+    return [ data if size == 0x10000 else results.pop() for data, size in args ]
 
 class WindowsHiberFileSpace32(standard.FileAddressSpace):
     """ This is a hibernate address space for windows hibernation files.
@@ -69,13 +89,13 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
         self.as_assert(base, "No base Address Space")
         standard.FileAddressSpace.__init__(self, base, config, layered = True, **kwargs)
         self.runs = []
-        self.PageDict = {}
         self.HighestPage = 0
         self.PageIndex = 0
         self.AddressList = []
-        self.LookupCache = {}
-        self.PageCache = Store(50)
+        self.PageCache = Store()
         self.MemRangeCnt = 0
+        ## The page index is built by build_page_cache when first needed
+        self.block_offsets = None
         self.offset = 0
         self.entry_count = 0xFF
 
@@ -102,21 +122,35 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
         ## need to search for it.
         self.dtb = self.ProcState.SpecialRegisters.Cr3.v()
 
-        # This is a lengthy process, it was cached, but it may be best to delay this
-        # until it's absolutely necessary and/or convert it into a generator...
-        self.build_page_cache()
+        # Building the page index is a lengthy process, so it is
+        # delayed until something actually needs it
 
 
     def _get_first_table_page(self):
         if self.header != None:
             return self.header.FirstTablePage
         for i in range(10):
-            if self.base.read(i * PAGE_SIZE, 8) == "\x81\x81xpress":
+            if self.base.read(i * PAGE_SIZE, 8) == b"\x81\x81xpress":
                 return i - 1
         return None
 
     def build_page_cache(self):
-        XpressIndex = 0
+        """ Builds the page index, unless that has already been done.
+
+        Pages are stored in xpress blocks of 0x10 pages each, in the order
+        given by the memory range tables, so a page's slot (its block 
+        number * 0x10 plus its position in the block) follows from the 
+        slot of the first page of its range. We keep the offset and size
+        of each block, and the first page, page count and first slot of 
+        each range sorted by first page, all in arrays.
+        """
+        if self.block_offsets is not None:
+            return
+
+        block_offsets = array.array('Q')
+        block_sizes = array.array('L')
+        ranges = []
+
         XpressHeader = obj.Object("_IMAGE_XPRESS_HEADER",
                                   (self._get_first_table_page() + 1) * 4096,
                                   self.base)
@@ -125,10 +159,12 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
 
         MemoryArrayOffset = self._get_first_table_page() * 4096
 
-        while MemoryArrayOffset:
+        while MemoryArrayOffset and XpressHeader:
             MemoryArray = obj.Object('_PO_MEMORY_RANGE_ARRAY', MemoryArrayOffset, self.base)
 
             EntryCount = MemoryArray.MemArrayLink.EntryCount.v()
+            FirstSlot = len(block_offsets) * 0x10
+            XpressIndex = 0
             for i in MemoryArray.RangeTable:
                 start = i.StartPage.v()
                 end = i.EndPage.v()
@@ -138,60 +174,119 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
                     self.HighestPage = end
 
                 self.AddressList.append((start * 0x1000, LocalPageCnt * 0x1000))
+                ranges.append((start, LocalPageCnt, FirstSlot + XpressIndex))
 
-                for j in range(0, LocalPageCnt):
-                    if (XpressIndex and ((XpressIndex % 0x10) == 0)):
-                        XpressHeader, XpressBlockSize = \
-                                      self.next_xpress(XpressHeader, XpressBlockSize)
-
-                    PageNumber = start + j
-                    XpressPage = XpressIndex % 0x10
-                    if XpressHeader.obj_offset not in self.PageDict:
-                        self.PageDict[XpressHeader.obj_offset] = [
-                            (PageNumber, XpressBlockSize, XpressPage)]
-                    else:
-                        self.PageDict[XpressHeader.obj_offset].append(
-                            (PageNumber, XpressBlockSize, XpressPage))
+                self.PageIndex += LocalPageCnt
+                XpressIndex += LocalPageCnt
 
-                    ## Update the lookup cache
-                    self.LookupCache[PageNumber] = (
-                        XpressHeader.obj_offset, XpressBlockSize, XpressPage)
-
-                    self.PageIndex += 1
-                    XpressIndex += 1
+            ## Find all the blocks holding this table's pages
+            block_offsets.append(XpressHeader.obj_offset)
+            block_sizes.append(XpressBlockSize)
+            for _i in range(1, (XpressIndex + 0xf) // 0x10):
+                XpressHeader, XpressBlockSize = \
+                              self.next_xpress(XpressHeader, XpressBlockSize)
+                if not XpressHeader:
+                    break
+                block_offsets.append(XpressHeader.obj_offset)
+                block_sizes.append(XpressBlockSize)
 
             NextTable = MemoryArray.MemArrayLink.NextTable.v()
 
             # This entry count (EntryCount) should probably be calculated
-            if (NextTable and (EntryCount == self.entry_count)):
+            if (XpressHeader and NextTable and (EntryCount == self.entry_count)):
                 MemoryArrayOffset = NextTable * 0x1000
                 self.MemRangeCnt += 1
                 XpressHeader, XpressBlockSize = \
                                              self.next_xpress(XpressHeader, XpressBlockSize)
 
                 # Make sure the xpress block is after the Memory Table
-                while (XpressHeader.obj_offset < MemoryArrayOffset):
+                while (XpressHeader and XpressHeader.obj_offset < MemoryArrayOffset):
                     XpressHeader, XpressBlockSize = \
                         self.next_xpress(XpressHeader, 0)
-
-                XpressIndex = 0
             else:
                 MemoryArrayOffset = 0
 
-    def convert_to_raw(self, ofile):
+        ## The ranges in file order, for convert_to_raw
+        self.ranges = ranges
+
+        ranges = sorted(ranges)
+        self.range_starts = array.array('Q', [ r[0] for r in ranges ])
+        self.range_counts = array.array('Q', [ r[1] for r in ranges ])
+        self.range_slots = array.array('Q', [ r[2] for r in ranges ])
+        self.block_sizes = block_sizes
+        self.block_offsets = block_offsets
+
+    def get_slots(self):
+        """ Yields the (block, page, physical page) of every page in file order """
+        for start, count, slot in self.ranges:
+            for j in range(count):
+                block, page = divmod(slot + j, 0x10)
+                if block >= len(self.block_offsets):
+                    return
+                yield block, page, start + j
+
+    def read_blocks(self, workers = 1, start = 0):
+        """ Yields ([(page in block, physical page), ...], decompressed
+        data) for every xpress block, in file order.
+
+        With more than one worker the blocks are decompressed in a 
+        process pool, a batch at a time so that only a bounded amount 
+        of the file is held in memory. The first start blocks are 
+        skipped without being read.
+        """
+        self.build_page_cache()
+
+        def blocks():
+            current = None
+            pages = []
+            for block, page, phys in self.get_slots():
+                if block != current and pages:
+                    yield current, pages
+                    pages = []
+                current = block
+                pages.append((page, phys))
+            if pages:
+                yield current, pages
+
+        def batches(size):
+            batch = []
+            for block, pages in itertools.islice(blocks(), start, None):
+                offset = self.block_offsets[block] + 0x20
+                batch.append((pages, (self.base.read(offset, self.block_sizes[block]),
+                                      self.block_sizes[block])))
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+
+        try:
+            for batch in batches(max(workers, 1) * 0x10):
+                args = [ arg for _pages, arg in batch ]
+                if pool:
+                    ## Each worker decodes a slice of the batch in one call
+                    parts = pool.map(decompress_blocks, [ args[i::workers] for i in range(workers) ])
+                    results = [ parts[i % workers][i // workers] for i in range(len(args)) ]
+                else:
+                    results = decompress_blocks(args)
+
+                for (pages, _arg), data in zip(batch, results):
+                    yield pages, data
+        finally:
+            if pool:
+                pool.terminate()
+
+    def convert_to_raw(self, ofile, workers = 1):
         page_count = 0
-        for _i, xb in enumerate(list(self.PageDict.keys())):
-            size = self.PageDict[xb][0][1]
-            data_z = self.base.read(xb + 0x20, size)
-            if size == 0x10000:
-                data_uz = data_z
-            else:
-                data_uz = xpress.xpress_decode(data_z)
-            for page, size, offset in self.PageDict[xb]:
+        for pages, data_uz in self.read_blocks(workers):
+            for offset, page in pages:
                 ofile.seek(page * 0x1000)
                 ofile.write(data_uz[offset * 0x1000:offset * 0x1000 + 0x1000])
                 page_count += 1
-            del data_z, data_uz
             yield page_count
 
     def next_xpress(self, XpressHeader, XpressBlockSize):
@@ -203,7 +298,7 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
         original_offset = XpressHeaderOffset
         while 1:
             data = self.base.read(XpressHeaderOffset, BLOCKSIZE)
-            Magic_offset = data.find("\x81\x81xpress")
+            Magic_offset = data.find(b"\x81\x81xpress")
             if Magic_offset >= 0:
                 XpressHeaderOffset += Magic_offset
                 break
@@ -254,24 +349,26 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
         return (self.ProcState.SpecialRegisters.Cr4.v() >> 5) & 1
 
     def get_number_of_memranges(self):
+        self.build_page_cache()
         return self.MemRangeCnt
 
     def get_number_of_pages(self):
+        self.build_page_cache()
         return self.PageIndex
 
     def get_addr(self, addr):
+        self.build_page_cache()
         page = addr >> page_shift
-        if page in self.LookupCache:
-            (hoffset, size, pageoffset) = self.LookupCache[page]
-            return hoffset, size, pageoffset
+        i = bisect.bisect_right(self.range_starts, page) - 1
+        if i >= 0 and page < self.range_starts[i] + self.range_counts[i]:
+            block, pageoffset = divmod(self.range_slots[i] + page - self.range_starts[i], 0x10)
+            if block < len(self.block_offsets):
+                return self.block_offsets[block], self.block_sizes[block], pageoffset
         return None, None, None
 
     def get_block_offset(self, _xb, addr):
-        page = addr >> page_shift
-        if page in self.LookupCache:
-            (_hoffset, _size, pageoffset) = self.LookupCache[page]
-            return pageoffset
-        return None
+        _hoffset, _size, pageoffset = self.get_addr(addr)
+        return pageoffset
 
     def is_valid_address(self, addr):
         XpressHeaderOffset, _XpressBlockSize, _XpressPage = self.get_addr(addr)
@@ -322,7 +419,7 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
         return data[offset:offset + available]
 
     def read(self, addr, length):
-        result = ''
+        result = []
         while length > 0:
             data = self._partial_read(addr, length)
             if not data:
@@ -330,48 +427,27 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
 
             addr += len(data)
             length -= len(data)
-            result += data
+            result.append(data)
 
-        if result == '':
-            result = obj.NoneObject("Unable to read data at " + str(addr) + " for length " + str(length))
+        if not result:
+            return obj.NoneObject("Unable to read data at " + str(addr) + " for length " + str(length))
 
-        return result
+        return b''.join(result)
 
     def zread(self, addr, length):
-        first_block = 0x1000 - addr % 0x1000
-        full_blocks = ((length + (addr % 0x1000)) / 0x1000) - 1
-        left_over = (length + addr) % 0x1000
-
         self.check_address_range(addr)
 
-        ImageXpressHeader = self.get_addr(addr)
-        if ImageXpressHeader == None:
-            if length < first_block:
-                return ('\0' * length)
-            stuff_read = ('\0' * first_block)
-        else:
-            if length < first_block:
-                return self.read(addr, length)
-            stuff_read = self.read(addr, first_block)
-
-        new_addr = addr + first_block
-
-        for _i in range(0, full_blocks):
-            ImageXpressHeader = self.get_addr(new_addr)
-            if ImageXpressHeader == None:
-                stuff_read = stuff_read + ('\0' * 0x1000)
-            else:
-                stuff_read = stuff_read + self.read(new_addr, 0x1000)
-            new_addr = new_addr + 0x1000
-
-        if left_over > 0:
-            ImageXpressHeader = self.get_addr(new_addr)
-            if ImageXpressHeader == None:
-                stuff_read = stuff_read + ('\0' * left_over)
-            else:
-                stuff_read = stuff_read + self.read(new_addr, left_over)
+        stuff_read = []
+        end = addr + length
+        while addr < end:
+            chunk_len = min(end - addr, 0x1000 - addr % 0x1000)
+            data = None
+            if self.get_addr(addr)[0] is not None:
+                data = self.read(addr, chunk_len)
+            stuff_read.append(data or (b'\0' * chunk_len))
+            addr += chunk_len
 
-        return stuff_read
+        return b''.join(stuff_read)
 
     def read_long(self, addr):
         _baseaddr = self.get_addr(addr)
@@ -382,14 +458,13 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
         return longval
 
     def get_available_pages(self):
-        page_list = []
-        for _i, xb in enumerate(list(self.PageDict.keys())):
-            for page, _size, _offset in self.PageDict[xb]:
-                page_list.append([page * 0x1000, 0x1000])
-        return page_list
+        self.build_page_cache()
+        for _block, _page, phys in self.get_slots():
+            yield [phys * 0x1000, 0x1000]
 
     def get_address_range(self):
         """ This relates to the logical address range that is indexable """
+        self.build_page_cache()
         size = self.HighestPage * 0x1000 + 0x1000
         return [0, size]
 
@@ -400,6 +475,7 @@ class WindowsHiberFileSpace32(standard.FileAddressSpace):
 
     def get_available_addresses(self):
         """ This returns the ranges  of valid addresses """
+        self.build_page_cache()
         for i in self.AddressList:
             yield i
 
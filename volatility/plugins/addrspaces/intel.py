@@ -22,6 +22,7 @@
 """ This is Jesse Kornblum's patch to clean up the standard AS's.
 """
 import struct
+import collections
 import volatility.plugins.addrspaces.standard as standard
 import volatility.addrspace as addrspace
 import volatility.obj as obj
@@ -56,6 +57,12 @@ class JKIA32PagedMemory(standard.AbstractWritablePagedMemory, addrspace.BaseAddr
     pae = False
     paging_address_space = True
     checkname = 'IA32ValidAS'
+    ## The number of translations kept in the TLB
+    tlb_size = 1024
+    ## The page sizes (as a shift) which page_walk can return
+    page_shifts = (12, 22)
+    ## The layout of a whole page directory or page table
+    table_struct = struct.Struct('<1024I')
 
     def __init__(self, base, config, dtb = 0, *args, **kwargs):
         ## We must be stacked on someone else:
@@ -64,6 +71,8 @@ class JKIA32PagedMemory(standard.AbstractWritablePagedMemory, addrspace.BaseAddr
         ## We allow users to disable us in favour of the old legacy
         ## modules.
         self.as_assert(not config.USE_OLD_AS, "Module disabled")
+
+        self.flush_tlb()
         standard.AbstractWritablePagedMemory.__init__(self, base, config, *args, **kwargs)
         addrspace.BaseAddressSpace.__init__(self, base, config, *args, **kwargs)
 
@@ -214,11 +223,57 @@ class JKIA32PagedMemory(standard.AbstractWritablePagedMemory, addrspace.BaseAddr
         return  (pde_value & 0xffc00000) | (vaddr & 0x3fffff)
 
 
+    def flush_tlb(self):
+        '''
+        Empties the translation lookaside buffer and resets its counters.
+        This must be called if the page tables are changed.
+
+        The TLB maps the start of a virtual page (plus the page size 
+        shift, so that pages of different sizes can't collide) to the
+        start of the physical page, in least recently used order.
+        '''
+        self.tlb = collections.OrderedDict()
+        self.tlb_hits = 0
+        self.tlb_misses = 0
+
     def vtop(self, vaddr):
         '''
         Translates virtual addresses into physical offsets.
         The function should return either None (no valid mapping)
         or the offset in physical memory where the address maps.
+
+        Translations are served from the TLB where possible, since 
+        things like list walks hit the same few pages over and over.
+        '''
+        vaddr = int(vaddr)
+        tlb = self.tlb
+
+        for shift in self.page_shifts:
+            key = ((vaddr >> shift) << shift) | shift
+            paddr = tlb.get(key)
+            if paddr is not None:
+                tlb.move_to_end(key)
+                self.tlb_hits += 1
+                return paddr | (vaddr & ((1 << shift) - 1))
+
+        self.tlb_misses += 1
+
+        result = self.page_walk(vaddr)
+        if result is None:
+            return None
+
+        paddr, shift = result
+        tlb[((vaddr >> shift) << shift) | shift] = (paddr >> shift) << shift
+        if len(tlb) > self.tlb_size:
+            tlb.popitem(last = False)
+
+        return paddr
+
+    def page_walk(self, vaddr):
+        '''
+        Walks the page tables to translate a virtual address.
+        Returns None (no valid mapping) or a tuple of the physical 
+        offset and the page size (as a shift) of the mapping.
         '''
         pde_value = self.get_pde(vaddr)
         if not self.entry_present(pde_value):
@@ -227,14 +282,14 @@ class JKIA32PagedMemory(standard.AbstractWritablePagedMemory, addrspace.BaseAddr
             return None
 
         if self.page_size_flag(pde_value):
-            return self.get_four_meg_paddr(vaddr, pde_value)
+            return self.get_four_meg_paddr(vaddr, pde_value), 22
 
         pte_value = self.get_pte(vaddr, pde_value)
         if not self.entry_present(pte_value):
             # Add support for paged out PTE
             return None
 
-        return self.get_phys_addr(vaddr, pte_value)
+        return self.get_phys_addr(vaddr, pte_value), 12
 
     def __read_chunk(self, vaddr, length):
         """
@@ -265,7 +320,7 @@ class JKIA32PagedMemory(standard.AbstractWritablePagedMemory, addrspace.BaseAddr
         """
         vaddr, length = int(vaddr), int(length)
 
-        ret = b''
+        ret = []
 
         while length > 0:
             chunk_len = min(length, 0x1000 - (vaddr % 0x1000))
@@ -273,15 +328,15 @@ class JKIA32PagedMemory(standard.AbstractWritablePagedMemory, addrspace.BaseAddr
             buf = self.__read_chunk(vaddr, chunk_len)
             if not buf:
                 if pad:
-                    buf = '\x00' * chunk_len
+                    buf = b'\x00' * chunk_len
                 else:
                     return obj.NoneObject("Could not read_chunks from addr " + hex(vaddr) + " of size " + hex(chunk_len))
 
-            ret += buf
+            ret.append(buf)
             vaddr += chunk_len
             length -= chunk_len
 
-        return ret
+        return b''.join(ret)
 
 
     def read(self, vaddr, length):
@@ -312,6 +367,27 @@ class JKIA32PagedMemory(standard.AbstractWritablePagedMemory, addrspace.BaseAddr
         (longval,) = struct.unpack('<I', string)
         return longval
 
+    def read_table(self, addr):
+        '''
+        Returns a list of (index, entry) tuples for the present entries
+        of the paging structure at physical address addr. The whole 
+        table is read and decoded in one go rather than an entry at 
+        a time. Entries which can't be read are not present.
+        '''
+        try:
+            buf = self.base.read(addr, 0x1000)
+        except IOError:
+            buf = None
+        if not buf or len(buf) != 0x1000:
+            buf = self.base.zread(addr, 0x1000)
+        if not buf or len(buf) != 0x1000:
+            return []
+
+        # This is entry_present() for all entries at once: either the
+        # 'P' flag is on, or the page is in transition and not a prototype
+        return [(index, entry) for index, entry in enumerate(self.table_struct.unpack(buf))
+                if entry & 1 or entry & 0xc00 == 0x800]
+
     def get_available_pages(self):
         '''
         Return a list of lists of available memory pages.
@@ -320,22 +396,16 @@ class JKIA32PagedMemory(standard.AbstractWritablePagedMemory, addrspace.BaseAddr
         '''
         # Pages that hold PDEs and PTEs are 0x1000 bytes each.
         # Each PDE and PTE is four bytes. Thus there are 0x1000 / 4 = 0x400
-        # PDEs and PTEs we must test
+        # PDEs and PTEs in each table, which we read and test in bulk.
 
-        for pde in range(0, 0x400):
+        for pde, pde_value in self.read_table(self.dtb & 0xfffff000):
             vaddr = pde << 22
-            pde_value = self.get_pde(vaddr)
-            if not self.entry_present(pde_value):
-                continue
             if self.page_size_flag(pde_value):
                 yield (vaddr, 0x400000)
-            else:
-                tmp = vaddr
-                for pte in range(0, 0x400):
-                    vaddr = tmp | (pte << 12)
-                    pte_value = self.get_pte(vaddr, pde_value)
-                    if self.entry_present(pte_value):
-                        yield (vaddr, 0x1000)
+                continue
+
+            for pte, _pte_value in self.read_table(pde_value & 0xfffff000):
+                yield (vaddr | (pte << 12), 0x1000)
 
 
 class JKIA32PagedMemoryPae(JKIA32PagedMemory):
@@ -354,6 +424,8 @@ class JKIA32PagedMemoryPae(JKIA32PagedMemory):
     """
     order = 80
     pae = True
+    page_shifts = (12, 21)
+    table_struct = struct.Struct('<512Q')
 
     def _cache_values(self):
         buf = self.base.read(self.dtb, 0x20)
@@ -432,11 +504,11 @@ class JKIA32PagedMemoryPae(JKIA32PagedMemory):
         return (pte & 0xffffffffff000) | (vaddr & 0xfff)
 
 
-    def vtop(self, vaddr):
+    def page_walk(self, vaddr):
         '''
-        Translates virtual addresses into physical offsets.
-        The function returns either None (no valid mapping)
-        or the offset in physical memory where the address maps.
+        Walks the page tables to translate a virtual address.
+        Returns None (no valid mapping) or a tuple of the physical 
+        offset and the page size (as a shift) of the mapping.
         '''
         pdpte = self.get_pdpte(vaddr)
         if not self.entry_present(pdpte):
@@ -450,14 +522,14 @@ class JKIA32PagedMemoryPae(JKIA32PagedMemory):
             return None
 
         if self.page_size_flag(pde):
-            return self.get_two_meg_paddr(vaddr, pde)
+            return self.get_two_meg_paddr(vaddr, pde), 21
 
         pte = self.get_pte(vaddr, pde)
         if not self.entry_present(pte):
             # Add support for paged out PTE
             return None
 
-        return self.get_phys_addr(vaddr, pte)
+        return self.get_phys_addr(vaddr, pte), 12
 
     def _read_long_long_phys(self, addr):
         '''
@@ -482,24 +554,17 @@ class JKIA32PagedMemoryPae(JKIA32PagedMemory):
 
         # Pages that hold PDEs and PTEs are 0x1000 bytes each.
         # Each PDE and PTE is eight bytes. Thus there are 0x1000 / 8 = 0x200
-        # PDEs and PTEs we must test.
+        # PDEs and PTEs in each table, which we read and test in bulk.
         for pdpte in range(0, 4):
             vaddr = pdpte << 30
             pdpte_value = self.get_pdpte(vaddr)
             if not self.entry_present(pdpte_value):
                 continue
-            for pde in range(0, 0x200):
+            for pde, pde_value in self.read_table(pdpte_value & 0xffffffffff000):
                 vaddr = pdpte << 30 | (pde << 21)
-                pde_value = self.get_pde(vaddr, pdpte_value)
-                if not self.entry_present(pde_value):
-                    continue
                 if self.page_size_flag(pde_value):
                     yield (vaddr, 0x200000)
                     continue
 
-                tmp = vaddr
-                for pte in range(0, 0x200):
-                    vaddr = tmp | (pte << 12)
-                    pte_value = self.get_pte(vaddr, pde_value)
-                    if self.entry_present(pte_value):
-                        yield (vaddr, 0x1000)
+                for pte, _pte_value in self.read_table(pde_value & 0xffffffffff000):
+                    yield (vaddr | (pte << 12), 0x1000)
@@ -17,6 +17,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
 #
+import bisect
 import volatility.obj as obj
 import volatility.addrspace as addrspace
 
@@ -61,9 +62,8 @@ class LimeAddressSpace(addrspace.BaseAddressSpace):
 
         sig = base.read(0, 4)
 
-        self.as_assert(sig == '\x45\x4D\x69\x4c' or sig == '\x4c\x69\x4d\x45', "Invalid Lime header signature")
+        self.as_assert(sig == b'\x45\x4D\x69\x4c' or sig == b'\x4c\x69\x4d\x45', "Invalid Lime header signature")
         
-        self.addr_cache = {}
         self.segs = []
         self.parse_lime()
 
@@ -78,7 +78,7 @@ class LimeAddressSpace(addrspace.BaseAddressSpace):
         while header.magic.v() == 0x4c694d45:
 
             #print "new segment at %x end %x size: %d offset %d | %x" % (header.start, header.end, header.end - header.start, offset, offset)
-            seg = segment(header.start, header.end, offset + self.profile.get_obj_size("lime_header"))
+            seg = segment(header.start.v(), header.end.v(), offset + self.profile.get_obj_size("lime_header"))
             self.segs.append(seg)
 
             seglength = header.end - header.start
@@ -87,6 +87,10 @@ class LimeAddressSpace(addrspace.BaseAddressSpace):
 
             header = obj.Object("lime_header", offset = offset, vm = self.base)
 
+        ## Keep the segments sorted so they can be bisected
+        self.segs.sort(key = lambda seg: seg.start)
+        self.seg_starts = [ seg.start for seg in self.segs ]
+
     def read(self, addr, length):
         return self.__read_bytes(addr, length)
 
@@ -99,39 +103,52 @@ class LimeAddressSpace(addrspace.BaseAddressSpace):
         if addr < firstram:
             addr = firstram + addr
 
-        key = "{0:d}:{1:d}".format(addr, length)
-
-        if key in self.addr_cache:
-            return self.addr_cache[key]
-
-        offset = self.__get_offset(addr)
-
-        if offset: 
-            (_, where) = offset
-            ret = self.base.read(where, length)
-            self.addr_cache[key] = ret
-        
-        elif pad:
-            ret = "\x00" * length
-        else:
-            ret = None
-        
-        return ret        
+        return self.__read_segments(addr, length, pad)
+
+    def __read_segments(self, addr, length, pad = False):
+        """ Reads from the file one segment at a time, padding any gaps
+        between segments if pad is set and failing on them otherwise """
+        result = []
+        end = addr + length
+        while addr < end:
+            seg = self.__get_segment(addr)
+            if seg:
+                size = min(end, seg.end + 1) - addr
+                data = self.base.read(seg.offset + addr - seg.start, size) or b''
+                if len(data) < size:
+                    if not pad:
+                        result.append(data)
+                        break
+                    data += b"\x00" * (size - len(data))
+            else:
+                ## Skip to the next segment, if there is one
+                i = bisect.bisect_right(self.seg_starts, addr)
+                if i < len(self.seg_starts):
+                    size = min(end, self.seg_starts[i]) - addr
+                else:
+                    size = end - addr
+                if not pad:
+                    return None
+                data = b"\x00" * size
+
+            result.append(data)
+            addr += size
+
+        return b''.join(result)
+
+    def __get_segment(self, addr):
+        i = bisect.bisect_right(self.seg_starts, addr) - 1
+        if i >= 0 and addr <= self.segs[i].end:
+            return self.segs[i]
+        return None
 
     def __get_offset(self, addr):
-        for seg in self.segs:
-            if seg.start <= addr <= seg.end:
-
-                delta = addr - seg.start
+        seg = self.__get_segment(addr)
+        if seg is None:
+            return None
 
-                where = seg.offset + delta
-
-                # find offset into seg and return place inside file
-                ret = [addr, where]
-                
-                return ret
-
-        return None
+        # find offset into seg and return place inside file
+        return [addr, seg.offset + addr - seg.start]
 
     # returns a tuple of (start of segment, size of segment) for each segment
     # we do not need special logic to ensure multiple tuples aren't contiguos
@@ -139,7 +156,7 @@ class LimeAddressSpace(addrspace.BaseAddressSpace):
     def get_available_addresses(self):
         for seg in self.segs:
 
-            seglength = seg.end - seg.start
+            seglength = seg.end - seg.start + 1
 
             yield (seg.start, seglength)
 
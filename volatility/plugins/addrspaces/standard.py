@@ -28,6 +28,7 @@ import volatility.addrspace as addrspace
 import volatility.debug as debug #pylint: disable-msg=W0611
 import urllib.request, urllib.parse, urllib.error
 import os
+import mmap
 
 #pylint: disable-msg=C0111
 
@@ -83,6 +84,11 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         self.fhandle.seek(0, 2)
         self.fsize = self.fhandle.tell()
         self.offset = 0
+        self.mapping = None
+        ## Layered subclasses (crash dumps, hibernation files) translate
+        ## their reads, so only a raw file at the bottom is mapped
+        if base is None and not config.WRITE and not config.NO_MMAP:
+            self.mapping = self._map_file()
 
     # Abstract Classes cannot register options, and since this checks config.WRITE in __init__, we define the option here
     @staticmethod
@@ -90,13 +96,43 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         config.add_option("WRITE", short_option = 'w', action = "callback", default = False,
                           help = "Enable write support", callback = write_callback)
 
+        config.add_option("NO-MMAP", default = False, action = "store_true",
+                          cache_invalidator = False,
+                          help = "Read images with file reads instead of mapping them into memory")
+
+    def _map_file(self):
+        """Maps the file read-only into memory.
+
+        Reads are then served straight out of the OS page cache (which
+        is shared between concurrent analyses of the same image) without
+        a seek and read syscall each. Returns None if the file can't be
+        mapped (e.g. it is empty or too large for this platform).
+        """
+        try:
+            return mmap.mmap(self.fhandle.fileno(), 0, access = mmap.ACCESS_READ)
+        except (ValueError, OSError, OverflowError) as e:
+            debug.debug("Unable to map {0} into memory: {1}".format(self.fname, e))
+            return None
+
     def fread(self, length):
         return self.fhandle.read(length)
 
     def read(self, addr, length):
+        if self.mapping is not None and addr >= 0:
+            return self.mapping[addr:addr + length]
         self.fhandle.seek(addr)
         return self.fhandle.read(length)
 
+    def view(self, addr, length):
+        """Returns a zero-copy memoryview of the data at addr.
+
+        This is only possible when a raw image at the bottom of the
+        stack is mapped into memory, otherwise the data is read as normal.
+        """
+        if self.mapping is not None and addr >= 0:
+            return memoryview(self.mapping)[addr:addr + length]
+        return memoryview(self.read(addr, length))
+
     def zread(self, addr, length):
         return self.read(addr, length)
 
@@ -116,6 +152,13 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         return addr < self.fsize
 
     def close(self):
+        if self.mapping is not None:
+            try:
+                self.mapping.close()
+            except BufferError:
+                ## Views are still held on the mapping, let them release it
+                pass
+            self.mapping = None
         self.fhandle.close()
 
     def write(self, addr, data):
@@ -54,6 +54,7 @@ class PoolTagCheck(scan.ScannerCheck):
         scan.ScannerCheck.__init__(self, address_space, **kwargs)
         import codecs
         self.tag = codecs.escape_encode(bytes(tag, sys.getdefaultencoding()))[0]
+        self.tags = [self.tag]
 
     def skip(self, data, offset):
         try:
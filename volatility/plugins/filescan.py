@@ -354,7 +354,7 @@ class CheckProcess(scan.ScannerCheck):
         pool_alignment = obj.VolMagic(self.address_space).PoolAlignment.v()
         eprocess = obj.Object("_EPROCESS", vm = self.address_space,
                   offset = pool_base + pool_obj.BlockSize * pool_alignment -
-                  common.pool_align(self.address_space, '_EPROCESS', pool_alignment))
+                  common.pool_align(self.address_space, '_EPROCESS', pool_alignment)).snapshot()
 
         if (eprocess.Pcb.DirectoryTableBase == 0):
             return False
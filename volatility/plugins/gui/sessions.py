@@ -77,9 +77,8 @@ class Sessions(common.AbstractWindowsCommand, SessionsMixin):
         # Kernel AS for looking up modules 
         kernel_space = utils.load_as(self._config)
 
-        # Modules sorted for address lookups 
-        mods = dict((mod.DllBase, mod) for mod in modules.lsmod(kernel_space))
-        mod_addrs = sorted(mods.keys())
+        # Modules indexed for address lookups 
+        mods = modules.module_index(kernel_space)
 
         for session in data:
             outfd.write("*" * 50 + "\n")
@@ -99,7 +98,7 @@ class Sessions(common.AbstractWindowsCommand, SessionsMixin):
                     process.CreateTime,
                     ))
             for image in session.images():
-                module = tasks.find_module(mods, mod_addrs, image.Address)
+                module = mods.find(image.Address)
                 outfd.write(" Image: {0:#x}, Address {1:x}, Name: {2}\n".format(
                     image.obj_offset,
                     image.Address,
@@ -19,13 +19,37 @@
 #
 
 import os
+import json
+import time
+import heapq
+import queue
+import itertools
+import collections
+import concurrent.futures
 import volatility.debug as debug
+import volatility.scan as scan
 import volatility.utils as utils
+import volatility.discovery as discovery
+import volatility.sparse as sparse
 import volatility.plugins.common as common
+import volatility.plugins.addrspaces.compressed as compressed
+
+def read_job(offset, addr, length):
+    """A job writing length bytes read from addr to offset"""
+    return offset, lambda space: space.read(addr, length)
+
+def data_job(offset, data):
+    """A job writing data which has already been read to offset"""
+    return offset, lambda space: data
 
 class ImageCopy(common.AbstractWindowsCommand):
     """Copies a physical address space out as a raw DD image"""
 
+    ## How often (in seconds) progress is flushed to the checkpoint file
+    checkpoint_interval = 10
+    ## Whether the output may be written as a compressed image
+    compressible = True
+
     def __init__(self, *args, **kwargs):
         common.AbstractWindowsCommand.__init__(self, *args, **kwargs)
         self._config.add_option("BLOCKSIZE", short_option = "b", default = 1024 * 1024 * 5,
@@ -34,14 +58,125 @@ class ImageCopy(common.AbstractWindowsCommand):
         self._config.add_option("OUTPUT-IMAGE", short_option = "O", default = None,
                                 help = "Writes a raw DD image out to OUTPUT-IMAGE",
                                 action = 'store', type = 'str')
+        self._config.add_option("COPY-THREADS", default = 4,
+                                help = "Number of threads reading blocks to copy",
+                                action = 'store', type = 'int')
+        self._config.add_option("COMPRESS", default = None,
+                                help = "Writes a compressed, indexed image instead (zlib or lzma)",
+                                action = 'store', type = 'str')
+        ## The number of jobs already written by an earlier run
+        self._skip = 0
+        ## For spaces copied by read_blocks, the compressed block a
+        ## resumed copy starts from (None for all other spaces)
+        self.resume_block = None
+        ## The length of the output, including any zero pages skipped at the end
+        self.output_end = 0
 
     def calculate(self):
         blocksize = self._config.BLOCKSIZE
         addr_space = utils.load_as(self._config, astype = 'physical')
 
+        ## Compressed spaces (hibernation files) are much faster to 
+        ## copy out a whole compressed block at a time
+        if hasattr(addr_space, "read_blocks"):
+            self.resume_block = 0
+            jobs = (data_job(i, data) for i, data in self.coalesce_blocks(addr_space, blocksize))
+            return self.pipeline(addr_space, jobs, 1)
+
+        return self.pipeline(addr_space, self.range_jobs(addr_space, blocksize))
+
+    def range_jobs(self, addr_space, blocksize, offset = 0):
+        """Splits the available ranges of addr_space into jobs of
+        up to blocksize bytes, written at offset onwards. Zero pages
+        are left as holes with --skip-zero."""
         for s, l in addr_space.get_available_addresses():
+            self.output_end = max(self.output_end, s + l + offset)
+        if hasattr(addr_space, "get_address_range"):
+            self.output_end = max(self.output_end, addr_space.get_address_range()[1] + offset)
+
+        if self._config.COMPRESS:
+            ## Compressed images have to know the zero pages are present,
+            ## including those a compressed source leaves out
+            ranges = addr_space.get_available_addresses()
+            if hasattr(addr_space, "get_zero_addresses"):
+                ranges = heapq.merge(ranges, addr_space.get_zero_addresses())
+        else:
+            ranges = sparse.available_addresses(addr_space)
+
+        for s, l in ranges:
             for i in range(s, s + l, blocksize):
-                yield i, addr_space.read(i, min(blocksize, s + l - i))
+                yield read_job(i + offset, i, min(blocksize, s + l - i))
+
+    def pipeline(self, addr_space, jobs, threads = None):
+        """Runs jobs on a pool of reader threads, yielding the 
+        (offset, data) they produce in the order of the jobs.
+
+        Address spaces are not safe to share between threads, so 
+        each reader gets a stack of its own.
+        """
+        if threads is None:
+            threads = self._config.COPY_THREADS or 1
+
+        jobs = itertools.islice(jobs, self._skip, None)
+
+        if threads <= 1:
+            for offset, reader in jobs:
+                yield offset, reader(addr_space)
+            return
+
+        spaces = queue.Queue()
+        spaces.put(addr_space)
+        for _ in range(threads - 1):
+            spaces.put(utils.load_as(self._config, astype = 'physical'))
+
+        def run(reader):
+            space = spaces.get()
+            try:
+                return reader(space)
+            finally:
+                spaces.put(space)
+
+        ## Only keep a few blocks in flight so memory use stays bounded
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            for offset, reader in jobs:
+                pending.append((offset, pool.submit(run, reader)))
+                if len(pending) >= threads * 2:
+                    offset, future = pending.popleft()
+                    yield offset, future.result()
+
+            while pending:
+                offset, future = pending.popleft()
+                yield offset, future.result()
+
+    def coalesce_blocks(self, addr_space, blocksize):
+        """Joins the pages of the space's decompressed blocks into runs 
+        of up to blocksize bytes which are contiguous in the output.
+
+        Starts from block self.resume_block, without decompressing the
+        blocks before it. While each run is being written, resume_block
+        is the block holding the first page after it.
+        """
+        start = None
+        run = []
+        length = 0
+        first = self.resume_block or 0
+        for block, (pages, data) in enumerate(addr_space.read_blocks(scan.scan_workers(), first), first):
+            for offset, page in pages:
+                if start is not None and (page * 0x1000 != start + length or length >= blocksize):
+                    self.resume_block = block
+                    yield start, b''.join(run)
+                    start = None
+                if start is None:
+                    start = page * 0x1000
+                    run = []
+                    length = 0
+                run.append(data[offset * 0x1000:offset * 0x1000 + 0x1000])
+                length += 0x1000
+
+        if start is not None:
+            self.resume_block = block + 1
+            yield start, b''.join(run)
 
     def human_readable(self, value):
         for i in ['B', 'KB', 'MB', 'GB']:
@@ -50,29 +185,136 @@ class ImageCopy(common.AbstractWindowsCommand):
             value = value / 1024.0
         return "{0:0.2f} TB".format(value)
 
+    def checkpoint_filename(self):
+        return self._config.OUTPUT_IMAGE + ".checkpoint"
+
+    def checkpoint_source(self):
+        """Identifies what is being copied, so that a checkpoint is
+        not used to resume a different copy"""
+        source = [self.__class__.__name__, self._config.LOCATION,
+                  self._config.PROFILE, self._config.BLOCKSIZE,
+                  bool(self._config.SKIP_ZERO)]
+        path = discovery.image_path(self._config)
+        if path:
+            st = os.stat(path)
+            source += [st.st_size, st.st_mtime_ns]
+        return source
+
+    def load_checkpoint(self):
+        """Returns the (jobs written, length of output, block to resume
+        from) recorded for an interrupted copy to OUTPUT-IMAGE, or None"""
+        if not os.path.exists(self._config.OUTPUT_IMAGE):
+            return None
+        try:
+            with open(self.checkpoint_filename()) as fd:
+                data = json.load(fd)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or data.get('source') != self.checkpoint_source():
+            return None
+        return data['done'], data['end'], data.get('block')
+
+    def save_checkpoint(self, f, done, end, block = None):
+        f.flush()
+        os.fsync(f.fileno())
+        data = dict(source = self.checkpoint_source(), done = done, end = end, block = block)
+        filename = self.checkpoint_filename()
+        tmp = filename + ".tmp"
+        with open(tmp, 'w') as fd:
+            json.dump(data, fd)
+        os.replace(tmp, filename)
+
+    def render_compressed(self, outfd, data):
+        """Writes the blocks out as a compressed image, which can be
+        analysed directly by the CompressedImageAddressSpace"""
+        if not self.compressible:
+            debug.error("This plugin can not write compressed images")
+
+        if self._config.COMPRESS not in compressed.COMPRESSORS:
+            debug.error("Unknown compression {0}, use one of: {1}".format(
+                self._config.COMPRESS, ", ".join(sorted(compressed.COMPRESSORS))))
+
+        if os.path.exists(self._config.OUTPUT_IMAGE) and (os.path.getsize(self._config.OUTPUT_IMAGE) > 1):
+            debug.error("Refusing to overwrite an existing file, please remove it before continuing")
+
+        outfd.write("Writing compressed data (" + self.human_readable(self._config.BLOCKSIZE) + " chunks): |")
+        with open(self._config.OUTPUT_IMAGE, "wb") as f:
+            writer = compressed.CompressedImageWriter(f, self._config.COMPRESS)
+            try:
+                for o, block in data:
+                    if block is None:
+                        raise TypeError("No data at offset {0:#x}".format(o))
+                    writer.write(o, block)
+                    outfd.write(".")
+                    outfd.flush()
+            except TypeError:
+                debug.error("Error when reading from address space")
+            writer.close()
+        outfd.write("|\n")
+
     def render_text(self, outfd, data):
-        """Renders the file to disk"""
+        """Renders the file to disk
+
+        Blocks which are entirely zero are not written, leaving holes 
+        in the output on filesystems that support sparse files. The 
+        progress is recorded in OUTPUT-IMAGE.checkpoint as it goes, 
+        and an interrupted copy is resumed by running it again.
+        """
         if self._config.OUTPUT_IMAGE is None:
             debug.error("Please provide an output-image filename")
 
-        if os.path.exists(self._config.OUTPUT_IMAGE) and (os.path.getsize(self._config.OUTPUT_IMAGE) > 1):
-            debug.error("Refusing to overwrite an existing file, please remove it before continuing")
+        if self._config.COMPRESS:
+            return self.render_compressed(outfd, data)
+
+        checkpoint = self.load_checkpoint()
+        if checkpoint is None:
+            if os.path.exists(self._config.OUTPUT_IMAGE) and (os.path.getsize(self._config.OUTPUT_IMAGE) > 1):
+                debug.error("Refusing to overwrite an existing file, please remove it before continuing")
+            f = open(self._config.OUTPUT_IMAGE, "wb+")
+            done, end, resume = 0, 0, self.resume_block
+        else:
+            done, end, resume = checkpoint
+            outfd.write("Resuming after {0} blocks\n".format(done))
+            f = open(self._config.OUTPUT_IMAGE, "rb+")
+
+        ## Copies by compressed block restart from the block recorded,
+        ## everything else skips the jobs already written
+        if self.resume_block is None:
+            self._skip = done
+        else:
+            self.resume_block = resume = resume or 0
 
         outfd.write("Writing data (" + self.human_readable(self._config.BLOCKSIZE) + " chunks): |")
-        f = file(self._config.OUTPUT_IMAGE, "wb+")
         progress = 0
+        saved = time.time()
         try:
             for o, block in data:
-                f.seek(o)
-                f.write(block)
-                f.flush()
+                if block is None:
+                    raise TypeError("No data at offset {0:#x}".format(o))
+                if block.count(0) != len(block):
+                    f.seek(o)
+                    f.write(block)
+                end = max(end, o + len(block))
+                done += 1
+                resume = self.resume_block
+                if time.time() - saved > self.checkpoint_interval:
+                    self.save_checkpoint(f, done, end, resume)
+                    saved = time.time()
                 outfd.write(".")
                 outfd.flush()
                 progress = o
+            ## Zero blocks at the end still count towards the size
+            f.truncate(max(end, self.output_end))
         except TypeError:
+            self.save_checkpoint(f, done, end, resume)
             debug.error("Error when reading from address space")
         except BaseException as e:
-            debug.error("Unexpected error ({1}) during copy, recorded data up to offset {0:0x}".format(progress, str(e)))
+            self.save_checkpoint(f, done, end, resume)
+            debug.error("Unexpected error ({1}) during copy, recorded data up to offset {0:0x}, run again to resume".format(progress, str(e)))
         finally:
             f.close()
+
+        if os.path.exists(self.checkpoint_filename()):
+            os.remove(self.checkpoint_filename())
         outfd.write("|\n")
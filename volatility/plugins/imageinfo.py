@@ -23,7 +23,9 @@ import volatility.timefmt as timefmt
 import volatility.utils as utils
 import volatility.debug as debug
 import volatility.obj as obj
+import volatility.addrspace as addrspace
 import volatility.cache as cache
+import volatility.discovery as discovery
 import volatility.registry as registry
 import volatility.plugins.kdbgscan as kdbgscan
 
@@ -64,6 +66,9 @@ class ImageInfo(kdbgscan.KDBGScan):
                 chosen = profile
                 break
 
+        if hasattr(addr_space, "dtb"):
+            discovery.remember_profile(self._config, chosen)
+
         if bestguess != chosen:
             if not suggestion:
                 suggestion = 'No suggestion'
@@ -71,12 +76,10 @@ class ImageInfo(kdbgscan.KDBGScan):
 
         yield ('Suggested Profile(s)', suggestion)
 
-        tmpas = addr_space
         count = 0
-        while tmpas:
+        for tmpas in addrspace.layers(addr_space):
             count += 1
             yield ('AS Layer' + str(count), tmpas.__class__.__name__ + " (" + tmpas.name + ")")
-            tmpas = tmpas.base
 
         if not hasattr(addr_space, "pae"):
             yield ('PAE type', "No PAE")
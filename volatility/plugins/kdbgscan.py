@@ -18,7 +18,12 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
 #
 
+import os
+import sys
+import json
 import volatility.obj as obj
+import volatility.constants as constants
+import volatility.debug as debug
 import volatility.scan as scan
 import volatility.cache as cache
 import volatility.plugins.common as common
@@ -27,6 +32,66 @@ import volatility.registry as registry
 import volatility.utils as utils
 import volatility.exceptions as exceptions
 
+def manifest_signature():
+    """Returns a signature of the installed profiles and modifications.
+
+       This changes whenever a module defining one of them does, so it
+       tells us when the profile manifest is out of date.
+    """
+    signature = [constants.VERSION]
+    modules = set()
+    for cls in (obj.Profile, obj.ProfileModification):
+        for plugin in registry._get_subclasses(cls):
+            signature.append(plugin.__name__)
+            modules.add(plugin.__module__)
+
+    for name in modules:
+        path = getattr(sys.modules.get(name), '__file__', None)
+        try:
+            signature.append("{0}:{1}".format(name, os.stat(path).st_mtime_ns))
+        except (TypeError, OSError):
+            signature.append(name)
+
+    return sorted(signature)
+
+def kdbg_headers(config):
+    """Returns a dict of the KDBGHeader of each windows profile.
+
+       Working these out means instantiating every profile (and so
+       loading all of their vtypes), so they are kept in a small 
+       manifest in the cache directory and only worked out again 
+       when the profiles change.
+    """
+    filename = os.path.join(config.CACHE_DIRECTORY, "profiles.manifest")
+    signature = manifest_signature()
+
+    try:
+        with open(filename) as fd:
+            manifest = json.load(fd)
+        if manifest['signature'] == signature:
+            return manifest['kdbg_headers']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+
+    headers = {}
+    origprofile = config.PROFILE
+    for p in registry.get_plugin_classes(obj.Profile):
+        config.update('PROFILE', p)
+        buf = addrspace.BufferAddressSpace(config)
+        if buf.profile.metadata.get('os', 'unknown') == 'windows':
+            headers[p] = str(obj.VolMagic(buf).KDBGHeader)
+    config.update('PROFILE', origprofile)
+
+    try:
+        if not os.path.isdir(config.CACHE_DIRECTORY):
+            os.makedirs(config.CACHE_DIRECTORY)
+        with open(filename, 'w') as fd:
+            json.dump(dict(signature = signature, kdbg_headers = headers), fd)
+    except (IOError, OSError) as e:
+        debug.debug("Unable to save the profile manifest {0}: {1}".format(filename, e))
+
+    return headers
+
 class MultiStringFinderCheck(scan.ScannerCheck):
     """ Checks for multiple strings per page """
 
@@ -101,18 +166,8 @@ class KDBGScan(common.AbstractWindowsCommand):
     @cache.CacheDecorator(lambda self: "tests/kdbgscan/kdbg={0}".format(self._config.KDBG))
     def calculate(self):
         """Determines the address space"""
-        profilelist = [ p.__name__ for p in list(registry.get_plugin_classes(obj.Profile).values()) ]
-
-        proflens = {}
-        maxlen = 0
-        origprofile = self._config.PROFILE
-        for p in profilelist:
-            self._config.update('PROFILE', p)
-            buf = addrspace.BufferAddressSpace(self._config)
-            if buf.profile.metadata.get('os', 'unknown') == 'windows':
-                proflens[p] = str(obj.VolMagic(buf).KDBGHeader)
-                maxlen = max(maxlen, len(proflens[p]))
-        self._config.update('PROFILE', origprofile)
+        proflens = kdbg_headers(self._config)
+        maxlen = max([0] + [ len(x) for x in proflens.values() ])
 
         scanner = KDBGScanner(needles = list(proflens.values()))
 
@@ -54,7 +54,7 @@ class linux_check_afinfo(linux_common.AbstractLinuxCommand):
 
         self.known_addrs = {}
         
-        modules  = linux_lsmod.linux_lsmod(self._config).get_modules()
+        modules  = linux_common.module_index(linux_lsmod.linux_lsmod(self._config).get_modules())
         op_members  = list(self.profile.types['file_operations'].keywords["members"].keys())
         seq_members = list(self.profile.types['seq_operations'].keywords["members"].keys())       
 
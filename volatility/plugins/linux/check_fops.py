@@ -110,7 +110,7 @@ class linux_check_fop(linux_common.AbstractLinuxCommand):
         linux_common.set_plugin_members(self)
         self.known_addrs = {}
 
-        modules = linux_lsmod.linux_lsmod(self._config).get_modules()
+        modules = linux_common.module_index(linux_lsmod.linux_lsmod(self._config).get_modules())
             
         f_op_members = list(self.profile.types['file_operations'].keywords["members"].keys())
         f_op_members.remove('owner')
@@ -24,12 +24,9 @@
 import volatility.obj as obj
 import volatility.debug as debug
 import volatility.plugins.linux.common as linux_common
+import volatility.disasm as disasm
 
-try:
-    import distorm3
-    has_distorm = True
-except ImportError:
-    has_distorm = False
+has_distorm = disasm.has_distorm3
 
 class linux_check_syscall(linux_common.AbstractLinuxCommand):
     """ Checks if the system call table has been altered """
@@ -72,13 +69,14 @@ class linux_check_syscall(linux_common.AbstractLinuxCommand):
         """
         table_size = 0
 
+        if not has_distorm:
+            return table_size
+
         memory_model = self.addr_space.profile.metadata.get('memory_model', '32bit')
 
         if memory_model == '32bit':
-            mode = distorm3.Decode32Bits
             func = "sysenter_do_call"
         else:
-            mode = distorm3.Decode64Bits
             func = "system_call_fastpath"
 
         func_addr = self.get_profile_symbol(func)
@@ -87,7 +85,7 @@ class linux_check_syscall(linux_common.AbstractLinuxCommand):
 
             data = self.addr_space.read(func_addr, 6)
 
-            for op in distorm3.Decompose(func_addr, data, mode):
+            for op in disasm.decompose(func_addr, data, memory_model):
 
                 if not op.valid:
                     continue
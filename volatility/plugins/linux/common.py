@@ -45,6 +45,7 @@ class AbstractLinuxCommand(commands.Command):
     def __init__(self, *args, **kwargs):
         self.addr_space = None
         self.known_addrs = []
+        self.text_range = None
         commands.Command.__init__(self, *args, **kwargs)
 
     @property
@@ -225,8 +226,12 @@ class AbstractLinuxCommand(commands.Command):
 
     def is_known_address(self, addr, modules):
 
-        text = self.profile.get_symbol("_text", sym_type = "Pointer")
-        etext = self.profile.get_symbol("_etext", sym_type = "Pointer")
+        # the kernel text only needs looking up once 
+        if self.text_range == None:
+            self.text_range = (self.profile.get_symbol("_text", sym_type = "Pointer"),
+                               self.profile.get_symbol("_etext", sym_type = "Pointer"))
+
+        (text, etext) = self.text_range
 
         return  (text <= addr < etext or address_in_module(modules, addr))
 
@@ -320,10 +325,18 @@ def S_ISDIR(mode):
 def S_ISREG(mode):
     return (mode & linux_flags.S_IFMT) == linux_flags.S_IFREG
 
-# This returns the name of the module that contains an address or None
-# The module_list parameter comes from a call to get_modules
+# Returns an AddressIndex of module names by address, for looking up 
+# many addresses. The module_list parameter comes from a call to get_modules
+def module_index(module_list):
+    return utils.AddressIndex((start, end, name) for (name, start, end) in module_list)
+
+# This returns whether an address is inside a module
+# The module_list parameter comes from a call to get_modules or module_index
 # This function will be updated after 2.2 to resolve symbols within the module as well
 def address_in_module(module_list, address):
+    if isinstance(module_list, utils.AddressIndex):
+        return address in module_list
+
     ret = False
 
     for (name, start, end) in module_list:
@@ -28,12 +28,9 @@ import volatility.plugins.malware.malfind as malfind
 import volatility.plugins.overlays.basic as basic
 import volatility.plugins.procdump as procdump
 import volatility.exceptions as exceptions
+import volatility.disasm as disasm
 
-try:
-    import distorm3
-    has_distorm3 = True
-except ImportError:
-    has_distorm3 = False
+has_distorm3 = disasm.has_distorm3
 
 #--------------------------------------------------------------------------------
 # Constants
@@ -126,7 +123,7 @@ class ModuleGroup(object):
 
         self.mods = list(mod_list)
         self.mod_name = {}
-        self.mod_fast = [(mod.DllBase, mod.DllBase + mod.SizeOfImage, mod) for mod in self.mods]
+        self.mod_index = modules.index_modules(self.mods)
 
         for mod in self.mods:
             name = str(mod.BaseDllName or '').lower()
@@ -141,15 +138,39 @@ class ModuleGroup(object):
         @param address: location in process or kernel AS to 
         find an owning module.
 
-        When performing thousands of lookups, this method
-        is actually quicker than tasks.find_module.
+        This is a binary search of the modules' address ranges.
         """
 
-        for base, end, mod in self.mod_fast:
-            if address >= base and address <= end:
-                return mod
+        return self.mod_index.find(address, obj.NoneObject(""))
 
-        return obj.NoneObject("")
+#--------------------------------------------------------------------------------
+# Physical Pages 
+#--------------------------------------------------------------------------------
+
+def page_frames(addr_space, address, length):
+    """Return the physical frames backing length bytes at address. 
+
+    DLLs are mapped copy-on-write into every process, so data backed 
+    by the same frames is the same in each of them, until a process 
+    (or a rootkit) writes to its copy. 
+
+    @returns: a tuple of frame numbers, or None if a page is not
+        resident or the AS does not translate addresses. 
+    """
+
+    if not hasattr(addr_space, "vtop"):
+        return None
+
+    frames = []
+    page = address & ~0xFFF
+    while page < address + length:
+        paddr = addr_space.vtop(page)
+        if paddr == None:
+            return None
+        frames.append(paddr >> 12)
+        page += 0x1000
+
+    return tuple(frames)
 
 #--------------------------------------------------------------------------------
 # Hook Class
@@ -369,6 +390,14 @@ class ApiHooks(procdump.ProcExeDump):
             "wanarp.sys", "ndis.sys", "atapi.sys", "ntoskrnl.exe",
             "ntkrnlpa.exe", "ntkrnlmp.exe"]
 
+        # Results of check_inline and export enumeration, shared by all 
+        # processes (and modules) whose data is in the same physical 
+        # pages. The shared DLLs are then only analyzed once, unless a 
+        # process has its own (patched) copy of a page. 
+        self.inline_memo = {}
+        self.export_memo = {}
+        self.memo_hits = 0
+
     @staticmethod
     def is_valid_profile(profile):
         return (profile.metadata.get('os', 'unknown') == 'windows' and
@@ -471,7 +500,7 @@ class ApiHooks(procdump.ProcExeDump):
 
             instructions = []
 
-            for op in distorm3.Decompose(function_address, data, distorm3.Decode32Bits):
+            for op in disasm.decompose(function_address, data):
                 if not op.valid:
                     break
                 if len(instructions) == 2:
@@ -515,7 +544,7 @@ class ApiHooks(procdump.ProcExeDump):
                     hook.add_hop_chunk(syscall_address, addr_space.zread(syscall_address, 24))
                     yield hook
 
-    def check_ucpcall(self, addr_space, module, module_group):
+    def check_ucpcall(self, addr_space, module, module_group, codes = None):
         """Scan for calls to unknown code pages. 
 
         @param addr_space: a kernel AS
@@ -523,6 +552,9 @@ class ApiHooks(procdump.ProcExeDump):
         @param module: the _LDR_DATA_TABLE_ENTRY to scan
 
         @param module_group: a ModuleGroup instance for the process. 
+
+        @param codes: a list, if given, to which the disasm.Code of 
+            each executable section read is appended. 
         """
 
         try:
@@ -545,52 +577,48 @@ class ApiHooks(procdump.ProcExeDump):
             sec_va = module.DllBase + sec.VirtualAddress
 
             # Extract the section's data and make sure its not all zeros
-            data = addr_space.zread(sec_va, sec.Misc.VirtualSize)
+            code = disasm.Code(sec_va, addr_space.zread(sec_va, sec.Misc.VirtualSize))
 
-            if data == "\x00" * len(data):
+            if code.is_zero():
                 continue
 
-            # Disassemble instructions in the section 
-            for op in distorm3.Decompose(sec_va, data, distorm3.Decode32Bits):
+            if codes != None:
+                codes.append(code)
 
-                if (op.valid and ((op.flowControl == 'FC_CALL' and
-                        op.mnemonic == "CALL") or
-                        (op.flowControl == 'FC_UNC_BRANCH' and
-                        op.mnemonic == "JMP")) and
-                        op.operands[0].type == 'AbsoluteMemoryAddress'):
+            # Disassemble instructions in the section. const is ADDR, 
+            # which is the IAT location. 
+            for op, const in code.indirect_branches():
 
-                    # This is ADDR, which is the IAT location 
-                    const = op.operands[0].disp & 0xFFFFFFFF
-
-                    # Abort if ADDR is not a valid address
-                    if not addr_space.is_valid_address(const):
-                        continue
+                # Abort if ADDR is not a valid address
+                if not addr_space.is_valid_address(const):
+                    continue
 
-                    # This is what [ADDR] points to - the absolute destination 
+                # This is what [ADDR] points to - the absolute destination 
+                call_dest = code.read_pointer(const)
+                if call_dest == None:
                     call_dest = obj.Object("address", offset = const, vm = addr_space)
 
-                    # Abort if [ADDR] is not a valid address
-                    if not addr_space.is_valid_address(call_dest):
-                        continue
+                # Abort if [ADDR] is not a valid address
+                if not addr_space.is_valid_address(call_dest):
+                    continue
 
-                    check1 = module_group.find_module(const)
-                    check2 = module_group.find_module(call_dest)
+                check1 = module_group.find_module(const)
+                check2 = module_group.find_module(call_dest)
 
-                    # If ADDR or [ADDR] point to an unknown code page
-                    if not check1 or not check2:
-                        hook = Hook(hook_type = HOOKTYPE_CODEPAGE_KERNEL,
-                                    hook_mode = HOOK_MODE_KERNEL,
-                                    function_name = "",
-                                    function_address = op.address,
-                                    hook_address = call_dest,
-                                    )
-                        # Add the location we found the call
-                        hook.add_hop_chunk(op.address,
-                            data[op.address - sec_va : op.address - sec_va + 24])
+                # If ADDR or [ADDR] point to an unknown code page
+                if not check1 or not check2:
+                    hook = Hook(hook_type = HOOKTYPE_CODEPAGE_KERNEL,
+                                hook_mode = HOOK_MODE_KERNEL,
+                                function_name = "",
+                                function_address = op.address,
+                                hook_address = call_dest,
+                                )
+                    # Add the location we found the call
+                    hook.add_hop_chunk(op.address, code.zread(op.address, 24))
 
-                        # Add the rootkit stub 
-                        hook.add_hop_chunk(call_dest, addr_space.zread(call_dest, 24))
-                        yield hook
+                    # Add the rootkit stub 
+                    hook.add_hop_chunk(call_dest, addr_space.zread(call_dest, 24))
+                    yield hook
 
     def check_wsp(self, addr_space, module, module_group):
         """
@@ -665,7 +693,7 @@ class ApiHooks(procdump.ProcExeDump):
                 yield hook
             else:
                 # The function points inside mwsock, check inline 
-                ret = self.check_inline(function_address, addr_space,
+                ret = self.check_inline_shared(function_address, addr_space,
                     module.DllBase, module.DllBase + module.SizeOfImage)
 
                 if not ret:
@@ -690,7 +718,7 @@ class ApiHooks(procdump.ProcExeDump):
                         yield hook
 
     @staticmethod
-    def check_inline(va, addr_space, mem_start, mem_end):
+    def check_inline(va, addr_space, mem_start, mem_end, pointers = None, code = None):
         """
         Check for inline API hooks. We check for direct and indirect 
         calls, direct and indirect jumps, and PUSH/RET combinations. 
@@ -705,12 +733,24 @@ class ApiHooks(procdump.ProcExeDump):
         @param mem_end: end address of the module containing the func
             being checked. 
 
+        @param pointers: a list, if given, to which the addresses of
+            the pointers dereferenced by indirect calls and jumps are 
+            appended. 
+
+        @param code: a disasm.Code of the module's section, if it has
+            been read already, to take the prologue's instructions from.
+
         @returns: a tuple of (hooked, data, hook_address)
         """
 
-        data = addr_space.zread(va, 24)
+        if code != None and code.contains(va, 24):
+            data = code.zread(va, 24)
+            ops = code.instructions_at(va, 24)
+        else:
+            data = addr_space.zread(va, 24)
+            ops = None
 
-        if data == "\x00" * len(data):
+        if data == b"\x00" * len(data):
             #debug.debug("Cannot read function prologue at {0:#x}".format(va))
             return None
 
@@ -723,7 +763,10 @@ class ApiHooks(procdump.ProcExeDump):
         # Save the last PUSH before a CALL 
         push_val = None
 
-        for op in distorm3.Decompose(va, data, distorm3.Decode32Bits):
+        if ops == None:
+            ops = disasm.decompose(va, data)
+
+        for op in ops:
 
             # Quit the loop when we have three instructions or when 
             # a decomposition error is encountered, whichever is first.
@@ -737,6 +780,8 @@ class ApiHooks(procdump.ProcExeDump):
                 if op.mnemonic == "CALL" and op.operands[0].type == 'AbsoluteMemoryAddress':
                     # Check for CALL [ADDR]
                     const = op.operands[0].disp & 0xFFFFFFFF
+                    if pointers != None:
+                        pointers.append(const)
                     d = obj.Object("unsigned int", offset = const, vm = addr_space)
                     if outside_module(d):
                         break
@@ -753,6 +798,8 @@ class ApiHooks(procdump.ProcExeDump):
                 if op.operands[0].type == 'AbsoluteMemoryAddress':
                     # Check for JMP [ADDR]
                     const = op.operands[0].disp & 0xFFFFFFFF
+                    if pointers != None:
+                        pointers.append(const)
                     d = obj.Object("unsigned int", offset = const, vm = addr_space)
                     if outside_module(d):
                         break
@@ -783,15 +830,77 @@ class ApiHooks(procdump.ProcExeDump):
         else:
             return False, data, d
 
-    def gather_stuff(self, _addr_space, module):
+    def check_inline_shared(self, va, addr_space, mem_start, mem_end, codes = None):
+        """
+        Like check_inline, but the result is reused for every process 
+        whose function prologue (and any pointer it dereferences) is 
+        backed by the same physical pages. The prologue is taken from
+        any of the disasm.Code sections in codes which holds it.
+        """
+
+        code = None
+        for c in codes or []:
+            if c.contains(va, 24):
+                code = c
+                break
+
+        frames = page_frames(addr_space, va, 24)
+        if frames == None:
+            return self.check_inline(va, addr_space, mem_start, mem_end, code = code)
+
+        key = (int(va), int(mem_start), int(mem_end), frames)
+        if key in self.inline_memo:
+            ret, pointers = self.inline_memo[key]
+            if all(page_frames(addr_space, p, 4) == f for p, f in pointers):
+                self.memo_hits += 1
+                return ret
+
+        pointers = []
+        ret = self.check_inline(va, addr_space, mem_start, mem_end, pointers, code)
+        self.inline_memo[key] = (ret,
+            [(p, page_frames(addr_space, p, 4)) for p in pointers])
+        return ret
+
+    def get_exports(self, addr_space, module):
+        """
+        Enumerate a module's exports as (ordinal, address, name). The 
+        list is reused for every process which maps the module at the 
+        same base, with its PE header and export directory in the same
+        physical pages. 
+        """
+
+        frames = None
+        try:
+            data_dir = module.export_dir()
+            header = page_frames(addr_space, module.DllBase, 0x1000)
+            exports = page_frames(addr_space,
+                module.DllBase + data_dir.VirtualAddress, data_dir.Size)
+            if header != None and exports != None:
+                frames = header + exports
+        except ValueError:
+            pass
+
+        key = (int(module.DllBase), frames)
+        if frames != None and key in self.export_memo:
+            self.memo_hits += 1
+            return self.export_memo[key]
+
+        exports = [(o, module.DllBase + f, n) for o, f, n in module.exports()]
+        if frames != None:
+            self.export_memo[key] = exports
+        return exports
+
+    def gather_stuff(self, addr_space, module):
         """Use the Volatility object classes to enumerate
         imports and exports. This function can be overriden 
         to use pefile instead for speed testing"""
 
         # This is a dictionary where keys are the names of imported 
         # modules and values are lists of tuples (ord, addr, name). 
+        # Imports are not shared since the loader writes each 
+        # process's IAT. 
         imports = {}
-        exports = [(o, module.DllBase + f, n) for o, f, n in module.exports()]
+        exports = self.get_exports(addr_space, module)
 
         for dll, o, f, n in module.imports():
             dll = dll.lower()
@@ -824,6 +933,9 @@ class ApiHooks(procdump.ProcExeDump):
         # Lowercase for string matching 
         module_name = module_name.lower()
 
+        # Sections of the module which have been read and decoded whole
+        codes = []
+
         if hook_mode == HOOK_MODE_USER:
             if module_name == "ntdll.dll":
                 for hook in self.check_syscall(addr_space, module, module_group):
@@ -833,7 +945,7 @@ class ApiHooks(procdump.ProcExeDump):
                     yield hook
         else:
             if module_name in self.ucpscan_modules:
-                for hook in self.check_ucpcall(addr_space, module, module_group):
+                for hook in self.check_ucpcall(addr_space, module, module_group, codes):
                     yield hook
 
         imports, exports = \
@@ -898,8 +1010,8 @@ class ApiHooks(procdump.ProcExeDump):
                 # No need to check for inline hooks if EAT is hooked
                 continue
 
-            ret = self.check_inline(function_address, addr_space,
-                module.DllBase, module.DllBase + module.SizeOfImage)
+            ret = self.check_inline_shared(function_address, addr_space,
+                module.DllBase, module.DllBase + module.SizeOfImage, codes)
 
             if ret == None:
                 #debug.debug("Cannot analyze {0}".format(n or ''))
@@ -1004,6 +1116,10 @@ class ApiHooks(procdump.ProcExeDump):
                         kernel_space, mod, module_group):
                     yield None, mod, hook
 
+        debug.debug("Reused the analysis of shared pages {0} times "
+                    "({1} unique prologues, {2} export tables)".format(
+                    self.memo_hits, len(self.inline_memo), len(self.export_memo)))
+
     def render_text(self, outfd, data):
         for process, module, hook in data:
 
@@ -24,12 +24,9 @@ import volatility.plugins.common as common
 import volatility.win32.modules as modules
 import volatility.win32.tasks as tasks
 import volatility.plugins.malware.devicetree as devicetree
+import volatility.disasm as disasm
 
-try:
-    import distorm3
-    has_distorm3 = True
-except ImportError:
-    has_distorm3 = False
+has_distorm3 = disasm.has_distorm3
 
 #--------------------------------------------------------------------------------
 # vtypes
@@ -233,6 +230,31 @@ class Callbacks(common.AbstractWindowsCommand):
         common.AbstractWindowsCommand.__init__(self, *args, **kwargs)
         self.phys_space = None
         self.kern_space = None
+        self.pool_hits = {}
+
+    def scan_pools(self, scanner_classes):
+        """
+        Run all the given pool scanners over physical memory in a 
+        single pass. The offsets found are kept per scanner class 
+        and later handed out by pool_offsets.
+        """
+
+        scanners = [cls() for cls in scanner_classes]
+        self.pool_hits = dict((cls, []) for cls in scanner_classes)
+
+        for scanner, offset in scan.MultiScanner(scanners).scan(self.phys_space):
+            self.pool_hits[scanner.__class__].append(offset)
+
+    def pool_offsets(self, scanner_class):
+        """
+        Return the offsets found by a pool scanner. If it wasn't 
+        part of the shared pass, it scans physical memory by itself.
+        """
+
+        if scanner_class in self.pool_hits:
+            return self.pool_hits[scanner_class]
+
+        return scanner_class().scan(self.phys_space)
 
     def get_kernel_callbacks(self, nt_mod):
         """
@@ -285,14 +307,14 @@ class Callbacks(common.AbstractWindowsCommand):
     def get_fs_callbacks(self):
         """Enumerate the File System change callbacks"""
 
-        for offset in PoolScanFSCallback().scan(self.phys_space):
+        for offset in self.pool_offsets(PoolScanFSCallback):
             callback = obj.Object('_NOTIFICATION_PACKET', offset, self.phys_space)
             yield "IoRegisterFsRegistrationChange", callback.NotificationRoutine, None
 
     def get_shutdown_callbacks(self):
         """Enumerate shutdown notification callbacks"""
 
-        for offset in PoolScanShutdownCallback().scan(self.phys_space):
+        for offset in self.pool_offsets(PoolScanShutdownCallback):
 
             # Instantiate the object in physical space but give it a native
             # VM of kernel space 
@@ -359,7 +381,7 @@ class Callbacks(common.AbstractWindowsCommand):
 
         # Looking for MOV EBX, CmpCallBackVector
         # This may be the first or second MOV EBX instruction
-        for op in distorm3.Decompose(symbol_address, data, distorm3.Decode32Bits):
+        for op in disasm.decompose(symbol_address, data):
             if op.valid and op.mnemonic == "MOV" and len(op.operands) == 2 and op.operands[0].name == 'EBX':
                 vector = op.operands[1].value
                 if c == 1:
@@ -394,14 +416,14 @@ class Callbacks(common.AbstractWindowsCommand):
         finding the generic callback structure 
         """
 
-        for offset in PoolScanGenericCallback().scan(self.phys_space):
+        for offset in self.pool_offsets(PoolScanGenericCallback):
             callback = obj.Object('_GENERIC_CALLBACK', offset, self.phys_space)
             yield "GenericKernelCallback", callback.Callback, None
 
     def get_dbgprint_callbacks(self):
         """Enumerate DebugPrint callbacks on Vista and 7"""
 
-        for offset in PoolScanDbgPrintCallback().scan(self.phys_space):
+        for offset in self.pool_offsets(PoolScanDbgPrintCallback):
             callback = obj.Object('_DBGPRINT_CALLBACK', offset, self.phys_space)
             yield "DbgSetDebugPrintCallback", callback.Function, None
 
@@ -413,7 +435,7 @@ class Callbacks(common.AbstractWindowsCommand):
         or CmRegisterCallbackEx.
         """
 
-        for offset in PoolScanRegistryCallback().scan(self.phys_space):
+        for offset in self.pool_offsets(PoolScanRegistryCallback):
             callback = obj.Object('_REGISTRY_CALLBACK', offset, self.phys_space)
             yield "CmRegisterCallback", callback.Function, None
 
@@ -422,13 +444,13 @@ class Callbacks(common.AbstractWindowsCommand):
 
         offsets = []
 
-        for offset in PoolScanPnp9().scan(self.phys_space):
+        for offset in self.pool_offsets(PoolScanPnp9):
             offsets.append(offset)
 
-        for offset in PoolScanPnpD().scan(self.phys_space):
+        for offset in self.pool_offsets(PoolScanPnpD):
             offsets.append(offset)
 
-        for offset in PoolScanPnpC().scan(self.phys_space):
+        for offset in self.pool_offsets(PoolScanPnpC):
             offsets.append(offset)
 
         for offset in offsets:
@@ -502,43 +524,52 @@ class Callbacks(common.AbstractWindowsCommand):
                    self.kern_space.profile.metadata.get('minor', 0))
 
         modlist = list(modules.lsmod(self.kern_space))
-        mods = dict((mod.DllBase, mod) for mod in modlist)
-        mod_addrs = sorted(mods.keys())
+        mods = modules.module_index(self.kern_space)
+
+        # Scan for all the pool tagged callbacks in one pass
+        scanners = [PoolScanFSCallback, PoolScanShutdownCallback,
+                    PoolScanGenericCallback]
+
+        if version >= (6, 0):
+            scanners += [PoolScanDbgPrintCallback, PoolScanRegistryCallback,
+                         PoolScanPnp9, PoolScanPnpD, PoolScanPnpC]
+
+        self.scan_pools(scanners)
 
         # First few routines are valid on all OS versions 
         for info in self.get_fs_callbacks():
-            yield info, mods, mod_addrs
+            yield info, mods
 
         for info in self.get_bugcheck_callbacks():
-            yield info, mods, mod_addrs
+            yield info, mods
 
         for info in self.get_shutdown_callbacks():
-            yield info, mods, mod_addrs
+            yield info, mods
 
         for info in self.get_generic_callbacks():
-            yield info, mods, mod_addrs
+            yield info, mods
 
         for info in self.get_bugcheck_reason_callbacks(modlist[0]):
-            yield info, mods, mod_addrs
+            yield info, mods
 
         for info in self.get_kernel_callbacks(modlist[0]):
-            yield info, mods, mod_addrs
+            yield info, mods
 
         # Valid for Vista and later
         if version >= (6, 0):
             for info in self.get_dbgprint_callbacks():
-                yield info, mods, mod_addrs
+                yield info, mods
 
             for info in self.get_registry_callbacks():
-                yield info, mods, mod_addrs
+                yield info, mods
 
             for info in self.get_pnp_callbacks():
-                yield info, mods, mod_addrs
+                yield info, mods
 
         # Valid for XP 
         if version == (5, 1):
             for info in self.get_registry_callbacks_legacy(modlist[0]):
-                yield info, mods, mod_addrs
+                yield info, mods
 
     def render_text(self, outfd, data):
 
@@ -549,9 +580,9 @@ class Callbacks(common.AbstractWindowsCommand):
                          ("Details", ""),
                         ])
 
-        for (sym, cb, detail), mods, mod_addrs in data:
+        for (sym, cb, detail), mods in data:
 
-            module = tasks.find_module(mods, mod_addrs, cb)
+            module = mods.find(cb)
 
             ## The original callbacks plugin searched driver objects
             ## if the owning module isn't found (Rustock.B). We leave that 
@@ -20,7 +20,6 @@ import re
 import volatility.obj as obj
 import volatility.plugins.filescan as filescan
 import volatility.win32.modules as modules
-import volatility.win32.tasks as tasks
 import volatility.utils as utils
 import volatility.plugins.malware.malfind as malfind
 
@@ -225,8 +224,7 @@ class DriverIrp(filescan.DriverScan):
         else:
             mod_re = None
 
-        mods = dict((mod.DllBase, mod) for mod in modules.lsmod(addr_space))
-        mod_addrs = sorted(mods.keys())
+        mods = modules.module_index(addr_space)
 
         bits = addr_space.profile.metadata.get('memory_model', '32bit')
 
@@ -253,7 +251,7 @@ class DriverIrp(filescan.DriverScan):
             # Write the address and owner of each IRP function 
             for i, function in enumerate(driver_obj.MajorFunction):
                 function = driver_obj.MajorFunction[i]
-                module = tasks.find_module(mods, mod_addrs, function)
+                module = mods.find(function)
                 if module:
                     module_name = str(module.BaseDllName or '')
                 else:
@@ -274,8 +274,7 @@ class IDT(common.AbstractWindowsCommand):
         if not self.is_valid_profile(addr_space.profile):
             debug.error("This command does not support the selected profile.")
 
-        mods = dict((mod.DllBase, mod) for mod in modules.lsmod(addr_space))
-        mod_addrs = sorted(mods.keys())
+        mods = modules.module_index(addr_space)
 
         for kpcr in tasks.get_kdbg(addr_space).kpcrs():
             # Get the GDT for access to selector bases
@@ -287,7 +286,7 @@ class IDT(common.AbstractWindowsCommand):
                 addr = entry.Address + gdt.get(entry.Selector.v(), 0)
 
                 # Lookup the function's owner 
-                module = tasks.find_module(mods, mod_addrs, addr)
+                module = mods.find(addr)
 
                 yield i, entry, addr, module
 
@@ -23,12 +23,9 @@ import volatility.plugins.common as common
 import volatility.debug as debug
 import volatility.win32.tasks as tasks
 import volatility.win32.modules as modules
+import volatility.disasm as disasm
 
-try:
-    import distorm3
-    has_distorm = True
-except ImportError:
-    has_distorm = False
+has_distorm = disasm.has_distorm3
 
 class ImpScan(common.AbstractWindowsCommand):
     """Scan for calls to imported functions"""
@@ -95,19 +92,8 @@ class ImpScan(common.AbstractWindowsCommand):
 
         return exports
 
-    def _call_or_unc_jmp(self, op):
-        """Determine if an instruction is a call or an
-        unconditional jump
-
-        @param op: a distorm3 Op object
-        """
-        return ((op.flowControl == 'FC_CALL' and
-                op.mnemonic == "CALL") or
-                (op.flowControl == 'FC_UNC_BRANCH' and
-                op.mnemonic == "JMP"))
-
-    def _vicinity_scan(self, addr_space, calls_imported,
-                apis, base_address, data_len, forward):
+    def _vicinity_scan(self, addr_space, code, calls_imported,
+                apis, forward):
         """Scan forward from the lowest IAT entry found or
         backward from the highest IAT entry found. We do this 
         because not every imported function will be called 
@@ -115,10 +101,9 @@ class ImpScan(common.AbstractWindowsCommand):
         calls are unavailable. 
 
         @param addr_space: an AS
+        @param code: the disasm.Code being scanned 
         @param calls_imported: dictionary of confirmed imports
         @param apis: dictionary of exported functions in the AS 
-        @param base_address: memory base address 
-        @param data_len: size in bytes to check from base_address
         @param forwared: the direction for the vicinity scan
         """
 
@@ -147,12 +132,15 @@ class ImpScan(common.AbstractWindowsCommand):
             else:
                 next_addr = start_addr - (i * size_of_address)
 
-            call_dest = obj.Object("address", offset = next_addr,
-                            vm = addr_space).v()
+            # The entries are usually in the data already read 
+            call_dest = code.read_pointer(next_addr)
+            if call_dest == None:
+                call_dest = obj.Object("address", offset = next_addr,
+                                vm = addr_space).v()
 
             if (not call_dest or
-                    call_dest < base_address or
-                    call_dest > base_address + data_len):
+                    call_dest < code.start or
+                    call_dest > code.end):
                 threshold -= 1
                 i += 1
                 continue
@@ -180,8 +168,8 @@ class ImpScan(common.AbstractWindowsCommand):
         else:
             return mod_name, func_name
 
-    def call_scan(self, addr_space, base_address, data):
-        """Disassemble a block of data and yield possible 
+    def call_scan(self, addr_space, code):
+        """Disassemble a region of code and yield possible 
         calls to imported functions. We're looking for 
         instructions such as these:
 
@@ -200,44 +188,23 @@ class ImpScan(common.AbstractWindowsCommand):
         current instruction (RIP). 
 
         @param addr_space: an AS to scan with
-        @param base_address: memory base address
-        @param data: buffer of data found at base_address 
+        @param code: a disasm.Code of the memory to scan
         """
 
-        end_address = base_address + len(data)
-
-        memory_model = addr_space.profile.metadata.get('memory_model', '32bit')
-
-        if memory_model == '32bit':
-            mode = distorm3.Decode32Bits
-        else:
-            mode = distorm3.Decode64Bits
-
-        for op in distorm3.Decompose(base_address, data, mode):
-
-            if not op.valid:
-                continue
-
-            iat_loc = None
-
-            if memory_model == '32bit':
-                if (self._call_or_unc_jmp(op) and
-                        op.operands[0].type == 'AbsoluteMemoryAddress'):
-                    iat_loc = (op.operands[0].disp) & 0xffffffff
-            else:
-                if (self._call_or_unc_jmp(op) and
-                        'FLAG_RIP_RELATIVE' in op.flags and
-                        op.operands[0].type == 'AbsoluteMemory'):
-                    iat_loc = op.address + op.size + op.operands[0].disp
+        for op, iat_loc in code.indirect_branches():
 
             if (not iat_loc or
-                    (iat_loc < base_address) or
-                    (iat_loc > end_address)):
+                    (iat_loc < code.start) or
+                    (iat_loc > code.end)):
                 continue
 
-            # This is the address being called 
-            call_dest = obj.Object("address", offset = iat_loc,
-                            vm = addr_space)
+            # This is the address being called. The IAT is usually
+            # in the data we already have. 
+            call_dest = code.read_pointer(iat_loc)
+
+            if call_dest == None:
+                call_dest = obj.Object("address", offset = iat_loc,
+                                vm = addr_space)
 
             if call_dest == None:
                 continue
@@ -277,7 +244,7 @@ class ImpScan(common.AbstractWindowsCommand):
             if not kernel_space:
                 debug.error("Cannot read supplied address")
 
-            data = kernel_space.zread(base_address, size_to_read)
+            code = disasm.Code.read(kernel_space, base_address, size_to_read)
             apis = self.enum_apis(all_mods)
             addr_space = kernel_space
         else:
@@ -325,26 +292,24 @@ class ImpScan(common.AbstractWindowsCommand):
             if not task_space.is_valid_address(base_address):
                 debug.error("Address is not valid in process AS")
 
-            data = task_space.zread(base_address, size_to_read)
+            code = disasm.Code.read(task_space, base_address, size_to_read)
             apis = self.enum_apis(all_mods)
             addr_space = task_space
 
         # This is a dictionary of confirmed API calls.
         calls_imported = dict(
                 (iat, call)
-                for (_, iat, call) in self.call_scan(addr_space, base_address, data)
+                for (_, iat, call) in self.call_scan(addr_space, code)
                 if call in apis
                 )
 
         # Scan forward 
-        self._vicinity_scan(addr_space,
-                calls_imported, apis, base_address, len(data),
-                forward = True)
+        self._vicinity_scan(addr_space, code,
+                calls_imported, apis, forward = True)
 
         # Scan reverse 
-        self._vicinity_scan(addr_space,
-                calls_imported, apis, base_address, len(data),
-                forward = False)
+        self._vicinity_scan(addr_space, code,
+                calls_imported, apis, forward = False)
 
         for iat, call in sorted(calls_imported.items()):
             yield iat, call, apis[call][0], apis[call][1]
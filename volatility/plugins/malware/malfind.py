@@ -29,6 +29,7 @@ import volatility.plugins.taskmods as taskmods
 import volatility.plugins.vadinfo as vadinfo
 import volatility.plugins.overlays.windows.windows as windows
 import volatility.constants as constants
+import volatility.sparse as sparse
 
 try:
     import yara
@@ -310,7 +311,7 @@ class DiscontigYaraScanner(BaseYaraScanner):
     def scan(self, start_offset = 0, maxlen = None):
         contiguous_offset = 0
         total_length = 0
-        for (offset, length) in self.address_space.get_available_addresses():
+        for (offset, length) in sparse.available_addresses(self.address_space):
             # Skip ranges before the start_offset
             if offset < start_offset:
                 continue
@@ -383,9 +384,7 @@ class YaraScan(taskmods.DllList):
             start = kdbg.MmSystemRangeStart.dereference_as("Pointer")
 
             # Modules so we can map addresses to owners
-            mods = dict((mod.DllBase, mod)
-                        for mod in modules.lsmod(addr_space))
-            mod_addrs = sorted(mods.keys())
+            mods = modules.module_index(addr_space)
 
             # There are multiple views (GUI sessions) of kernel memory.
             # Since we're scanning virtual memory and not physical, 
@@ -409,7 +408,7 @@ class YaraScan(taskmods.DllList):
                                                rules = rules)
 
                 for hit, address in scanner.scan(start_offset = start):
-                    module = tasks.find_module(mods, mod_addrs, address)
+                    module = mods.find(address)
                     yield (module, address, hit, session_space.zread(address, 1024))
 
         else:
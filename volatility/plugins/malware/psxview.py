@@ -18,6 +18,7 @@
 
 import volatility.utils as utils
 import volatility.obj as obj
+import volatility.scan as scan
 import volatility.plugins.common as common
 import volatility.win32.tasks as tasks
 import volatility.plugins.modscan as modscan
@@ -76,16 +77,40 @@ class PsXview(common.AbstractWindowsCommand):
         """Enumerate processes from PsActiveProcessHead"""
         return dict((p.obj_vm.vtop(p.obj_offset), p) for p in all_tasks)
 
-    def check_psscan(self):
+    def scan_pools(self):
+        """Scan physical memory once for process and thread pools
+
+        Returns a tuple of the _EPROCESS and _ETHREAD objects found.
+        """
+        phys_space = utils.load_as(self._config, astype = 'physical')
+        kernel_space = utils.load_as(self._config)
+
+        proc_scanner = filescan.PoolScanProcess()
+        thread_scanner = modscan.PoolScanThreadFast()
+
+        processes = []
+        threads = []
+
+        scanner = scan.MultiScanner([proc_scanner, thread_scanner])
+        for found_by, offset in scanner.scan(phys_space):
+            if found_by is proc_scanner:
+                processes.append(obj.Object('_EPROCESS', vm = phys_space,
+                                    native_vm = kernel_space, offset = offset))
+            else:
+                threads.append(obj.Object('_ETHREAD', vm = phys_space,
+                                    native_vm = kernel_space, offset = offset))
+
+        return processes, threads
+
+    def check_psscan(self, processes):
         """Enumerate processes with pool tag scanning"""
-        return dict((p.obj_offset, p)
-                    for p in filescan.PSScan(self._config).calculate())
+        return dict((p.obj_offset, p) for p in processes)
 
-    def check_thrdproc(self, _addr_space):
+    def check_thrdproc(self, threads):
         """Enumerate processes indirectly by ETHREAD scanning"""
         ret = dict()
 
-        for ethread in modscan.ThrdScan(self._config).calculate():
+        for ethread in threads:
             if ethread.ExitTime != 0:
                 continue
             # Bounce back to the threads owner 
@@ -142,8 +167,10 @@ class PsXview(common.AbstractWindowsCommand):
         # are dictionaries whose keys are physical process 
         # offsets and the values are _EPROCESS objects. 
         ps_sources['pslist'] = self.check_pslist(all_tasks)
-        ps_sources['psscan'] = self.check_psscan()
-        ps_sources['thrdproc'] = self.check_thrdproc(addr_space)
+        # psscan and thrdproc share a single pass over physical memory
+        processes, threads = self.scan_pools()
+        ps_sources['psscan'] = self.check_psscan(processes)
+        ps_sources['thrdproc'] = self.check_thrdproc(threads)
         ps_sources['csrss'] = self.check_csrss_handles(all_tasks)
         ps_sources['pspcid'] = self.check_pspcid(addr_space)
 
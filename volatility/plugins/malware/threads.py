@@ -86,16 +86,13 @@ class MalwareKthread(obj.ProfileModification):
 class AbstractThreadCheck(object):
     """Base thread check class"""
 
-    def __init__(self, thread, mods, mod_addrs, \
+    def __init__(self, thread, mods, \
                     hooked_tables, found_by_scanner):
         """
         @param thread: the _ETHREAD object
 
-        @param mods: a dictionary with module bases as 
-        keys and _LDR_DATA_TABLE_ENTRY as values. 
-
-        @param mod_addrs: a sorted list of module base
-        addresses 
+        @param mods: an AddressIndex of the kernel modules
+        (see modules.module_index). 
 
         @param hooked_tables: a list of SSDTs that have
         one or more hooked functions. 
@@ -106,7 +103,6 @@ class AbstractThreadCheck(object):
         """
         self.thread = thread
         self.mods = mods
-        self.mod_addrs = mod_addrs
         self.hooked_tables = hooked_tables
         self.found_by_scanner = found_by_scanner
         self.flags = str(thread.CrossThreadFlags)
@@ -121,8 +117,7 @@ class OrphanThread(AbstractThreadCheck):
         """This check is True for system threads whose start address
         do not map back to known/loaded kernel drivers."""
 
-        module = tasks.find_module(self.mods,
-            self.mod_addrs, self.thread.StartAddress)
+        module = self.mods.find(self.thread.StartAddress)
 
         return ('PS_CROSS_THREAD_FLAGS_SYSTEM' in self.flags and
                     module == None)
@@ -275,7 +270,7 @@ class Threads(taskmods.DllList):
         hooked_tables = {}
 
         for info in ssdt.SSDT(self._config).calculate():
-            idx, table, n, vm, mods, mod_addrs = info
+            idx, table, n, vm, mods = info
             # This is straight out of ssdt.py. Too bad there's no better way 
             # to not duplicate code?
             for i in range(n):
@@ -293,7 +288,7 @@ class Threads(taskmods.DllList):
                 except IndexError:
                     syscall_name = "UNKNOWN"
 
-                syscall_mod = tasks.find_module(mods, mod_addrs, syscall_addr)
+                syscall_mod = mods.find(syscall_addr)
                 if syscall_mod:
                     syscall_modname = syscall_mod.BaseDllName
                 else:
@@ -327,9 +322,8 @@ class Threads(taskmods.DllList):
         else:
             pidlist = []
 
-        # Get sorted list of kernel modules 
-        mods = dict((mod.DllBase, mod) for mod in modules.lsmod(addr_space))
-        mod_addrs = sorted(mods.keys())
+        # Get an index of the kernel modules by address 
+        mods = modules.module_index(addr_space)
 
         # Gather processes 
         all_tasks = list(tasks.pslist(addr_space))
@@ -371,12 +365,12 @@ class Threads(taskmods.DllList):
             for cls_name, cls in list(checks.items()):
 
                 instances = dict(
-                            (cls_name, cls(thread, mods, mod_addrs,
+                            (cls_name, cls(thread, mods,
                                 hooked_tables, found_by_scanner))
                             for cls_name, cls in list(checks.items())
                             )
 
-            yield thread, addr_space, mods, mod_addrs, instances, hooked_tables
+            yield thread, addr_space, mods, instances, hooked_tables
 
     def render_text(self, outfd, data):
 
@@ -386,7 +380,7 @@ class Threads(taskmods.DllList):
         else:
             filters = set()
 
-        for thread, addr_space, mods, mod_addrs, instances, hooked_tables in data:
+        for thread, addr_space, mods, instances, hooked_tables in data:
             # If the user didn't set filters, display all results. If 
             # the user set one or more filters, only show threads 
             # with matching results. 
@@ -425,7 +419,7 @@ class Threads(taskmods.DllList):
 
             # If its a system thread, get the owning module
             if "SystemThread" in tags:
-                owner = tasks.find_module(mods, mod_addrs, thread.StartAddress)
+                owner = mods.find(thread.StartAddress)
             else:
                 owner = None
 
@@ -97,8 +97,7 @@ class Timers(common.AbstractWindowsCommand):
                    addr_space.profile.metadata.get('minor', 0))
 
         modlist = list(modules.lsmod(addr_space))
-        mods = dict((mod.DllBase, mod) for mod in modlist)
-        mod_addrs = sorted(mods.keys())
+        mods = modules.module_index(addr_space)
 
         # KTIMERs collected 
         timers = []
@@ -166,7 +165,7 @@ class Timers(common.AbstractWindowsCommand):
                 continue
 
             # Lookup the module containing the DPC
-            module = tasks.find_module(mods, mod_addrs, timer.Dpc.DeferredRoutine)
+            module = mods.find(timer.Dpc.DeferredRoutine)
 
             yield timer, module
 
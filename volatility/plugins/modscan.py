@@ -108,7 +108,7 @@ class CheckThreads(scan.ScannerCheck):
         pool_alignment = obj.VolMagic(self.address_space).PoolAlignment.v()
         thread = obj.Object("_ETHREAD", vm = self.address_space,
                   offset = pool_base + pool_obj.BlockSize * pool_alignment -
-                  common.pool_align(self.address_space, '_ETHREAD', pool_alignment))
+                  common.pool_align(self.address_space, '_ETHREAD', pool_alignment)).snapshot()
 
         #if (thread.Cid.UniqueProcess.v() != 0 and 
         #    thread.ThreadsProcess.v() <= self.kernel):
@@ -185,8 +185,17 @@ class Netscan(common.AbstractWindowsCommand):
         if not self.is_valid_profile(kernel_space.profile):
             debug.error("This command does not support the selected profile.")
 
+        # Scan for all three pool types in a single pass
+        scanners = [PoolScanTcpListener(), PoolScanTcpEndpoint(), PoolScanUdpEndpoint()]
+        hits = dict((scanner, []) for scanner in scanners)
+
+        for scanner, offset in scan.MultiScanner(scanners).scan(flat_space):
+            hits[scanner].append(offset)
+
+        listeners, endpoints, udp_endpoints = [hits[scanner] for scanner in scanners]
+
         # Scan for TCP listeners also known as sockets
-        for offset in PoolScanTcpListener().scan(flat_space):
+        for offset in listeners:
 
             tcpentry = obj.Object('_TCP_LISTENER', offset = offset,
                                   vm = flat_space, native_vm = kernel_space)
@@ -200,7 +209,7 @@ class Netscan(common.AbstractWindowsCommand):
                 yield tcpentry, "TCP" + ver, laddr, tcpentry.Port, raddr, 0, "LISTENING"
 
         # Scan for TCP endpoints also known as connections 
-        for offset in PoolScanTcpEndpoint().scan(flat_space):
+        for offset in endpoints:
 
             tcpentry = obj.Object('_TCP_ENDPOINT', offset = offset,
                                   vm = flat_space, native_vm = kernel_space)
@@ -223,7 +232,7 @@ class Netscan(common.AbstractWindowsCommand):
                     tcpentry.RemoteAddress, tcpentry.RemotePort, tcpentry.State
 
         # Scan for UDP endpoints 
-        for offset in PoolScanUdpEndpoint().scan(flat_space):
+        for offset in udp_endpoints:
 
             udpentry = obj.Object('_UDP_ENDPOINT', offset = offset,
                                   vm = flat_space, native_vm = kernel_space)
@@ -25,7 +25,11 @@
 """
 
 import os
+import sys
 import copy
+import pickle
+import bisect
+import hashlib
 import zipfile
 
 import volatility.plugins
@@ -35,6 +39,9 @@ import volatility.exceptions as exceptions
 import volatility.obj as obj
 import volatility.debug as debug
 import volatility.dwarf as dwarf
+import volatility.conf as conf
+import volatility.cache #pylint: disable-msg=W0611
+config = conf.ConfObject()
 
 x64_native_types = copy.deepcopy(native_types.x64_native_types)
 
@@ -100,6 +107,66 @@ def parse_system_map(data, module):
 
     return arch, sys_map
 
+# Bump this when the parsing (or the format of compiled profiles) changes
+COMPILED_VERSION = 1
+
+def read_text(profpkg, name):
+    return profpkg.read(name).decode("utf-8", "replace")
+
+class CompiledProfile(object):
+    """ The parsed dwarf and system map of a profile zip.
+
+        Parsing a dwarf dump takes much longer than most plugins run, so
+        the results are kept in the cache directory, keyed by the zip
+        members' names, sizes and CRCs (from the zip directory, so the 
+        members themselves are not read to check them).
+    """
+
+    def __init__(self, path, profilename, dwarf_name, sysmap_name, key):
+        self.path = path
+        self.profilename = profilename
+        self.dwarf_name = dwarf_name
+        self.sysmap_name = sysmap_name
+        self.key = key
+
+    def filename(self):
+        return os.path.join(config.CACHE_DIRECTORY, "linux",
+                            "{0}-{1}.pickle".format(self.profilename, self.key))
+
+    def load(self):
+        """Returns (vtypes, sys_map), parsing the zip if there is no compiled copy"""
+        filename = self.filename()
+        try:
+            with open(filename, "rb") as fd:
+                data = pickle.load(fd)
+            debug.debug("{0}: Loaded compiled profile {1}".format(self.profilename, filename))
+            return data['vtypes'], data['sys_map']
+        except (IOError, OSError, EOFError, KeyError, pickle.UnpicklingError) as e:
+            debug.debug("{0}: No compiled profile ({1})".format(self.profilename, e))
+
+        with zipfile.ZipFile(self.path) as profpkg:
+            vtypesvar = dwarf.DWARFParser(read_text(profpkg, self.dwarf_name)).finalize()
+            debug.debug("{2}: Found dwarf file {0} with {1} symbols".format(self.dwarf_name, len(vtypesvar), self.profilename))
+
+            _memmodel, sysmapvar = parse_system_map(read_text(profpkg, self.sysmap_name), "kernel")
+            debug.debug("{2}: Found system file {0} with {1} symbols".format(self.sysmap_name, len(sysmapvar["kernel"]), self.profilename))
+
+        self.save(filename, dict(vtypes = vtypesvar, sys_map = sysmapvar))
+        return vtypesvar, sysmapvar
+
+    def save(self, filename, data):
+        try:
+            directory = os.path.dirname(filename)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            ## Write then rename so concurrent runs never see half a file
+            tmp = "{0}.{1}".format(filename, os.getpid())
+            with open(tmp, "wb") as fd:
+                pickle.dump(data, fd, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, filename)
+        except (IOError, OSError) as e:
+            debug.debug("Unable to save compiled profile to {0}: {1}".format(filename, e))
+
 def LinuxProfileFactory(profpkg):
     """ Takes in a zip file, spits out a LinuxProfile class
 
@@ -108,29 +175,43 @@ def LinuxProfileFactory(profpkg):
 
         To generate a suitable dwarf file:
         dwarfdump -di vmlinux > output.dwarf
+
+        Only the zip's directory and the first line of the system
+        map are read here. The rest is parsed (or loaded from the
+        compiled profile cache) when the profile is first used.
     """
 
-    dwarfdata = None
-    sysmapdata = None
+    dwarf_name = None
+    sysmap_name = None
 
     memmodel, arch = "32bit", "x86"
     profilename = os.path.splitext(os.path.basename(profpkg.filename))[0]
 
     for f in profpkg.filelist:
         if f.filename.lower().endswith('.dwarf'):
-            dwarfdata = profpkg.read(f.filename)
+            dwarf_name = f.filename
         elif 'system.map' in f.filename.lower():
-            sysmapdata = profpkg.read(f.filename)
-            (address, _a, _b) = sysmapdata.splitlines()[0].strip().split()
+            sysmap_name = f.filename
+            with profpkg.open(f.filename) as fd:
+                (address, _a, _b) = fd.readline().decode("utf-8", "replace").strip().split()
             memmodel = str(len(address) * 4) + "bit"
 
     if memmodel == "64bit":
         arch = "x64"
 
-    if not sysmapdata or not dwarfdata:
+    if not sysmap_name or not dwarf_name:
         # Might be worth throwing an exception here?
         return None
 
+    key = hashlib.sha1()
+    key.update("{0} {1}".format(COMPILED_VERSION, sys.version_info[:2]).encode("utf8"))
+    for name in (dwarf_name, sysmap_name):
+        info = profpkg.getinfo(name)
+        key.update("{0} {1} {2}".format(name, info.file_size, info.CRC).encode("utf8"))
+
+    compiled = CompiledProfile(os.path.abspath(profpkg.filename), profilename,
+                               dwarf_name, sysmap_name, key.hexdigest())
+
     class AbstractLinuxProfile(obj.Profile):
         __doc__ = "A Profile for Linux " + profilename + " " + arch
         _md_os = "linux"
@@ -142,18 +223,22 @@ def LinuxProfileFactory(profpkg):
         def __init__(self, *args, **kwargs):
             # change the name to catch any code referencing the old hash table
             self.sys_map = {}
+            self.sym_index = {}
             obj.Profile.__init__(self, *args, **kwargs)
 
         def clear(self):
             """Clear out the system map, and everything else"""
             self.sys_map = {}
+            self.sym_index = {}
             obj.Profile.clear(self)
 
         def reset(self):
             """Reset the vtypes, sysmap and apply modifications, then compile"""
             self.clear()
+            self.parsed = compiled.load()
             self.load_vtypes()
             self.load_sysmap()
+            self.parsed = None
             self.load_modifications()
             self.compile()
 
@@ -189,17 +274,40 @@ def LinuxProfileFactory(profpkg):
             ntvar = self.metadata.get('memory_model', '32bit')
             self.native_types = copy.deepcopy(self.native_mapping.get(ntvar))
 
-            vtypesvar = dwarf.DWARFParser(dwarfdata).finalize()
+            vtypesvar = self.parsed[0]
             self._merge_anonymous_members(vtypesvar)
             self.vtypes.update(vtypesvar)
-            debug.debug("{2}: Found dwarf file {0} with {1} symbols".format(f.filename, len(list(vtypesvar.keys())), profilename))
 
         def load_sysmap(self):
             """Loads up the system map data"""
-            _memmodel, sysmapvar = parse_system_map(sysmapdata, "kernel")
-            debug.debug("{2}: Found system file {0} with {1} symbols".format(f.filename, len(list(sysmapvar.keys())), profilename))
+            self.sys_map.update(self.parsed[1])
+            self.sym_index = {}
+
+        def get_symbol_index(self, module = "kernel"):
+            """ Returns the symbols of a module sorted by address, as a
+            tuple of (addresses, names, address set). It is built on first
+            use, so that lookups by address are binary searches. """
+
+            try:
+                return self.sym_index[module]
+            except KeyError:
+                pass
 
-            self.sys_map.update(sysmapvar)
+            symbols = []
+            for (name, addrs) in list(self.sys_map.get(module, {}).items()):
+                for (addr, _addr_type) in addrs:
+                    symbols.append((addr, name))
+
+            # the sort is stable, so symbols sharing an address stay in
+            # the order of the system map
+            symbols.sort(key = lambda sym: sym[0])
+
+            index = ([addr for (addr, _name) in symbols],
+                     [name for (_addr, name) in symbols],
+                     dict.fromkeys((addr for (addr, _name) in symbols), 1))
+
+            self.sym_index[module] = index
+            return index
 
         def get_all_symbols(self, module = "kernel"):
             """ Gets all the symbol tuples for the given module """
@@ -224,31 +332,39 @@ def LinuxProfileFactory(profpkg):
 
             # returns a hash table for quick looks
             # the main use of this function is to see if an address is known
-            ret = {}
+            if module not in self.sys_map:
+                debug.info("All symbols requested for non-existent module %s" % module)
 
-            symbols = self.get_all_symbols(module)
+            return self.get_symbol_index(module)[2]
 
-            for sym in symbols:
+        def get_symbol_by_address(self, module, sym_address):
+            """ Returns the name of the symbol at sym_address, or "" """
 
-                for (addr, addrtype) in sym:
-                    ret[addr] = 1
+            if module not in self.sys_map:
+                raise KeyError(module)
 
-            return ret
+            (addrs, names, _known) = self.get_symbol_index(module)
 
-        def get_symbol_by_address(self, module, sym_address):
-            ret = ""
-            symtable = self.sys_map
+            # the last of the symbols at this address, as the old linear search found
+            i = bisect.bisect_right(addrs, sym_address) - 1
 
-            mod = symtable[module]
+            if i >= 0 and addrs[i] == sym_address:
+                return names[i]
 
-            for (name, addrs) in list(mod.items()):
+            return ""
 
-                for (addr, addr_type) in addrs:
-                    if sym_address == addr:
-                        ret = name
-                        break
+        def get_containing_symbol(self, sym_address, module = "kernel"):
+            """ Returns (name, address) of the symbol at or before sym_address,
+            i.e. the function or variable which probably contains it, or None """
 
-            return ret
+            (addrs, names, _known) = self.get_symbol_index(module)
+
+            i = bisect.bisect_right(addrs, sym_address) - 1
+
+            if i < 0:
+                return None
+
+            return (names[i], addrs[i])
 
         def get_all_symbol_names(self, module = "kernel"):
             symtable = self.sys_map
@@ -272,12 +388,12 @@ def LinuxProfileFactory(profpkg):
             high_addr = 0xffffffffffffffff
             table_addr = self.get_symbol(sym_name, module = module)
 
-            addrs = self.get_all_addresses(module = module)
+            (addrs, _names, _known) = self.get_symbol_index(module)
 
-            for addr in list(addrs.keys()):
+            i = bisect.bisect_right(addrs, table_addr)
 
-                if table_addr < addr < high_addr:
-                    high_addr = addr
+            if i < len(addrs):
+                high_addr = addrs[i]
 
             return high_addr
 
@@ -360,7 +476,8 @@ for path in set(volatility.plugins.__path__):
     for path, _, files in os.walk(path):
         for fn in files:
             if zipfile.is_zipfile(os.path.join(path, fn)):
-                new_classes.append(LinuxProfileFactory(zipfile.ZipFile(os.path.join(path, fn))))
+                with zipfile.ZipFile(os.path.join(path, fn)) as profpkg:
+                    new_classes.append(LinuxProfileFactory(profpkg))
 
 ################################
 
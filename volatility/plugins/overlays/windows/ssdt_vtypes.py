@@ -1,4 +1,5 @@
-import sys
+import importlib
+import volatility.registry as registry
 import volatility.debug as debug
 import volatility.obj as obj
 
@@ -52,8 +53,14 @@ class WinSyscallsAttribute(obj.ProfileModification):
 
 class AbstractSyscalls(obj.ProfileModification):
     syscall_module = 'No default'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # The syscalls are only imported once a matching profile is used
+        registry.load_on_demand(cls.syscall_module)
+
     def modification(self, profile):
-        module = sys.modules.get(self.syscall_module, None)
+        module = importlib.import_module(self.syscall_module)
         profile.additional['syscalls'] = module.syscalls
 
 class WinXPSyscalls(AbstractSyscalls):
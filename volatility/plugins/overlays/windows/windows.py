@@ -587,9 +587,10 @@ class _MMVAD(obj.CType):
         ## specialist methods to the _MMVAD class.
 
         ## We must not polute Object's constructor by providing the
-        ## members or struct_size we were instantiated with
+        ## members, struct_size or layout we were instantiated with
         args.pop('struct_size', None)
         args.pop('members', None)
+        args.pop('layout', None)
 
         # Start off with an _MMVAD_LONG
         result = obj.Object('_MMVAD_LONG', offset = offset, vm = vm, parent = parent, **args)
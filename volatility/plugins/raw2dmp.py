@@ -18,6 +18,7 @@
 #
 
 import os
+import itertools
 import volatility.obj as obj
 import volatility.utils as utils
 import volatility.addrspace as addrspace
@@ -26,6 +27,8 @@ import volatility.plugins.imagecopy as imagecopy
 class Raw2dmp(imagecopy.ImageCopy):
     """Converts a physical memory sample to a windbg crash dump"""
 
+    compressible = False
+
     def calculate(self):
 
         blocksize = self._config.BLOCKSIZE
@@ -41,7 +44,7 @@ class Raw2dmp(imagecopy.ImageCopy):
             header_format = '_DMP_HEADER'
 
         headerlen = pspace.profile.get_obj_size(header_format)
-        headerspace = addrspace.BufferAddressSpace(self._config, 0, "PAGE" * (headerlen / 4))
+        headerspace = addrspace.BufferAddressSpace(self._config, 0, b"PAGE" * (headerlen // 4))
         header = obj.Object(header_format, offset = 0, vm = headerspace)
 
         kuser = obj.Object("_KUSER_SHARED_DATA",
@@ -102,7 +105,7 @@ class Raw2dmp(imagecopy.ImageCopy):
 
         # Set the sample run information
         path = self._config.LOCATION[7:]
-        num_pages = os.path.getsize(path) / 0x1000
+        num_pages = os.path.getsize(path) // 0x1000
         header.PhysicalMemoryBlockBuffer.NumberOfRuns = 0x00000001
         header.PhysicalMemoryBlockBuffer.NumberOfPages = num_pages
         header.PhysicalMemoryBlockBuffer.Run[0].BasePage = 0x0000000000000000
@@ -112,16 +115,14 @@ class Raw2dmp(imagecopy.ImageCopy):
         # Zero out the remaining non-essential fields
         ContextRecordOffset = headerspace.profile.get_obj_offset(header_format, "ContextRecord")
         ExceptionOffset = headerspace.profile.get_obj_offset(header_format, "Exception")
-        headerspace.write(ContextRecordOffset, "\x00" * (ExceptionOffset - ContextRecordOffset))
+        headerspace.write(ContextRecordOffset, b"\x00" * (ExceptionOffset - ContextRecordOffset))
 
         # Set the "converted" comment
         CommentOffset = headerspace.profile.get_obj_offset(header_format, "Comment")
-        headerspace.write(CommentOffset, "File was converted with Volatility" + "\x00")
+        headerspace.write(CommentOffset, b"File was converted with Volatility" + b"\x00")
 
-        # Yield the header
-        yield 0, headerspace.read(0, headerlen)
+        # Write the header, followed by the main body
+        jobs = itertools.chain([imagecopy.data_job(0, headerspace.read(0, headerlen))],
+                               self.range_jobs(pspace, blocksize, headerlen))
 
-        # Write the main body
-        for s, l in pspace.get_available_addresses():
-            for i in range(s, s + l, blocksize):
-                yield i + headerlen, pspace.read(i, min(blocksize, s + l - i))
+        return self.pipeline(pspace, jobs)
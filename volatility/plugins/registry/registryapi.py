@@ -28,8 +28,41 @@ import volatility.win32.hive as hivemod
 import volatility.win32.rawreg as rawreg
 import volatility.win32.hashdump as hashdump
 import volatility.utils as utils
+import volatility.obj as obj
+import volatility.cache as cache
+import volatility.conf as conf
 import volatility.plugins.registry.hivelist as hl
 from heapq import nlargest
+config = conf.ConfObject()
+
+config.add_option("REGISTRY-INDEX", default = False, action = "store_true",
+                  cache_invalidator = False,
+                  help = "Index whole hives for registry key lookups "
+                         "(kept in the cache with --cache)")
+
+class HiveIndex(object):
+    """Every key of a hive, from a single walk.
+
+    entries holds [LastWriteTime, full name, path below the root, 
+    key offset] for each key, in the order reg_get_all_keys visits them.
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        self.paths = {}
+        for i, (_time, _name, path, _offset) in enumerate(entries):
+            ## Like open_key, the first of duplicate names wins
+            self.paths.setdefault(path.upper(), i)
+        ## Most recently written first
+        self.recent = sorted(range(len(entries)),
+                             key = lambda i: (entries[i][0], entries[i][1]),
+                             reverse = True)
+
+    def open_key(self, address_space, key):
+        """Returns the key at the path below the root, or None"""
+        i = self.paths.get(key.upper())
+        if i is None:
+            return obj.NoneObject("Couldn't find key {0}".format(key))
+        return obj.Object("_CM_KEY_NODE", self.entries[i][3], address_space)
 
 
 class RegistryApi(object):
@@ -40,6 +73,8 @@ class RegistryApi(object):
         self.addr_space = utils.load_as(self._config)
         self.all_offsets = {}
         self.current_offsets = {}
+        ## HiveIndexes built so far, by hive offset
+        self.indexes = {}
         self.populate_offsets()
 
     def print_offsets(self):
@@ -130,6 +165,12 @@ class RegistryApi(object):
             for offset in self.current_offsets:
                 if given_root == None:
                     h = hivemod.HiveAddressSpace(self.addr_space, self._config, offset)
+                    index = self.get_index(offset, self._config.REGISTRY_INDEX)
+                    if index:
+                        k = index.open_key(h, key)
+                        if k:
+                            return k
+                        continue
                     root = rawreg.get_root(h)
                 else:
                     root = given_root
@@ -152,6 +193,12 @@ class RegistryApi(object):
                 name = self.current_offsets[offset]
                 if given_root == None:
                     h = hivemod.HiveAddressSpace(self.addr_space, self._config, offset)
+                    index = self.get_index(offset, self._config.REGISTRY_INDEX)
+                    if index:
+                        k = index.open_key(h, key)
+                        if k:
+                            yield k, name
+                        continue
                     root = rawreg.get_root(h)
                 else:
                     root = given_root
@@ -215,66 +262,90 @@ class RegistryApi(object):
                                 return dat
         return None
 
+    @cache.CacheDecorator(lambda self, offset: "registry/index/offset={0}".format(offset))
+    def walk_hive(self, offset):
+        '''
+        Walks every key of the hive at offset, returning the entries of a HiveIndex
+        '''
+        h = hivemod.HiveAddressSpace(self.addr_space, self._config, offset)
+        root = rawreg.get_root(h)
+        if not root:
+            return []
+
+        root_name = str(root.Name)
+        entries = [["{0}".format(root.LastWriteTime), root_name, "", root.obj_offset]]
+        keys = [[s, root_name + "\\" + str(s.Name)] for s in rawreg.subkeys(root)]
+
+        # Get subkeys, breadth first
+        for k, name in keys:
+            entries.append(["{0}".format(k.LastWriteTime), name, name[len(root_name) + 1:], k.obj_offset])
+            for s in rawreg.subkeys(k):
+                if name and s.Name:
+                    keys.append([s, name + '\\' + str(s.Name)])
+
+        return entries
+
+    def get_index(self, offset, build = True):
+        '''
+        Returns the HiveIndex of the hive at offset. If it has not been
+        built yet (or loaded from the cache) it is only built if build is set.
+        '''
+        if offset not in self.indexes:
+            if not build:
+                return None
+            self.indexes[offset] = HiveIndex(self.walk_hive(offset))
+        return self.indexes[offset]
+
     def reg_get_all_keys(self, hive_name, user = None, start = None, end = None, reg = False):
         '''
         This function enumerates all keys in specified hives and 
         collects lastwrite times.
         '''
-        keys = []
         if self.all_offsets == {}:
             self.populate_offsets()
         if self.current_offsets == {}:
             self.set_current(hive_name, user)
 
-        # Collect the root keys 
         for offset in self.current_offsets:
             reg_name = self.current_offsets[offset]
-            h = hivemod.HiveAddressSpace(self.addr_space, self._config, offset)
-            root = rawreg.get_root(h)
-            if not root:
-                pass
-            else:
-                time = "{0}".format(root.LastWriteTime)
-                if reg:
-                    yield (time, reg_name, root.Name)
-                else:
-                    yield (time, root.Name)
-                for s in rawreg.subkeys(root):
-                    if reg:
-                        keys.append([s, reg_name, root.Name + "\\" + s.Name])
-                    else:
-                        keys.append([s, root.Name + "\\" + s.Name])
-
-        # Get subkeys
-        for k, reg_name, name in keys:
-            time = "{0}".format(k.LastWriteTime)
-            if start and end and time >= start and time <= end:
-                if reg:
-                    yield (time, reg_name, name)
-                else:
-                    yield (time, name)
-            elif start == None and end == None:
+            index = self.get_index(offset)
+            for i, (time, name, _path, _offset) in enumerate(index.entries):
+                # The root key is always included
+                if i and (start or end) and not (start and end and time >= start and time <= end):
+                    continue
                 if reg:
                     yield (time, reg_name, name)
                 else:
                     yield (time, name)
 
-            for s in rawreg.subkeys(k):
-                if name and s.Name:
-                    item = name + '\\' + s.Name
-                    if reg:
-                        keys.append([s, reg_name, item])
-                    else:
-                        keys.append([s, item])
-
-
     def reg_get_last_modified(self, hive_name, count = 1, user = None, start = None, end = None, reg = False):
         '''
-        Wrapper function using reg_get_all_keys. These functions can take a WHILE since all 
-        subkeys have to be collected before you can compare lastwrite times.
+        Returns the count most recently modified keys, from the indexes
+        of the hives (which are built on first use).
         '''
-        data = nlargest(count, self.reg_get_all_keys(hive_name, user, start, end, reg))
+        if self.all_offsets == {}:
+            self.populate_offsets()
+        if self.current_offsets == {}:
+            self.set_current(hive_name, user)
+
+        candidates = []
+        for offset in self.current_offsets:
+            reg_name = self.current_offsets[offset]
+            index = self.get_index(offset)
+            found = 0
+            for i in index.recent:
+                if found >= count:
+                    break
+                time, name, _path, _offset = index.entries[i]
+                if i and (start or end) and not (start and end and time >= start and time <= end):
+                    continue
+                if reg:
+                    candidates.append((time, reg_name, name))
+                else:
+                    candidates.append((time, name))
+                found += 1
+
+        data = nlargest(count, candidates)
         for t, _, name in data:
             yield (t, name)
 
-
@@ -31,6 +31,7 @@ import volatility.win32.modules as modules
 import volatility.plugins.common as common
 import volatility.utils as utils
 import volatility.debug as debug #pylint: disable-msg=W0611
+import volatility.disasm as disasm
 from volatility.cache import CacheDecorator
 
 #pylint: disable-msg=C0111
@@ -66,17 +67,11 @@ def find_tables(start_addr, vm):
     """
     service_tables = []
 
-    try:
-        import distorm3
-        use_distorm = True
-    except ImportError:
-        use_distorm = False
-
     function_size = 120
 
-    if use_distorm:
+    if disasm.has_distorm3:
         data = vm.zread(start_addr, function_size)
-        for op in distorm3.Decompose(start_addr, data, distorm3.Decode64Bits):
+        for op in disasm.decompose(start_addr, data, '64bit'):
             # Stop decomposing if we reach the function end 
             if op.flowControl == 'FC_RET':
                 break
@@ -126,9 +121,8 @@ class SSDT(common.AbstractWindowsCommand):
     def calculate(self):
         addr_space = utils.load_as(self._config)
 
-        ## Get a sorted list of module addresses
-        mods = dict((mod.DllBase.v(), mod) for mod in modules.lsmod(addr_space))
-        mod_addrs = sorted(mods.keys())
+        ## Get an index of the modules by address
+        mods = modules.module_index(addr_space)
 
         ssdts = set()
 
@@ -172,7 +166,7 @@ class SSDT(common.AbstractWindowsCommand):
                 debug.debug("[SSDT not resident at 0x{0:08X}]\n".format(table))
 
         for idx, table, n, vm in sorted(tables_with_vm, key = itemgetter(0)):
-            yield idx, table, n, vm, mods, mod_addrs
+            yield idx, table, n, vm, mods
 
     def render_text(self, outfd, data):
 
@@ -181,7 +175,7 @@ class SSDT(common.AbstractWindowsCommand):
         bits32 = addr_space.profile.metadata.get('memory_model', '32bit') == '32bit'
 
         # Print out the entries for each table
-        for idx, table, n, vm, mods, mod_addrs in data:
+        for idx, table, n, vm, mods in data:
             outfd.write("SSDT[{0}] at {1:x} with {2} entries\n".format(idx, table, n))
             for i in range(n):
                 if bits32:
@@ -198,7 +192,7 @@ class SSDT(common.AbstractWindowsCommand):
                 except IndexError:
                     syscall_name = "UNKNOWN"
 
-                syscall_mod = tasks.find_module(mods, mod_addrs, syscall_addr)
+                syscall_mod = mods.find(syscall_addr)
                 if syscall_mod:
                     syscall_modname = syscall_mod.BaseDllName
                 else:
@@ -47,6 +47,20 @@ import os, zipfile
 import volatility.debug as debug
 import volatility.plugins as plugins
 
+## Modules which are only imported when something asks for them
+## (e.g. the vtypes for a profile, once that profile is selected)
+## rather than by the PluginImporter.
+lazy_modules = set()
+
+def load_on_demand(name):
+    """Marks the named module as one the PluginImporter should not import.
+
+       Only generated data modules (named *_vtypes or *_syscalls) are
+       eligible, and whoever marks them must import them when needed.
+    """
+    if name:
+        lazy_modules.add(name)
+
 class PluginImporter(object):
     """This class searches through a comma-separated list of plugins and
        imports all classes found, based on their path and a fixed prefix.
@@ -111,15 +125,28 @@ class PluginImporter(object):
                         yield fn[len(prefix):]
 
     def run_imports(self):
-        """Imports all the already found modules"""
-        for i in list(self.modnames.keys()):
-            if self.modnames[i] is not None:
-                try:
-                    __import__(i)
-                except Exception as e:
-                    print("*** Failed to import " + i + " (" + str(e.__class__.__name__) + ": " + str(e) + ")")
-                    # This is too early to have had the debug filter lowered to include debugging messages
-                    debug.post_mortem(2)
+        """Imports all the already found modules
+
+           Data modules are imported last, since the modules which use
+           them may have asked for them to be loaded on demand instead.
+        """
+        data_modules = [ i for i in self.modnames if i.endswith(("_vtypes", "_syscalls")) ]
+        for i in [ i for i in self.modnames if i not in data_modules ]:
+            self.run_import(i)
+
+        for i in data_modules:
+            if i not in lazy_modules:
+                self.run_import(i)
+
+    def run_import(self, i):
+        """Imports a single found module"""
+        if self.modnames[i] is not None:
+            try:
+                __import__(i)
+            except Exception as e:
+                print("*** Failed to import " + i + " (" + str(e.__class__.__name__) + ": " + str(e) + ")")
+                # This is too early to have had the debug filter lowered to include debugging messages
+                debug.post_mortem(2)
 
 def _get_subclasses(cls):
     """ Run through subclasses of a particular class
@@ -141,7 +168,7 @@ def get_plugin_classes(cls, showall = False, lower = False):
     for plugin in set(_get_subclasses(cls)):
         if showall or not (plugin.__name__.startswith("Abstract") or plugin == cls):
             # FIXME: This is due to not having done things correctly at the start
-            if not showall and plugin.__name__ in ['BufferAddressSpace', 'HiveFileAddressSpace', 'HiveAddressSpace']:
+            if not showall and plugin.__name__ in ['BufferAddressSpace', 'CachedAddressSpace', 'HiveFileAddressSpace', 'HiveAddressSpace']:
                 continue
             name = plugin.__name__.split('.')[-1]
             if lower:
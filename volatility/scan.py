@@ -32,11 +32,60 @@
 @contact:      awalters@volatilesystems.com
 @organization: Volatile Systems.
 """
+import re
+import pickle
+import multiprocessing
 import volatility.debug as debug
 import volatility.registry as registry
 import volatility.addrspace as addrspace
 import volatility.constants as constants
+import volatility.sparse as sparse
 import volatility.conf as conf
+config = conf.ConfObject()
+
+class NeedleFinder(object):
+    """ Finds every occurrence of a set of fixed strings in a buffer.
+
+    All the needles are compiled into a single regex alternation once,
+    so a whole scan block is searched in one pass in C rather than
+    testing every offset from python. Overlapping matches are reported
+    because the search resumes one byte after each hit.
+    """
+    def __init__(self, needles):
+        ## Longest needles first so the alternation prefers them
+        self.needles = sorted(set(needles), key = len, reverse = True)
+        self.regex = re.compile(b"|".join(re.escape(n) for n in self.needles))
+
+    def finditer(self, data, start = 0, end = None):
+        """ Yields the offset of every needle found in data[start:end].
+
+        data can be bytes or a memoryview (which only the regex engine
+        can search).
+        """
+        if end is None:
+            end = len(data)
+
+        if len(self.needles) == 1 and hasattr(data, "find"):
+            ## A plain find is faster than the regex engine for one needle
+            needle = self.needles[0]
+            end = end + len(needle) - 1
+            while True:
+                hit = data.find(needle, start, end)
+                if hit < 0:
+                    return
+                yield hit
+                start = hit + 1
+
+        while True:
+            match = self.regex.search(data, start)
+            if not match or match.start() >= end:
+                return
+            yield match.start()
+            start = match.start() + 1
+
+    def matches_at(self, data, offset):
+        """ Returns the needles which start at offset in data """
+        return [n for n in self.needles if data.startswith(n, offset)]
 
 ########### Following is the new implementation of the scanning
 ########### framework. The old framework was based on PyFlag's
@@ -52,7 +101,7 @@ class BaseScanner(object):
 
         self.error_count = 0
 
-    def check_addr(self, found):
+    def check_addr(self, found, constraints = None):
         """ This calls all our constraints on the offset found and
         returns the number of contraints that matched.
 
@@ -60,8 +109,11 @@ class BaseScanner(object):
         not be sufficient matches to fit the criteria. This allows for
         an early exit and a speed boost.
         """
+        if constraints is None:
+            constraints = self.constraints
+
         cnt = 0
-        for check in self.constraints:
+        for check in constraints:
             ## constraints can raise for an error
             try:
                 val = check.check(found)
@@ -78,21 +130,60 @@ class BaseScanner(object):
         return True
 
     overlap = 20
-    def scan(self, address_space, offset = 0, maxlen = None):
-        self.buffer.profile = address_space.profile
-        current_offset = offset
 
-        ## Build our constraints from the specified ScannerCheck
-        ## classes:
+    def build_constraints(self):
+        """ Instantiates our constraints from the specified ScannerCheck classes """
         self.constraints = []
         for class_name, args in self.checks:
             check = registry.get_plugin_classes(ScannerCheck)[class_name](self.buffer, **args)
             self.constraints.append(check)
 
+        return self.constraints
+
+    def needle_check(self):
+        """ Returns the first constraint which can only match where one
+        of its tags begins, or None if there is no such constraint.
+        """
+        for check in self.constraints:
+            if getattr(check, "tags", None):
+                return check
+        return None
+
+    def prepare(self, address_space):
+        """ Gets the scanner ready to run over address_space.
+
+        Returns a tuple of (tag_check, constraints, skippers) where
+        tag_check is the constraint whose tags are searched for
+        directly (or None), and constraints and skippers are the
+        remaining checks that need to be run on each candidate.
+        """
+        self.buffer.profile = address_space.profile
+
+        ## Build our constraints from the specified ScannerCheck
+        ## classes:
+        self.build_constraints()
+
+        ## If one of the checks can only match at a known set of
+        ## strings (e.g. a pool tag), we find all of those in a single
+        ## pass over each block and only run the remaining constraints
+        ## on the hits.
+        tag_check = self.needle_check()
+        constraints = [ c for c in self.constraints if c is not tag_check ]
+
         ## Which checks also have skippers?
-        skippers = [ c for c in self.constraints if hasattr(c, "skip") ]
+        skippers = [ c for c in constraints if hasattr(c, "skip") ]
+
+        return tag_check, constraints, skippers
 
-        for (range_start, range_size) in sorted(address_space.get_available_addresses()):
+    def block_ranges(self, address_space, offset = 0, maxlen = None):
+        """ Yields (block_offset, length) for each block to scan.
+
+        Each block is SCAN_BLOCKSIZE long plus an overlap into the next
+        one, so checks near the end of a block can read past it.
+        """
+        current_offset = offset
+
+        for (range_start, range_size) in sorted(sparse.available_addresses(address_space)):
             # Jump to the next available point to scan from
             # self.base_offset jumps up to be at least range_start
             current_offset = max(range_start, current_offset)
@@ -108,38 +199,189 @@ class BaseScanner(object):
                 # Figure out how much data to read
                 l = min(constants.SCAN_BLOCKSIZE + self.overlap, range_end - current_offset)
 
+                yield current_offset, l
+
+                current_offset += min(constants.SCAN_BLOCKSIZE, l)
+
+    def blocks(self, address_space, offset = 0, maxlen = None, ranges = None, views = False):
+        """ Yields (block_offset, length, data) for each block to scan.
+
+        With views, the blocks of an image which is mapped into memory
+        are memoryviews of the mapping rather than copies of it.
+        """
+        if ranges is None:
+            ranges = self.block_ranges(address_space, offset, maxlen)
+
+        view = None
+        if views and address_space.base is None and getattr(address_space, "mapping", None) is not None:
+            view = address_space.view
+
+        for current_offset, l in ranges:
+            if view:
+                data = view(current_offset, l)
+            else:
                 # Populate the buffer with data
                 # We use zread to scan what we can because there are often invalid
                 # pages in the DTB
                 data = address_space.zread(current_offset, l)
-                self.buffer.assign_buffer(data, current_offset)
 
-                ## Run checks throughout this block of data
-                i = 0
-                while i < l:
-                    if self.check_addr(i + current_offset):
-                        ## yield the offset to the start of the memory
-                        ## (after the pool tag)
-                        yield i + current_offset
-
-                    ## Where should we go next? By default we go 1 byte
-                    ## ahead, but if some of the checkers have skippers,
-                    ## we may actually go much farther. Checkers with
-                    ## skippers basically tell us that there is no way
-                    ## they can match anything before the skipped result,
-                    ## so there is no point in trying them on all the data
-                    ## in between. This optimization is useful to really
-                    ## speed things up. FIXME - currently skippers assume
-                    ## that the check must match, therefore we can skip
-                    ## the unmatchable region, but its possible that a
-                    ## scanner needs to match only some checkers.
-                    skip = 1
-                    for s in skippers:
-                        skip = max(skip, s.skip(data, i))
-
-                    i += skip
+            yield current_offset, l, data
 
-                current_offset += min(constants.SCAN_BLOCKSIZE, l)
+    def scan(self, address_space, offset = 0, maxlen = None):
+        ranges = self.block_ranges(address_space, offset, maxlen)
+
+        workers = scan_workers()
+        if workers > 1:
+            hits = ParallelScan(self, workers).scan(address_space, ranges)
+        else:
+            hits = self.scan_ranges(address_space, ranges)
+
+        for hit in hits:
+            yield hit
+
+    def scan_ranges(self, address_space, ranges):
+        """ Scans the (block_offset, length) blocks in ranges """
+        tag_check, constraints, skippers = self.prepare(address_space)
+
+        if tag_check:
+            finder = NeedleFinder(tag_check.tags)
+            ## The tags are searched for in the mapped image itself, only
+            ## the blocks with hits are copied out for the constraints
+            for current_offset, l, data in self.blocks(address_space, ranges = ranges, views = True):
+                hits = list(finder.finditer(data, 0, l))
+                if not hits:
+                    continue
+                data = bytes(data)
+                self.buffer.assign_buffer(data, current_offset)
+                for i in self.scan_hits(hits, data, constraints, skippers):
+                    yield i + current_offset
+            return
+
+        for current_offset, l, data in self.blocks(address_space, ranges = ranges):
+            self.buffer.assign_buffer(data, current_offset)
+
+            ## Run checks throughout this block of data
+            i = 0
+            while i < l:
+                if self.check_addr(i + current_offset):
+                    ## yield the offset to the start of the memory
+                    ## (after the pool tag)
+                    yield i + current_offset
+
+                ## Where should we go next? By default we go 1 byte
+                ## ahead, but if some of the checkers have skippers,
+                ## we may actually go much farther. Checkers with
+                ## skippers basically tell us that there is no way
+                ## they can match anything before the skipped result,
+                ## so there is no point in trying them on all the data
+                ## in between. This optimization is useful to really
+                ## speed things up. FIXME - currently skippers assume
+                ## that the check must match, therefore we can skip
+                ## the unmatchable region, but its possible that a
+                ## scanner needs to match only some checkers.
+                skip = 1
+                for s in skippers:
+                    skip = max(skip, s.skip(data, i))
+
+                i += skip
+
+    def scan_hits(self, hits, data, constraints, skippers):
+        """ Runs the constraints only on the candidate offsets in hits.
+
+        The hits are offsets into data, which must already be assigned
+        to self.buffer. Matching offsets (relative to data) are yielded.
+        """
+        next_i = 0
+        for i in hits:
+            ## Any other skippers may still rule out some of the hits
+            if i < next_i:
+                continue
+
+            if self.check_addr(i + self.buffer.base_offset, constraints):
+                yield i
+
+            skip = 1
+            for s in skippers:
+                skip = max(skip, s.skip(data, i))
+            next_i = i + skip
+
+def scan_workers():
+    """ Returns the number of processes scanners should use """
+    try:
+        workers = int(config.SCAN_WORKERS or 1)
+    except (AttributeError, ValueError):
+        workers = 1
+    return max(workers, 1)
+
+## State inherited by forked scan workers. The scanner is shared as is
+## (its checks often contain lambdas which can not be pickled) while
+## each worker rebuilds its own address space stack so that it does
+## not share file handles with its siblings.
+_worker_scanner = None
+_worker_space = None
+
+def _init_scan_worker(pickled_space):
+    global _worker_space
+    _worker_space = pickle.loads(pickled_space)
+
+def _scan_chunk(ranges):
+    return list(_worker_scanner.scan_ranges(_worker_space, ranges))
+
+class ParallelScan(object):
+    """ Spreads the blocks of a scan across a pool of processes.
+
+    Consecutive blocks (including their usual overlap) are grouped into
+    chunks and sent to forked workers, each of which rebuilds the
+    address space from its pickled state and runs the scanner's
+    constraints over its chunk. The hits are handed back in chunk
+    order, so the results are exactly what a serial scan would give.
+    """
+    blocks_per_chunk = 4
+
+    def __init__(self, scanner, workers):
+        self.scanner = scanner
+        self.workers = workers
+
+    def chunks(self, ranges):
+        chunk = []
+        for block in ranges:
+            chunk.append(block)
+            if len(chunk) >= self.blocks_per_chunk:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def scan(self, address_space, ranges):
+        global _worker_scanner
+
+        try:
+            context = multiprocessing.get_context("fork")
+            pickled_space = pickle.dumps(address_space)
+        except Exception as e:
+            debug.warning("Unable to scan in parallel ({0}), falling back to a single process".format(e))
+            for hit in self.scanner.scan_ranges(address_space, ranges):
+                yield hit
+            return
+
+        ## The parent's own scanner still needs to be set up for callers
+        ## like object_offset that use its buffer
+        self.scanner.prepare(address_space)
+
+        ## Work out all the chunks now, so the pool's feeder thread does
+        ## not read from the address space while we are using it
+        chunks = list(self.chunks(ranges))
+
+        ## This must be set before the pool forks
+        _worker_scanner = self.scanner
+        pool = context.Pool(self.workers, _init_scan_worker, (pickled_space,))
+        try:
+            for hits in pool.imap(_scan_chunk, chunks):
+                for hit in hits:
+                    yield hit
+        finally:
+            pool.terminate()
+            _worker_scanner = None
 
 class DiscontigScanner(BaseScanner):
     def scan(self, address_space, offset = 0, maxlen = None):
@@ -164,6 +406,12 @@ class ScannerCheck(object):
     def check(self, _offset):
         return False
 
+    ## If the check can only ever match at offsets where one of a fixed
+    ## set of strings begins (e.g. a pool tag), list them here. The
+    ## scanner will then search each block for all of them in one pass
+    ## and only run the other checks on the hits.
+    tags = None
+
     ## If you want to speed up the scanning define this method - it
     ## will be used to skip the data which is obviously not going to
     ## match. You will need to return the number of bytes from offset
@@ -219,3 +467,69 @@ class PoolScanner(BaseScanner):
     def scan(self, address_space, offset = 0, maxlen = None):
         for i in BaseScanner.scan(self, address_space, offset, maxlen):
             yield self.object_offset(i, address_space)
+
+class MultiScanner(object):
+    """ Runs several PoolScanners over an address space in a single pass.
+
+    Every block of the address space is read once and searched for all
+    the scanners' tags together. Each hit is then only handed to the
+    scanners interested in that tag, which run their own constraints and
+    object_offset on it. This saves a full read of memory per scanner.
+
+    Example:
+
+        procs = PoolScanProcess()
+        threads = PoolScanThreadFast()
+        for scanner, offset in MultiScanner([procs, threads]).scan(space):
+            if scanner is procs:
+                ...
+    """
+    def __init__(self, scanners):
+        self.scanners = scanners
+
+    def scan(self, address_space, offset = 0, maxlen = None):
+        """ Yields (scanner, offset) tuples in address order """
+        if not self.scanners:
+            return
+
+        by_tag = {}
+        prepared = []
+        for scanner in self.scanners:
+            tag_check, constraints, skippers = scanner.prepare(address_space)
+            if not tag_check:
+                raise RuntimeError("{0} has no tag check and cannot be used in a MultiScanner".format(
+                                   scanner.__class__.__name__))
+            state = [scanner, constraints, skippers, 0]
+            prepared.append(state)
+            for tag in tag_check.tags:
+                by_tag.setdefault(tag, []).append(state)
+
+        finder = NeedleFinder(list(by_tag.keys()))
+
+        ## All our scanners read blocks the same way, so the first one
+        ## can drive the reads for all of them
+        for current_offset, l, data in self.scanners[0].blocks(address_space, offset, maxlen, views = True):
+            hits = list(finder.finditer(data, 0, l))
+            if not hits:
+                continue
+            data = bytes(data)
+            for state in prepared:
+                state[0].buffer.assign_buffer(data, current_offset)
+                state[3] = 0
+
+            for i in hits:
+                for tag in finder.matches_at(data, i):
+                    for state in by_tag[tag]:
+                        scanner, constraints, skippers, next_i = state
+
+                        ## This scanner's other skippers rule this hit out
+                        if i < next_i:
+                            continue
+
+                        if scanner.check_addr(i + current_offset, constraints):
+                            yield scanner, scanner.object_offset(i + current_offset, address_space)
+
+                        skip = 1
+                        for s in skippers:
+                            skip = max(skip, s.skip(data, i))
+                        state[3] = i + skip
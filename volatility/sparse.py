@@ -0,0 +1,252 @@
+# Volatility
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+#
+
+""" Skips the all-zero pages of an image.
+
+Large parts of many images (particularly of virtual machines) are
+zero pages, which scanners and imagecopy read and search for nothing.
+With --skip-zero the runs of zero pages in physical memory are found
+once, with a full pass over the image, and kept in a sidecar next to
+the image (or in the cache directory), like the discovery results:
+
+    /tmp/foobar.img.zeromap
+
+available_addresses() then leaves the zero pages out of an address
+space's ranges. Virtual address spaces are handled by translating each
+of their pages.
+"""
+
+import os
+import json
+import zlib
+import array
+import bisect
+import struct
+import volatility.conf as conf
+import volatility.debug as debug
+import volatility.addrspace as addrspace
+import volatility.discovery as discovery
+config = conf.ConfObject()
+
+config.add_option("SKIP-ZERO", default = False, action = "store_true",
+                  cache_invalidator = False,
+                  help = "Skip all-zero pages when scanning or copying "
+                         "(the first run reads the whole image to find them)")
+
+MAGIC = b"VOLZERO\x00"
+## Bump this when the format of the sidecar changes
+VERSION = 1
+
+PAGE_SIZE = 0x1000
+## How much is read at a time while looking for zero pages
+BLOCK_SIZE = 0x100000
+
+ZERO_PAGE = b"\x00" * PAGE_SIZE
+ZERO_BLOCK = b"\x00" * BLOCK_SIZE
+
+class ZeroMap(object):
+    """ The sorted, disjoint runs of zero pages of a physical address space """
+
+    def __init__(self, starts = None, ends = None):
+        self.starts = starts or []
+        self.ends = ends or []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def zero_bytes(self):
+        return sum(self.ends) - sum(self.starts)
+
+    @classmethod
+    def build(cls, address_space):
+        """Finds the zero pages by reading all of address_space, unless
+        it records them already (as compressed images do)"""
+        if hasattr(address_space, "get_zero_addresses"):
+            runs = list(address_space.get_zero_addresses())
+            return cls([ start for start, _length in runs ],
+                       [ start + length for start, length in runs ])
+
+        starts = []
+        ends = []
+
+        def add(start, end):
+            if ends and ends[-1] == start:
+                ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+
+        for range_start, range_size in address_space.get_available_addresses():
+            ## Only whole pages can be skipped
+            addr = range_start + (-range_start % PAGE_SIZE)
+            range_end = range_start + range_size
+            while addr + PAGE_SIZE <= range_end:
+                length = min(BLOCK_SIZE, range_end - addr)
+                length -= length % PAGE_SIZE
+                data = address_space.zread(addr, length)
+
+                if data == ZERO_BLOCK[:length]:
+                    add(addr, addr + length)
+                else:
+                    for offset in range(0, length, PAGE_SIZE):
+                        if data[offset:offset + PAGE_SIZE] == ZERO_PAGE:
+                            add(addr + offset, addr + offset + PAGE_SIZE)
+
+                addr += length
+
+        return cls(starts, ends)
+
+    def is_zero(self, addr):
+        i = bisect.bisect_right(self.starts, addr) - 1
+        return i >= 0 and addr < self.ends[i]
+
+    def subtract(self, ranges):
+        """Yields the parts of the (start, length) ranges which are not zero"""
+        for start, length in ranges:
+            end = start + length
+            i = bisect.bisect_right(self.ends, start)
+            while i < len(self.starts) and self.starts[i] < end:
+                if self.starts[i] > start:
+                    yield (start, self.starts[i] - start)
+                start = max(start, self.ends[i])
+                i += 1
+            if start < end:
+                yield (start, end - start)
+
+    def subtract_virtual(self, address_space, ranges):
+        """Yields the parts of the virtual (start, length) ranges which
+        are not backed by zero pages"""
+        for start, length in ranges:
+            end = start + length
+            run = None
+            addr = start
+            while addr < end:
+                next_addr = min(end, addr - addr % PAGE_SIZE + PAGE_SIZE)
+                paddr = address_space.vtop(addr)
+                if paddr is not None and self.is_zero(paddr):
+                    if run is not None:
+                        yield (run, addr - run)
+                        run = None
+                elif run is None:
+                    run = addr
+                addr = next_addr
+
+            if run is not None:
+                yield (run, end - run)
+
+    def dumps(self, meta):
+        runs = array.array('Q')
+        for start, end in zip(self.starts, self.ends):
+            runs.append(start)
+            runs.append(end)
+        header = json.dumps(meta, sort_keys = True).encode("utf8")
+        return MAGIC + struct.pack("<I", len(header)) + header + zlib.compress(runs.tobytes())
+
+    @classmethod
+    def loads(cls, data, meta):
+        """Returns the ZeroMap in data, if it was recorded with meta"""
+        if data[:len(MAGIC)] != MAGIC:
+            return None
+        pos = len(MAGIC)
+        (header_length,) = struct.unpack("<I", data[pos:pos + 4])
+        pos += 4
+        if json.loads(data[pos:pos + header_length].decode("utf8")) != meta:
+            return None
+
+        runs = array.array('Q')
+        runs.frombytes(zlib.decompress(data[pos + header_length:]))
+        return cls(list(runs[0::2]), list(runs[1::2]))
+
+def physical_space(address_space):
+    """Returns the physical layer beneath address_space"""
+    while hasattr(address_space, "vtop") or isinstance(address_space, addrspace.CachedAddressSpace):
+        address_space = address_space.base
+    return address_space
+
+## Maps already found by this process, keyed by image path and physical stack
+_maps = {}
+
+def get_map(address_space):
+    """Returns the ZeroMap of address_space's physical memory, or None if disabled"""
+    space_config = address_space.get_config()
+    if not space_config.SKIP_ZERO:
+        return None
+
+    path = discovery.image_path(space_config)
+    if path is None:
+        return None
+
+    physical = physical_space(address_space)
+    stack = discovery.stack_names(physical)
+    key = (path, tuple(stack))
+    try:
+        return _maps[key]
+    except KeyError:
+        pass
+
+    meta = dict(version = VERSION, stack = stack,
+                fingerprint = discovery.fingerprint(path))
+    filenames = discovery.sidecar_filenames(path, ".zeromap")
+
+    zero_map = None
+    for filename in filenames:
+        try:
+            with open(filename, "rb") as fd:
+                zero_map = ZeroMap.loads(fd.read(), meta)
+        except (IOError, OSError, ValueError, struct.error, zlib.error):
+            zero_map = None
+        if zero_map is not None:
+            debug.debug("Loaded zero page map from {0}".format(filename))
+            break
+
+    if zero_map is None:
+        if not hasattr(physical, "get_zero_addresses"):
+            debug.info("Looking for zero pages, this reads the whole image once")
+        zero_map = ZeroMap.build(physical)
+        save(filenames, zero_map.dumps(meta))
+
+    debug.debug("{0} runs of zero pages, {1:#x} bytes".format(len(zero_map), zero_map.zero_bytes()))
+    _maps[key] = zero_map
+    return zero_map
+
+def save(filenames, data):
+    for filename in filenames:
+        try:
+            directory = os.path.dirname(filename)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            ## Write then rename so concurrent runs never see half a file
+            tmp = "{0}.{1}".format(filename, os.getpid())
+            with open(tmp, "wb") as fd:
+                fd.write(data)
+            os.replace(tmp, filename)
+            return
+        except (IOError, OSError) as e:
+            debug.debug("Unable to save zero page map to {0}: {1}".format(filename, e))
+
+def available_addresses(address_space):
+    """Returns address_space's available (start, length) ranges,
+    without the zero pages if --skip-zero is on"""
+    ranges = address_space.get_available_addresses()
+
+    zero_map = get_map(address_space)
+    if zero_map is None:
+        return ranges
+
+    if hasattr(address_space, "vtop"):
+        return zero_map.subtract_virtual(address_space, ranges)
+    return zero_map.subtract(ranges)
@@ -22,15 +22,51 @@ import volatility.exceptions as exceptions
 import volatility.registry as registry
 import volatility.addrspace as addrspace
 import volatility.debug as debug
+import volatility.discovery as discovery
 import socket
+import bisect
 import itertools
 import traceback
 
 #pylint: disable-msg=C0111
 
+def replay_as(config, names, astype = 'virtual', **kwargs):
+    """Instantiates a previously discovered stack of ASes (bottom first) without voting"""
+    classes = registry.get_plugin_classes(addrspace.BaseAddressSpace)
+    base_as = None
+    for name in names:
+        base_as = classes[name](base_as, config, astype = astype, **kwargs)
+    return base_as
+
+def cache_stack(config, base_as):
+    """Puts a page cache in front of every layer which translates
+    reads for the layer above it (i.e. has a base of its own)"""
+    if not config.PAGE_CACHE:
+        return base_as
+
+    space = base_as
+    while space.base is not None and space.base.base is not None:
+        if not isinstance(space.base, addrspace.CachedAddressSpace):
+            space.base = addrspace.CachedAddressSpace(space.base, config)
+        space = space.base.base
+    return base_as
+
 def load_as(config, astype = 'virtual', **kwargs):
     """Loads an address space by stacking valid ASes on top of each other (priority order first)"""
 
+    discovery.apply(config)
+
+    ## If we have seen this image before, try the same stack again
+    stack_key = "stack_" + astype
+    names = discovery.recall(config, stack_key)
+    if names and not kwargs:
+        try:
+            base_as = replay_as(config, names, astype = astype)
+            debug.debug("Using recorded address spaces {0}".format(names))
+            return cache_stack(config, base_as)
+        except Exception as e:
+            debug.debug("Recorded address spaces failed ({0!r}), voting instead".format(e))
+
     base_as = None
     error = exceptions.AddrSpaceError()
 
@@ -65,7 +101,50 @@ def load_as(config, astype = 'virtual', **kwargs):
     if base_as is None:
         raise error
 
-    return base_as
+    if not kwargs:
+        discovery.remember(config, stack_key, discovery.stack_names(base_as))
+        if getattr(base_as, "paging_address_space", False):
+            discovery.remember(config, "dtb", base_as.dtb)
+
+    return cache_stack(config, base_as)
+
+class AddressIndex(object):
+    """ An immutable index of values by the address range they occupy.
+
+    Finding the range containing an address is a binary search, which
+    matters when resolving many pointers to their owning modules.
+    Where ranges overlap, the one starting last wins.
+    """
+
+    def __init__(self, ranges):
+        """@param ranges: (start, end, value) tuples, end exclusive"""
+        ranges = sorted(((int(start), int(end), value) for start, end, value in ranges),
+                        key = lambda r: (r[0], r[1]))
+        self.starts = [ r[0] for r in ranges ]
+        self.ends = [ r[1] for r in ranges ]
+        self.values = [ r[2] for r in ranges ]
+        ## The furthest any of the ranges up to each one reaches, so
+        ## that overlapping ranges need not be searched linearly
+        self.reach = list(itertools.accumulate(self.ends, max))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends, self.values)
+
+    def __contains__(self, address):
+        return self.find(address) is not None
+
+    def find(self, address, default = None):
+        """Returns the value of the range containing address"""
+        address = int(address)
+        i = bisect.bisect_right(self.starts, address) - 1
+        while i >= 0 and self.reach[i] > address:
+            if address < self.ends[i]:
+                return self.values[i]
+            i -= 1
+        return default
 
 def Hexdump(data, width = 16):
     """ Hexdump function shared by various plugins """
@@ -42,13 +42,32 @@ CI_OFF_SHIFT = 0x0
 
 BLOCK_SIZE = 0x1000
 
+def read_blocks(space, vaddr, length, zero = False):
+    """Reads from a hive address space one cell block at a time,
+    padding unavailable blocks if zero is set"""
+    vaddr, length = int(vaddr), int(length)
+    stuff_read = []
+    end = vaddr + length
+    while vaddr < end:
+        chunk_len = min(BLOCK_SIZE - vaddr % BLOCK_SIZE, end - vaddr)
+        paddr = space.vtop(vaddr)
+        data = None
+        if paddr != None:
+            data = space.base.read(paddr, chunk_len)
+        if not data:
+            if not zero:
+                return None
+            data = b"\0" * chunk_len
+        stuff_read.append(data)
+        vaddr += chunk_len
+
+    return b''.join(stuff_read)
+
 class HiveAddressSpace(addrspace.BaseAddressSpace):
     def __init__(self, base, config, hive_addr, **kwargs):
         addrspace.BaseAddressSpace.__init__(self, base, config)
         self.base = base
-        self.hive = obj.Object("_HHIVE", hive_addr, base)
-        self.baseblock = self.hive.BaseBlock.v()
-        self.flat = self.hive.Flat.v() > 0
+        self.reload(hive_addr)
 
     def __getstate__(self):
         result = addrspace.BaseAddressSpace.__getstate__(self)
@@ -56,18 +75,71 @@ class HiveAddressSpace(addrspace.BaseAddressSpace):
 
         return result
 
+    def reload(self, hive_addr = None):
+        """(Re)reads the hive, discarding the cached cell map"""
+        if hive_addr is None:
+            hive_addr = self.hive.obj_offset
+        self.hive = obj.Object("_HHIVE", hive_addr, self.base)
+        self.baseblock = self.hive.BaseBlock.v()
+        self.flat = self.hive.Flat.v() > 0
+        ## The BlockAddress of each cell block, by storage type and
+        ## block number. Built on first use.
+        self.cell_map = None
+
+    def build_cell_map(self):
+        """Reads the block addresses of both storage types into flat lists"""
+        entry_size = self.profile.get_obj_size("_HMAP_ENTRY")
+        block_offset = self.profile.get_obj_offset("_HMAP_ENTRY", "BlockAddress")
+        if self.profile.metadata.get('memory_model', '32bit') == '64bit':
+            fmt = '<Q'
+        else:
+            fmt = '<I'
+        table_entries = (CI_BLOCK_MASK >> CI_BLOCK_SHIFT) + 1
+
+        self.cell_map = []
+        for storage in self.hive.Storage:
+            blocks = []
+            length = storage.Length.v()
+            tables = (length + BLOCK_SIZE * table_entries - 1) // (BLOCK_SIZE * table_entries)
+            directory = storage.Map.dereference()
+            for ci_table in range(tables):
+                table = directory.Directory[ci_table] if directory else None
+                data = None
+                if table:
+                    data = self.base.read(table.v(), entry_size * table_entries)
+                if not data or len(data) != entry_size * table_entries:
+                    ## Unreadable tables are looked up the slow way
+                    blocks.extend([None] * table_entries)
+                    continue
+                for ci_block in range(table_entries):
+                    (address,) = struct.unpack_from(fmt, data, ci_block * entry_size + block_offset)
+                    blocks.append(address)
+            self.cell_map.append(blocks)
+
+    def walk_cell_map(self, ci_type, ci_table, ci_block):
+        """Looks a block address up through the hive's objects"""
+        return self.hive.Storage[ci_type].Map.Directory[ci_table].Table[ci_block].BlockAddress
+
     def vtop(self, vaddr):
         # If the hive is listed as "flat", it is all contiguous in memory
         # so we can just calculate it relative to the base block.
         if self.flat:
             return self.baseblock + vaddr + BLOCK_SIZE + 4
 
+        if self.cell_map is None:
+            self.build_cell_map()
+
         ci_type = (vaddr & CI_TYPE_MASK) >> CI_TYPE_SHIFT
-        ci_table = (vaddr & CI_TABLE_MASK) >> CI_TABLE_SHIFT
-        ci_block = (vaddr & CI_BLOCK_MASK) >> CI_BLOCK_SHIFT
         ci_off = (vaddr & CI_OFF_MASK) >> CI_OFF_SHIFT
+        ## The table and block together index the flat list
+        index = (vaddr & (CI_TABLE_MASK | CI_BLOCK_MASK)) >> CI_BLOCK_SHIFT
 
-        block = self.hive.Storage[ci_type].Map.Directory[ci_table].Table[ci_block].BlockAddress
+        blocks = self.cell_map[ci_type]
+        if index < len(blocks) and blocks[index] is not None:
+            block = blocks[index]
+        else:
+            block = self.walk_cell_map(ci_type, index >> (CI_TABLE_SHIFT - CI_BLOCK_SHIFT),
+                                       index & (CI_BLOCK_MASK >> CI_BLOCK_SHIFT))
 
         return block + ci_off + 4
 
@@ -91,59 +163,7 @@ class HiveAddressSpace(addrspace.BaseAddressSpace):
     #    return Obj("_HMAP_ENTRY", table, self.base)
 
     def read(self, vaddr, length, zero = False):
-        length = int(length)
-        vaddr = int(vaddr)
-        first_block = BLOCK_SIZE - vaddr % BLOCK_SIZE
-        full_blocks = ((length + (vaddr % BLOCK_SIZE)) // BLOCK_SIZE) - 1
-        left_over = (length + vaddr) % BLOCK_SIZE
-
-        paddr = self.vtop(vaddr)
-        if paddr == None and zero:
-            if length < first_block:
-                return "\0" * length
-            else:
-                stuff_read = "\0" * first_block
-        elif paddr == None:
-            return None
-        else:
-            if length < first_block:
-                stuff_read = self.base.read(paddr, length)
-                if not stuff_read and zero:
-                    return "\0" * length
-                else:
-                    return stuff_read
-
-            stuff_read = self.base.read(paddr, first_block)
-            if not stuff_read and zero:
-                stuff_read = "\0" * first_block
-
-        new_vaddr = vaddr + first_block
-
-        for _i in range(0, full_blocks):
-            paddr = self.vtop(new_vaddr)
-            if paddr == None and zero:
-                stuff_read = stuff_read + "\0" * BLOCK_SIZE
-            elif paddr == None:
-                return None
-            else:
-                new_stuff = self.base.read(paddr, BLOCK_SIZE)
-                if not new_stuff and zero:
-                    new_stuff = "\0" * BLOCK_SIZE
-                elif not new_stuff:
-                    return None
-                else:
-                    stuff_read = stuff_read + new_stuff
-            new_vaddr = new_vaddr + BLOCK_SIZE
-
-        if left_over > 0:
-            paddr = self.vtop(new_vaddr)
-            if paddr == None and zero:
-                stuff_read = stuff_read + "\0" * left_over
-            elif paddr == None:
-                return None
-            else:
-                stuff_read = stuff_read + self.base.read(paddr, left_over)
-        return stuff_read
+        return read_blocks(self, vaddr, length, zero)
 
     def zread(self, addr, length):
         return self.read(addr, length, True)
@@ -166,7 +186,7 @@ class HiveAddressSpace(addrspace.BaseAddressSpace):
         if baseblock:
             outf.write(baseblock)
         else:
-            outf.write("\0" * BLOCK_SIZE)
+            outf.write(b"\0" * BLOCK_SIZE)
 
         length = self.hive.Storage[0].Length.v()
         for i in range(0, length, BLOCK_SIZE):
@@ -181,7 +201,7 @@ class HiveAddressSpace(addrspace.BaseAddressSpace):
 
             if not data:
                 print("Physical layer returned None for index {0:x}, filling with NULL".format(i))
-                data = '\0' * BLOCK_SIZE
+                data = b'\0' * BLOCK_SIZE
 
             outf.write(data)
 
@@ -228,56 +248,7 @@ class HiveFileAddressSpace(addrspace.BaseAddressSpace):
         return vaddr + BLOCK_SIZE + 4
 
     def read(self, vaddr, length, zero = False):
-        first_block = BLOCK_SIZE - vaddr % BLOCK_SIZE
-        full_blocks = ((length + (vaddr % BLOCK_SIZE)) / BLOCK_SIZE) - 1
-        left_over = (length + vaddr) % BLOCK_SIZE
-
-        paddr = self.vtop(vaddr)
-        if paddr == None and zero:
-            if length < first_block:
-                return "\0" * length
-            else:
-                stuff_read = "\0" * first_block
-        elif paddr == None:
-            return None
-        else:
-            if length < first_block:
-                stuff_read = self.base.read(paddr, length)
-                if not stuff_read and zero:
-                    return "\0" * length
-                else:
-                    return stuff_read
-
-            stuff_read = self.base.read(paddr, first_block)
-            if not stuff_read and zero:
-                stuff_read = "\0" * first_block
-
-        new_vaddr = vaddr + first_block
-        for _i in range(0, full_blocks):
-            paddr = self.vtop(new_vaddr)
-            if paddr == None and zero:
-                stuff_read = stuff_read + "\0" * BLOCK_SIZE
-            elif paddr == None:
-                return None
-            else:
-                new_stuff = self.base.read(paddr, BLOCK_SIZE)
-                if not new_stuff and zero:
-                    new_stuff = "\0" * BLOCK_SIZE
-                elif not new_stuff:
-                    return None
-                else:
-                    stuff_read = stuff_read + new_stuff
-            new_vaddr = new_vaddr + BLOCK_SIZE
-
-        if left_over > 0:
-            paddr = self.vtop(new_vaddr)
-            if paddr == None and zero:
-                stuff_read = stuff_read + "\0" * left_over
-            elif paddr == None:
-                return None
-            else:
-                stuff_read = stuff_read + self.base.read(paddr, left_over)
-        return stuff_read
+        return read_blocks(self, vaddr, length, zero)
 
     def zread(self, addr, length):
         return self.read(addr, length, True)
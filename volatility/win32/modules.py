@@ -24,6 +24,7 @@
 """
 
 #pylint: disable-msg=C0111
+import volatility.utils as utils
 import volatility.win32.tasks as tasks
 
 def lsmod(addr_space):
@@ -31,3 +32,21 @@ def lsmod(addr_space):
 
     for m in tasks.get_kdbg(addr_space).modules():
         yield m
+
+def index_modules(mods):
+    """Returns an AddressIndex of _LDR_DATA_TABLE_ENTRYs (kernel
+    modules or a process's DLLs) by the range of their images"""
+    return utils.AddressIndex((mod.DllBase.v(), mod.DllBase.v() + mod.SizeOfImage.v(), mod)
+                              for mod in mods)
+
+def module_index(addr_space):
+    """Returns an AddressIndex of the kernel modules. It is built
+    once per address space and kept with it."""
+    try:
+        return addr_space.kernel_module_index
+    except AttributeError:
+        pass
+
+    index = index_modules(lsmod(addr_space))
+    addr_space.kernel_module_index = index
+    return index
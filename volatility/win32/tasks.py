@@ -30,6 +30,7 @@
 
 import volatility.obj as obj
 import volatility.debug as debug #pylint: disable-msg=W0611
+import volatility.discovery as discovery
 from bisect import bisect_right
 
 def get_kdbg(addr_space):
@@ -43,13 +44,25 @@ def get_kdbg(addr_space):
     value, then neither method will succeed. The same is true 
     even if a user specifies --kdbg, because we check for the 
     OwnerTag even in that case. 
+
+    Unless the user specified --kdbg, a KDBG found by a previous
+    run (see volatility.discovery) is tried before scanning.
     """
+    config = addr_space.get_config()
+
+    if not config.KDBG:
+        kdbgo = discovery.recall(config, "kdbg")
+        if kdbgo:
+            kdbg = obj.Object("_KDDEBUGGER_DATA64", offset = kdbgo, vm = addr_space)
+            if kdbg.is_valid():
+                return kdbg
 
     kdbgo = obj.VolMagic(addr_space).KDBG.v()
 
     kdbg = obj.Object("_KDDEBUGGER_DATA64", offset = kdbgo, vm = addr_space)
 
     if kdbg.is_valid():
+        discovery.remember(config, "kdbg", kdbg.obj_offset)
         return kdbg
 
     # Fall back to finding it via the KPCR. We cannot
@@ -62,6 +75,7 @@ def get_kdbg(addr_space):
         kdbg = kpcr.get_kdbg()
     
         if kdbg.is_valid():
+            discovery.remember(config, "kdbg", kdbg.obj_offset)
             return kdbg
 
     return obj.NoneObject("KDDEBUGGER structure not found using either KDBG signature or KPCR pointer")
@@ -70,7 +84,8 @@ def pslist(addr_space):
     """ A Generator for _EPROCESS objects """
 
     for p in get_kdbg(addr_space).processes():
-        yield p
+        # Most callers look at several members of each process
+        yield p.snapshot()
 
 def find_space(addr_space, procs, mod_base):
     """Search for an address space (usually looking for a GUI process)"""
@@ -88,7 +103,10 @@ def find_module(modlist, mod_addrs, addr):
 
     This is much faster than a series of linear checks if you have
     to do it many times. Note that modlist and mod_addrs must be sorted
-    in order of the module base address."""
+    in order of the module base address. 
+
+    modules.module_index builds (and keeps) an index of the kernel 
+    modules which does not need the callers to sort anything."""
 
     pos = bisect_right(mod_addrs, addr) - 1
     if pos == -1:
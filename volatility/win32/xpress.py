@@ -31,109 +31,145 @@
 
 #pylint: disable-msg=C0111
 
-from struct import unpack
+from struct import unpack_from
 from struct import error as StructError
 
-def recombine(outbuf):
-    return "".join(outbuf[k] for k in sorted(outbuf.keys()))
-
-def xpress_decode(inputBuffer):
-    outputBuffer = {}
+## The size of a decompressed block in a hibernation file
+BLOCK_SIZE = 0x10000
+
+def xpress_decode(inputBuffer, outputSize = BLOCK_SIZE):
+    """Decodes a buffer of XPRESS (plain LZ77) compressed data.
+
+    The output is written into a bytearray preallocated to outputSize
+    (it grows if the data turns out to be bigger).
+    """
+    outputBuffer = bytearray(outputSize)
+    return bytes(outputBuffer[:xpress_decode_into(inputBuffer, outputBuffer)])
+
+def xpress_decode_blocks(blocks, outputSize = BLOCK_SIZE):
+    """Decodes a list of compressed blocks, returning a list of the 
+    results. A single output buffer is preallocated and reused for 
+    all of them."""
+    outputBuffer = bytearray(outputSize)
+    results = []
+    for block in blocks:
+        length = xpress_decode_into(block, outputBuffer)
+        results.append(bytes(outputBuffer[:length]))
+    return results
+
+def xpress_decode_into(inputBuffer, outputBuffer):
+    """Decodes inputBuffer into the start of the bytearray outputBuffer 
+    and returns the length of the output.
+
+    Runs of literals and back references which don't overlap their own
+    output are copied as slices rather than a byte at a time. Back 
+    references only reach into what has been decoded so far, so the 
+    buffer may hold anything beforehand.
+    """
     outputIndex = 0
     inputIndex = 0
+    inputLength = len(inputBuffer)
+    indicator = 0
     indicatorBit = 0
     nibbleIndex = 0
 
     # we are decoding the entire input here, so I have changed
     # the check to see if we're at the end of the output buffer
     # with a check to see if we still have any input left.
-    while inputIndex < len(inputBuffer):
+    while inputIndex < inputLength:
         if (indicatorBit == 0):
-            # in pseudocode this was indicatorBit = ..., but that makes no
-            # sense, so I think this was intended...
             try:
-                indicator = unpack("<L", inputBuffer[inputIndex:inputIndex + 4])[0]
+                indicator = unpack_from("<L", inputBuffer, inputIndex)[0]
             except StructError:
-                return recombine(outputBuffer)
+                break
 
             inputIndex += 4
             indicatorBit = 32
 
-        indicatorBit = indicatorBit - 1
-        # check whether the bit specified by indicatorBit is set or not 
-        # set in indicator. For example, if indicatorBit has value 4 
-        # check whether the 4th bit of the value in indicator is set
-        if not (indicator & (1 << indicatorBit)):
-            try:
-                outputBuffer[outputIndex] = inputBuffer[inputIndex]
-            except IndexError:
-                return recombine(outputBuffer)
+        # The bits of the indicator are used from the top down, a clear
+        # bit being a literal byte. Copy all the literals up to the next
+        # set bit in one go.
+        remaining = indicator & ((1 << indicatorBit) - 1)
+        literals = indicatorBit - remaining.bit_length()
+        if literals:
+            literals = min(literals, inputLength - inputIndex)
+            if not literals:
+                break
+            outputBuffer[outputIndex:outputIndex + literals] = inputBuffer[inputIndex:inputIndex + literals]
+            inputIndex += literals
+            outputIndex += literals
+            indicatorBit -= literals
+            continue
 
-            inputIndex += 1
-            outputIndex += 1
-        else:
-            # Get the length. This appears to use a scheme whereby if
-            # the value at the current width is all ones, then we assume
-            # that it is actually wider. First we try 3 bits, then 3
-            # bits plus a nibble, then a byte, and finally two bytes (an
-            # unsigned short). Also, if we are using a nibble, then every
-            # other time we get the nibble from the high part of the previous 
-            # byte used as a length nibble.
-            # Thus if a nibble byte is F2, we would first use the low part (2),
-            # and then at some later point get the nibble from the high part (F).
+        indicatorBit = indicatorBit - 1
 
-            try:
-                length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
-            except StructError:
-                return recombine(outputBuffer)
+        # Get the length. This appears to use a scheme whereby if
+        # the value at the current width is all ones, then we assume
+        # that it is actually wider. First we try 3 bits, then 3
+        # bits plus a nibble, then a byte, and finally two bytes (an
+        # unsigned short). Also, if we are using a nibble, then every
+        # other time we get the nibble from the high part of the previous 
+        # byte used as a length nibble.
+        # Thus if a nibble byte is F2, we would first use the low part (2),
+        # and then at some later point get the nibble from the high part (F).
+        try:
+            length = unpack_from("<H", inputBuffer, inputIndex)[0]
 
             inputIndex += 2
-            offset = length / 8
-            length = length % 8
+            offset = length >> 3
+            length = length & 7
             if length == 7:
                 if nibbleIndex == 0:
                     nibbleIndex = inputIndex
-                    length = ord(inputBuffer[inputIndex]) % 16
+                    length = inputBuffer[inputIndex] & 0xf
                     inputIndex += 1
                 else:
                     # get the high nibble of the last place a nibble sized
                     # length was used thus we don't waste that extra half
                     # byte :p
-                    length = ord(inputBuffer[nibbleIndex]) / 16
+                    length = inputBuffer[nibbleIndex] >> 4
                     nibbleIndex = 0
 
                 if length == 15:
-                    length = ord(inputBuffer[inputIndex])
+                    length = inputBuffer[inputIndex]
                     inputIndex += 1
                     if length == 255:
-                        try:
-                            length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
-                        except StructError:
-                            return recombine(outputBuffer)
+                        length = unpack_from("<H", inputBuffer, inputIndex)[0]
                         inputIndex = inputIndex + 2
                         length = length - (15 + 7)
                     length = length + 15
                 length = length + 7
             length = length + 3
+        except (StructError, IndexError):
+            break
 
-            while length != 0:
-                try:
-                    outputBuffer[outputIndex] = outputBuffer[outputIndex - offset - 1]
-                except KeyError:
-                    return recombine(outputBuffer)
-                outputIndex += 1
-                length -= 1
+        source = outputIndex - offset - 1
+        if source < 0:
+            break
 
-    return recombine(outputBuffer)
+        if length <= offset + 1:
+            # The reference doesn't overlap what it produces
+            outputBuffer[outputIndex:outputIndex + length] = outputBuffer[source:source + length]
+        else:
+            # The reference repeats the last offset + 1 bytes
+            pattern = outputBuffer[source:outputIndex]
+            repeated = pattern * (length // len(pattern) + 1)
+            outputBuffer[outputIndex:outputIndex + length] = repeated[:length]
+        outputIndex += length
+
+    return outputIndex
 
 try:
     import pyxpress #pylint: disable-msg=F0401
 
     xpress_decode = pyxpress.decode
+
+    def xpress_decode_blocks(blocks, outputSize = BLOCK_SIZE):
+        return [ pyxpress.decode(block) for block in blocks ]
 except ImportError:
     pass
 
 if __name__ == "__main__":
     import sys
-    dec_data = xpress_decode(open(sys.argv[1]).read())
-    sys.stdout.write(dec_data)
+    dec_data = xpress_decode(open(sys.argv[1], 'rb').read())
+    sys.stdout.buffer.write(dec_data)